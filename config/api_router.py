@@ -2,6 +2,7 @@ from django.conf import settings
 from rest_framework.routers import DefaultRouter
 from rest_framework.routers import SimpleRouter
 
+from snap_buy.order.api.views import OrderViewSet
 from snap_buy.payment.api.views import PaymentViewSet
 from snap_buy.users.api.views import UserViewSet
 
@@ -9,6 +10,8 @@ router = DefaultRouter() if settings.DEBUG else SimpleRouter()
 
 router.register("users", UserViewSet)
 
+router.register("orders", OrderViewSet)
+
 router.register("payments", PaymentViewSet, basename="order-payment")
 
 
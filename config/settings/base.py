@@ -1,7 +1,9 @@
 # ruff: noqa: ERA001, E501
 """Base settings to build other settings files upon."""
 
+from datetime import timedelta
 from pathlib import Path
+from tempfile import gettempdir
 
 import environ
 
@@ -311,12 +313,74 @@ CELERY_TASK_TIME_LIMIT = 5 * 60
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#task-soft-time-limit
 # TODO: set to whatever value is adequate in your circumstances
 CELERY_TASK_SOFT_TIME_LIMIT = 60
+# Tasks working through batches stop starting new ones after that many seconds,
+# leaving a margin below `CELERY_TASK_SOFT_TIME_LIMIT` for the last batch.
+BATCH_TASKS_TIME_BUDGET = 45
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#beat-scheduler
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#worker-send-task-events
 CELERY_WORKER_SEND_TASK_EVENTS = True
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#std-setting-task_send_sent_event
 CELERY_TASK_SEND_SENT_EVENT = True
+# https://docs.celeryq.dev/en/stable/userguide/periodic-tasks.html#beat-entries
+CELERY_BEAT_SCHEDULE = {
+    "update-scheduled-products-visibility": {
+        "task": "snap_buy.product.tasks.update_scheduled_products_visibility_task",
+        "schedule": timedelta(minutes=1),
+    },
+    "update-products-search-vectors": {
+        "task": "snap_buy.product.tasks.update_products_search_vector_task",
+        "schedule": timedelta(seconds=20),
+    },
+    "update-orders-search-vectors": {
+        "task": "snap_buy.order.tasks.update_orders_search_vector_task",
+        "schedule": timedelta(seconds=20),
+    },
+    "recalculate-orders-totals": {
+        "task": "snap_buy.order.tasks.recalculate_orders_totals_task",
+        "schedule": timedelta(seconds=30),
+    },
+    "expire-orders": {
+        "task": "snap_buy.order.tasks.expire_orders_task",
+        "schedule": timedelta(minutes=5),
+    },
+    "delete-expired-orders": {
+        "task": "snap_buy.order.tasks.delete_expired_orders_task",
+        "schedule": timedelta(hours=1),
+    },
+    "update-sales-rollups": {
+        "task": "snap_buy.order.tasks.update_sales_rollups_task",
+        "schedule": timedelta(minutes=1),
+    },
+    "archive-orders": {
+        "task": "snap_buy.order.tasks.archive_orders_task",
+        "schedule": timedelta(hours=1),
+    },
+    "update-products-discounted-prices": {
+        "task": "snap_buy.product.tasks.update_discounted_prices_for_dirty_listings_task",
+        "schedule": timedelta(seconds=30),
+    },
+    "update-promotion-rules-variants": {
+        "task": "snap_buy.discount.tasks.update_rules_variants_task",
+        "schedule": timedelta(seconds=30),
+    },
+    "delete-expired-reservations": {
+        "task": "snap_buy.warehouse.tasks.delete_expired_reservations_task",
+        "schedule": timedelta(minutes=5),
+    },
+    "convert-ended-preorders": {
+        "task": "snap_buy.warehouse.tasks.convert_ended_preorders_task",
+        "schedule": timedelta(minutes=5),
+    },
+    "create-stock-movement-partitions": {
+        "task": "snap_buy.warehouse.tasks.create_stock_movement_partitions_task",
+        "schedule": timedelta(days=1),
+    },
+    "take-stock-snapshots": {
+        "task": "snap_buy.warehouse.tasks.take_stock_snapshots_task",
+        "schedule": timedelta(days=1),
+    },
+}
 # django-allauth
 # ------------------------------------------------------------------------------
 ACCOUNT_ALLOW_REGISTRATION = env.bool("DJANGO_ACCOUNT_ALLOW_REGISTRATION", True)
@@ -395,3 +459,53 @@ FRONTEND_DOMAIN = env.str("FRONTEND_DOMAIN")
 
 PAYMENT_SUCCESS_URL = env.str("PAYMENT_SUCCESS_URL")
 PAYMENT_CANCEL_URL = env.str("PAYMENT_CANCEL_URL")
+
+# Product visibility
+# Read storefront product visibility from the materialized `ProductVisibility` table.
+# Run `manage.py update_product_visibility` before enabling it. Scheduled
+# publications become visible on the next `update-scheduled-products-visibility` run.
+PRODUCT_VISIBILITY_MATERIALIZED = env.bool(
+    "PRODUCT_VISIBILITY_MATERIALIZED",
+    default=False,
+)
+
+# Stock summary
+# Read variant stock quantities from the `ProductVariantStockSummary` table.
+# Run `manage.py reconcile_stock_summary` before enabling it.
+STOCK_SUMMARY_MATERIALIZED = env.bool("STOCK_SUMMARY_MATERIALIZED", default=False)
+
+# Warehouse routing
+# Resolve warehouses for a channel and country from the `WarehouseRoute` table.
+# Run `manage.py rebuild_warehouse_routes` before enabling it.
+WAREHOUSE_ROUTING_MATERIALIZED = env.bool(
+    "WAREHOUSE_ROUTING_MATERIALIZED",
+    default=False,
+)
+
+# Checkout reservations
+# How long stock stays reserved for a checkout line.
+CHECKOUT_RESERVATION_LENGTH = timedelta(
+    minutes=env.int("CHECKOUT_RESERVATION_MINUTES", default=20),
+)
+
+# Stock ledger
+# Stock snapshots older than that are deleted once a newer snapshot is taken.
+STOCK_SNAPSHOTS_RETENTION = timedelta(
+    days=env.int("STOCK_SNAPSHOTS_RETENTION_DAYS", default=90),
+)
+
+# Order numbers
+# Order numbers reserved by a process at once. Unused numbers of a block are
+# skipped when the process exits; use 1 for gapless numbering.
+ORDER_NUMBER_BLOCK_SIZE = env.int("ORDER_NUMBER_BLOCK_SIZE", default=10)
+
+# Order archive
+# Fulfilled and canceled orders not updated for that long are moved to the archive.
+ORDER_ARCHIVE_AFTER = timedelta(days=env.int("ORDER_ARCHIVE_AFTER_DAYS", default=365))
+
+# Order exports
+# Directory where the parts of running exports are written; it must be shared by
+# the Celery workers for exports to resume on another worker.
+ORDER_EXPORT_SPOOL_DIR = Path(
+    env("ORDER_EXPORT_SPOOL_DIR", default=str(Path(gettempdir()) / "order_exports")),
+)
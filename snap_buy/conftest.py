@@ -1,5 +1,11 @@
 import pytest
+from django.apps import apps
 
+from snap_buy.channel.models import Channel
+from snap_buy.core.db.fields import SanitizedJSONField
+from snap_buy.product import ProductTypeKind
+from snap_buy.product.models import Product
+from snap_buy.product.models import ProductType
 from snap_buy.users.models import User
 from snap_buy.users.tests.factories import UserFactory
 
@@ -12,3 +18,37 @@ def _media_storage(settings, tmpdir) -> None:
 @pytest.fixture()
 def user(db) -> User:
     return UserFactory()
+
+
+@pytest.fixture()
+def _unsanitized_rich_text(monkeypatch) -> None:
+    """Save rich text fields as they are, `clean_editor_js` isn't implemented."""
+    for model in apps.get_models():
+        for field in model._meta.get_fields():  # noqa: SLF001
+            if isinstance(field, SanitizedJSONField):
+                monkeypatch.setattr(field, "_sanitizer_method", lambda value: value)
+
+
+@pytest.fixture()
+def channel(db) -> Channel:
+    return Channel.objects.create(
+        name="Default channel",
+        slug="default-channel",
+        currency_code="USD",
+        default_country="US",
+        is_active=True,
+    )
+
+
+@pytest.fixture()
+def product(db, _unsanitized_rich_text) -> Product:
+    product_type = ProductType.objects.create(
+        name="Default type",
+        slug="default-type",
+        kind=ProductTypeKind.NORMAL,
+    )
+    return Product.objects.create(
+        name="Product",
+        slug="product",
+        product_type=product_type,
+    )
@@ -0,0 +1,121 @@
+import json
+from base64 import urlsafe_b64decode
+from base64 import urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination seeking past the last row of the previous page.
+
+    Unlike offset pagination, the cost of a page doesn't depend on how deep it is,
+    as long as an index matches the ordering. Each ordering in `orderings` is a
+    tuple of fields which together must be unique; the cursor holds their values
+    for the last row of the page. Rows have to be dicts, e.g. from `values()`,
+    and include the ordering fields.
+    """
+
+    page_size = 100
+    max_page_size = 500
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    ordering_query_param = "ordering"
+    orderings: dict[str, tuple[str, ...]] = {}
+    default_ordering: str | None = None
+    invalid_cursor_message = "Invalid cursor."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        ordering_name = request.query_params.get(
+            self.ordering_query_param,
+            self.default_ordering,
+        )
+        if ordering_name not in self.orderings:
+            msg = f"Unknown ordering: {ordering_name}."
+            raise ParseError(msg)
+        self.ordering = self.orderings[ordering_name]
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.get_seek_filter(queryset, cursor))
+        rows = list(queryset.order_by(*self.ordering)[: self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.rows = rows[: self.page_size]
+        return self.rows
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_seek_filter(self, queryset, cursor: str) -> Q:
+        """Return the filter selecting the rows after the cursor.
+
+        For `(a, b)` it is `a >= x AND (a > x OR (a = x AND b > y))`, where the
+        leading range condition lets Postgres bound the index scan.
+        """
+        values = self.decode_cursor(queryset, cursor)
+        seek = Q()
+        equal = Q()
+        for order_field, value in zip(self.ordering, values, strict=True):
+            name = order_field.removeprefix("-")
+            lookup = "lt" if order_field.startswith("-") else "gt"
+            seek |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        first = self.ordering[0]
+        bound = "lte" if first.startswith("-") else "gte"
+        return Q(**{f"{first.removeprefix('-')}__{bound}": values[0]}) & seek
+
+    def decode_cursor(self, queryset, cursor: str) -> list:
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode()))
+        except (BinasciiError, ValueError) as e:
+            raise NotFound(self.invalid_cursor_message) from e
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        opts = queryset.model._meta  # noqa: SLF001
+        try:
+            return [
+                opts.get_field(field.removeprefix("-")).to_python(value)
+                for field, value in zip(self.ordering, values, strict=True)
+            ]
+        except ValidationError as e:
+            raise NotFound(self.invalid_cursor_message) from e
+
+    def encode_cursor(self, row: dict) -> str:
+        values = [row[field.removeprefix("-")] for field in self.ordering]
+        # `str` keeps the microseconds of datetimes, unlike `DjangoJSONEncoder`.
+        return urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+    def get_next_link(self) -> str | None:
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            self.encode_cursor(self.rows[-1]),
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
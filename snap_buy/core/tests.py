@@ -1 +1,30 @@
-# Create your tests here.
+from snap_buy.core.utils.batches import iter_batches
+from snap_buy.core.utils.batches import run_batches
+
+BATCH_SIZE = 3
+
+
+def test_iter_batches():
+    items = range(BATCH_SIZE * 2 + 1)
+
+    batches = list(iter_batches(items, BATCH_SIZE))
+
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_run_batches_stops_at_incomplete_batch():
+    batches = iter([BATCH_SIZE, BATCH_SIZE, 1, BATCH_SIZE])
+
+    assert run_batches(lambda: next(batches), BATCH_SIZE) == BATCH_SIZE * 2 + 1
+    assert list(batches) == [BATCH_SIZE]
+
+
+def test_run_batches_stops_when_time_runs_out():
+    calls: list[None] = []
+
+    def process_batch():
+        calls.append(None)
+        return BATCH_SIZE
+
+    assert run_batches(process_batch, BATCH_SIZE, time_budget=0) == 0
+    assert not calls
@@ -0,0 +1,44 @@
+import time
+from collections.abc import Callable
+from collections.abc import Iterable
+from collections.abc import Iterator
+from itertools import islice
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+def iter_batches(items: Iterable[T], batch_size: int) -> Iterator[list[T]]:
+    """Split items into lists of `batch_size`, the last one may be shorter."""
+    iterator = iter(items)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def iter_within_time_budget(time_budget: float | None) -> Iterator[None]:
+    """Yield until `time_budget` seconds have passed since the first iteration.
+
+    The time is checked before each iteration, so the last one may run past the
+    budget. `None` means no time limit.
+    """
+    start = time.monotonic()
+    while time_budget is None or time.monotonic() - start < time_budget:
+        yield
+
+
+def run_batches(
+    process_batch: Callable[[], int],
+    batch_size: int,
+    time_budget: float | None = None,
+) -> int:
+    """Process batches until one is smaller than `batch_size` or time runs out.
+
+    `process_batch` returns the number of processed items. Return their total.
+    """
+    processed = 0
+    for _ in iter_within_time_budget(time_budget):
+        batch_processed = process_batch()
+        processed += batch_processed
+        if batch_processed < batch_size:
+            break
+    return processed
@@ -1,3 +1,4 @@
+import datetime
 import math
 import re
 from json import JSONEncoder
@@ -31,6 +32,15 @@ class CustomJsonEncoder(DjangoJSONEncoder):
         return super().default(obj)
 
 
+class PreciseJsonEncoder(CustomJsonEncoder):
+    """Encoder keeping the microseconds, which `DjangoJSONEncoder` truncates."""
+
+    def default(self, obj):
+        if isinstance(obj, datetime.datetime | datetime.time):
+            return obj.isoformat()
+        return super().default(obj)
+
+
 class SafeJSONEncoder(JSONEncoder):
     @property
     def escape_chars_pattern(self):
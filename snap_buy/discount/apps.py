@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DiscountConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "snap_buy.discount"
+
+    def ready(self):
+        import snap_buy.discount.signals  # noqa: F401
@@ -0,0 +1,98 @@
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from snap_buy.product.models import Category
+from snap_buy.product.models import CollectionProduct
+from snap_buy.product.models import Product
+from snap_buy.product.models import ProductVariant
+from snap_buy.product.utils.variant_prices import mark_discounted_prices_dirty_for_rules
+
+from .models import Promotion
+from .models import PromotionRule
+from .utils.predicate import mark_catalogue_rules_variants_dirty
+from .utils.predicate import mark_new_variant_rules_variants_dirty
+from .utils.predicate import mark_rules_variants_dirty
+
+# Changing any of those fields through `PromotionRule.save` changes the discounted
+# prices of the rule variants.
+DISCOUNT_RULE_FIELDS = frozenset(["reward_value", "reward_value_type"])
+
+
+@receiver(post_save, sender=PromotionRule)
+def promotion_rule_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "catalogue_predicate" in update_fields:
+        mark_rules_variants_dirty([instance.pk])
+    if update_fields is None or DISCOUNT_RULE_FIELDS.intersection(update_fields):
+        mark_discounted_prices_dirty_for_rules([instance.pk])
+
+
+@receiver(pre_delete, sender=PromotionRule)
+def promotion_rule_deleted(sender, instance, **kwargs):
+    # The rule variants are deleted with the rule, so listings are marked before.
+    mark_discounted_prices_dirty_for_rules([instance.pk])
+
+
+@receiver(post_save, sender=Promotion)
+def promotion_saved(sender, instance, created=False, **kwargs):
+    if not created:
+        mark_discounted_prices_dirty_for_rules(
+            instance.rules.values_list("pk", flat=True),
+        )
+
+
+@receiver(m2m_changed, sender=PromotionRule.channels.through)
+def promotion_rule_channels_changed(
+    sender,
+    instance,
+    action,
+    reverse=False,
+    pk_set=None,
+    **kwargs,
+):
+    # Listings in removed channels are marked while the channels are still there.
+    if action not in ("post_add", "pre_remove", "pre_clear"):
+        return
+    if not reverse:
+        rule_ids = [instance.pk]
+    elif pk_set is not None:
+        rule_ids = list(pk_set)
+    else:
+        rule_ids = instance.promotionrule_set.values_list("pk", flat=True)
+    mark_discounted_prices_dirty_for_rules(rule_ids)
+
+
+# Variants of deleted products and categories are removed from the rules by the
+# cascade; new variants and moved products may match other rules.
+@receiver(post_save, sender=ProductVariant)
+def variant_created(sender, instance, created=False, **kwargs):
+    if created:
+        mark_new_variant_rules_variants_dirty(instance)
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=Category)
+def catalogue_tree_pre_save(sender, instance, update_fields=None, **kwargs):
+    field = "category_id" if sender is Product else "parent_id"
+    if instance._state.adding or (  # noqa: SLF001
+        update_fields is not None and field.removesuffix("_id") not in update_fields
+    ):
+        return
+    stored = sender.objects.filter(pk=instance.pk).values_list(field, flat=True)
+    if stored.first() != getattr(instance, field):
+        mark_catalogue_rules_variants_dirty()
+
+
+@receiver(post_save, sender=CollectionProduct)
+@receiver(post_delete, sender=CollectionProduct)
+def collection_product_changed(sender, instance, **kwargs):
+    mark_catalogue_rules_variants_dirty()
+
+
+@receiver(m2m_changed, sender=CollectionProduct)
+def collection_products_changed(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        mark_catalogue_rules_variants_dirty()
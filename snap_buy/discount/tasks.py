@@ -0,0 +1,17 @@
+from celery import shared_task
+from django.conf import settings
+
+from snap_buy.core.utils.batches import run_batches
+
+from .utils.predicate import RULES_BATCH_SIZE
+from .utils.predicate import update_dirty_rules_variants
+
+
+@shared_task()
+def update_rules_variants_task():
+    """Materialize the variants of promotion rules marked with `variants_dirty`."""
+    return run_batches(
+        update_dirty_rules_variants,
+        RULES_BATCH_SIZE,
+        settings.BATCH_TASKS_TIME_BUDGET,
+    )
@@ -1 +1,157 @@
-# Create your tests here.
+from decimal import Decimal
+
+import pytest
+
+from snap_buy.discount import RewardValueType
+from snap_buy.discount.models import Promotion
+from snap_buy.discount.models import PromotionRule
+from snap_buy.discount.models import PromotionRule_Variants
+from snap_buy.product.models import Category
+from snap_buy.product.models import Collection
+from snap_buy.product.models import ProductChannelListing
+from snap_buy.product.models import ProductVariant
+from snap_buy.product.models import ProductVariantChannelListing
+from snap_buy.product.utils.variant_prices import (
+    update_discounted_prices_for_dirty_listings,
+)
+
+pytestmark = pytest.mark.django_db
+
+PRICE = Decimal(10)
+DISCOUNT_PERCENTAGE = Decimal(10)
+
+
+@pytest.fixture()
+def variant_listing(product, channel) -> ProductVariantChannelListing:
+    ProductChannelListing.objects.create(
+        product=product,
+        channel=channel,
+        currency="USD",
+    )
+    variant = ProductVariant.objects.create(product=product, sku="SKU-1")
+    return ProductVariantChannelListing.objects.create(
+        variant=variant,
+        channel=channel,
+        currency="USD",
+        price_amount=PRICE,
+    )
+
+
+@pytest.fixture()
+def rule(variant_listing, channel, _unsanitized_rich_text) -> PromotionRule:
+    promotion = Promotion.objects.create(name="Promotion")
+    rule = PromotionRule.objects.create(
+        promotion=promotion,
+        catalogue_predicate={"variantPredicate": {"ids": [variant_listing.variant_id]}},
+        reward_value_type=RewardValueType.PERCENTAGE,
+        reward_value=DISCOUNT_PERCENTAGE,
+    )
+    rule.channels.add(channel)
+    PromotionRule_Variants.objects.create(
+        promotionrule=rule,
+        productvariant_id=variant_listing.variant_id,
+    )
+    ProductChannelListing.objects.update(discounted_price_dirty=False)
+    return rule
+
+
+def _is_discounted_price_dirty() -> bool:
+    return ProductChannelListing.objects.get().discounted_price_dirty
+
+
+def test_changed_rule_reward_marks_listings_dirty(rule):
+    rule.reward_value = DISCOUNT_PERCENTAGE * 2
+    rule.save(update_fields=["reward_value"])
+
+    assert _is_discounted_price_dirty()
+
+
+def test_deleted_rule_marks_listings_dirty(rule):
+    rule.delete()
+
+    assert _is_discounted_price_dirty()
+
+
+def test_removed_rule_channel_marks_listings_dirty(rule, channel):
+    rule.channels.remove(channel)
+
+    assert _is_discounted_price_dirty()
+
+
+def test_changed_price_updates_discounted_price(rule, variant_listing):
+    variant_listing.price_amount = PRICE * 2
+    variant_listing.save(update_fields=["price_amount"])
+
+    assert _is_discounted_price_dirty()
+    update_discounted_prices_for_dirty_listings()
+    variant_listing.refresh_from_db()
+    discount = variant_listing.price_amount * DISCOUNT_PERCENTAGE / 100
+    assert variant_listing.discounted_price_amount == (
+        variant_listing.price_amount - discount
+    )
+    assert ProductChannelListing.objects.get().discounted_price_amount == (
+        variant_listing.discounted_price_amount
+    )
+
+
+def _is_rule_variants_dirty(rule) -> bool:
+    rule.refresh_from_db(fields=["variants_dirty"])
+    return rule.variants_dirty
+
+
+def test_changed_rule_predicate_marks_rule_variants_dirty(rule, product):
+    PromotionRule.objects.update(variants_dirty=False)
+    rule.catalogue_predicate = {"productPredicate": {"ids": [product.pk]}}
+    rule.save(update_fields=["catalogue_predicate"])
+
+    assert _is_rule_variants_dirty(rule)
+
+
+@pytest.mark.parametrize(
+    ("predicate_key", "matches"),
+    [
+        ("productPredicate", True),
+        ("categoryPredicate", True),
+        ("collectionPredicate", True),
+        ("variantPredicate", False),
+    ],
+)
+def test_new_variant_marks_matching_rule_variants_dirty(
+    predicate_key,
+    matches,
+    rule,
+    product,
+    variant_listing,
+):
+    parent = Category.objects.create(name="Parent", slug="parent")
+    product.category = Category.objects.create(
+        name="Category",
+        slug="category",
+        parent=parent,
+    )
+    product.save(update_fields=["category"])
+    collection = Collection.objects.create(name="Collection", slug="collection")
+    collection.products.add(product)
+    predicate_ids = {
+        "productPredicate": product.pk,
+        "categoryPredicate": parent.pk,
+        "collectionPredicate": collection.pk,
+        "variantPredicate": variant_listing.variant_id,
+    }
+    rule.catalogue_predicate = {
+        "AND": [{predicate_key: {"ids": [predicate_ids[predicate_key]]}}],
+    }
+    rule.save(update_fields=["catalogue_predicate"])
+    PromotionRule.objects.update(variants_dirty=False)
+
+    ProductVariant.objects.create(product=product, sku="SKU-2")
+
+    assert _is_rule_variants_dirty(rule) is matches
+
+
+def test_moved_product_marks_rule_variants_dirty(rule, product):
+    PromotionRule.objects.update(variants_dirty=False)
+    product.category = Category.objects.create(name="Category", slug="category")
+    product.save(update_fields=["category"])
+
+    assert _is_rule_variants_dirty(rule)
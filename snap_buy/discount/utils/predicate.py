@@ -0,0 +1,257 @@
+import logging
+import operator
+from collections import defaultdict
+from collections.abc import Iterable
+from functools import reduce
+from typing import NamedTuple
+from uuid import UUID
+
+from django.db import transaction
+from django.db.models import Exists
+from django.db.models import OuterRef
+from django.db.models import Q
+from django.db.models import QuerySet
+
+from snap_buy.discount.models import PromotionRule
+from snap_buy.discount.models import PromotionRule_Variants
+from snap_buy.product.models import Category
+from snap_buy.product.models import CollectionProduct
+from snap_buy.product.models import ProductChannelListing
+from snap_buy.product.models import ProductVariant
+
+logger = logging.getLogger(__name__)
+
+RULES_BATCH_SIZE = 50
+RULE_VARIANTS_BATCH_SIZE = 1000
+
+AND = "AND"
+OR = "OR"
+PRODUCT_PREDICATE = "productPredicate"
+VARIANT_PREDICATE = "variantPredicate"
+CATEGORY_PREDICATE = "categoryPredicate"
+COLLECTION_PREDICATE = "collectionPredicate"
+
+
+class InvalidPredicateError(ValueError):
+    """Exception raised when a catalogue predicate cannot be compiled."""
+
+
+class RuleVariantsDiff(NamedTuple):
+    added: int
+    removed: int
+
+
+def _get_ids(predicate_key: str, value) -> list[int]:
+    ids = value.get("ids") if isinstance(value, dict) else None
+    if not isinstance(ids, list):
+        msg = f"{predicate_key} must be an object with an `ids` list."
+        raise InvalidPredicateError(msg)
+    try:
+        return [int(pk) for pk in ids]
+    except (TypeError, ValueError) as e:
+        msg = f"{predicate_key} contains an invalid id."
+        raise InvalidPredicateError(msg) from e
+
+
+def _compile_category_predicate(ids: list[int]) -> Q:
+    # A category matches its whole subtree, resolved on the MPTT bounds in SQL.
+    categories = Category.objects.filter(
+        pk__in=ids,
+        tree_id=OuterRef("product__category__tree_id"),
+        lft__lte=OuterRef("product__category__lft"),
+        rght__gte=OuterRef("product__category__rght"),
+    )
+    return Q(Exists(categories))
+
+
+def _compile_collection_predicate(ids: list[int]) -> Q:
+    collection_products = CollectionProduct.objects.filter(
+        collection_id__in=ids,
+        product_id=OuterRef("product_id"),
+    )
+    return Q(Exists(collection_products))
+
+
+def _compile_nested_predicates(predicate_key: str, value) -> list[Q]:
+    if not isinstance(value, list):
+        msg = f"{predicate_key} must be a list of predicates."
+        raise InvalidPredicateError(msg)
+    return [compile_catalogue_predicate(nested) for nested in value]
+
+
+_LEAF_PREDICATES = {
+    VARIANT_PREDICATE: lambda ids: Q(pk__in=ids),
+    PRODUCT_PREDICATE: lambda ids: Q(product_id__in=ids),
+    CATEGORY_PREDICATE: _compile_category_predicate,
+    COLLECTION_PREDICATE: _compile_collection_predicate,
+}
+
+
+def compile_catalogue_predicate(predicate: dict) -> Q:
+    """Compile a catalogue predicate into a `Q` object over product variants.
+
+    Sibling keys of a predicate are combined with OR, the items of the `AND` and
+    `OR` lists with the respective operator. An empty predicate matches nothing.
+    """
+    if not isinstance(predicate, dict):
+        msg = "Catalogue predicate must be an object."
+        raise InvalidPredicateError(msg)
+    conditions = []
+    for key, value in predicate.items():
+        if key == AND:
+            nested = _compile_nested_predicates(key, value)
+            if nested:
+                conditions.append(reduce(operator.and_, nested))
+        elif key == OR:
+            conditions.extend(_compile_nested_predicates(key, value))
+        elif key in _LEAF_PREDICATES:
+            conditions.append(_LEAF_PREDICATES[key](_get_ids(key, value)))
+        else:
+            msg = f"Unknown catalogue predicate: {key}."
+            raise InvalidPredicateError(msg)
+    if not conditions:
+        return Q(pk__in=[])
+    return reduce(operator.or_, conditions)
+
+
+def get_variants_for_catalogue_predicate(
+    predicate: dict,
+) -> QuerySet[ProductVariant]:
+    return ProductVariant.objects.filter(
+        compile_catalogue_predicate(predicate),
+    ).order_by()
+
+
+def update_rule_variants(rule: PromotionRule) -> RuleVariantsDiff:
+    """Bring the variants of the rule in line with its catalogue predicate.
+
+    Only the rows that differ from the predicate result are deleted or inserted,
+    and product channel listings of the affected products are marked as dirty,
+    so their discounted prices get recalculated.
+    """
+    variants = get_variants_for_catalogue_predicate(rule.catalogue_predicate)
+    rule_variants = PromotionRule_Variants.objects.filter(promotionrule_id=rule.pk)
+
+    stale_rows = list(
+        rule_variants.exclude(
+            productvariant_id__in=variants.values("pk"),
+        ).values_list("pk", "productvariant__product_id"),
+    )
+    new_variants = list(
+        variants.exclude(
+            Exists(rule_variants.filter(productvariant_id=OuterRef("pk"))),
+        ).values_list("pk", "product_id"),
+    )
+    with transaction.atomic():
+        if stale_rows:
+            PromotionRule_Variants.objects.filter(
+                pk__in=[pk for pk, _product_id in stale_rows],
+            ).delete()
+        PromotionRule_Variants.objects.bulk_create(
+            [
+                PromotionRule_Variants(promotionrule_id=rule.pk, productvariant_id=pk)
+                for pk, _product_id in new_variants
+            ],
+            batch_size=RULE_VARIANTS_BATCH_SIZE,
+        )
+        product_ids = {product_id for _pk, product_id in stale_rows + new_variants}
+        if product_ids:
+            ProductChannelListing.objects.filter(
+                product_id__in=product_ids,
+                channel_id__in=rule.channels.values("pk"),
+                discounted_price_dirty=False,
+            ).update(discounted_price_dirty=True)
+        PromotionRule.objects.filter(pk=rule.pk).update(variants_dirty=False)
+    return RuleVariantsDiff(added=len(new_variants), removed=len(stale_rows))
+
+
+def update_dirty_rules_variants(batch_size: int = RULES_BATCH_SIZE) -> int:
+    """Materialize the variants of a batch of rules marked with `variants_dirty`.
+
+    Return the number of processed rules.
+    """
+    with transaction.atomic():
+        rules = list(
+            PromotionRule.objects.filter(variants_dirty=True)
+            .order_by("pk")
+            .select_for_update(skip_locked=True, of=("self",))
+            .only("id", "catalogue_predicate")[:batch_size],
+        )
+        for rule in rules:
+            try:
+                update_rule_variants(rule)
+            except InvalidPredicateError:
+                # Retrying won't help until the predicate is fixed.
+                logger.exception("Invalid catalogue predicate of rule %s.", rule.pk)
+                PromotionRule.objects.filter(pk=rule.pk).update(variants_dirty=False)
+    return len(rules)
+
+
+def mark_rules_variants_dirty(rule_ids: Iterable[UUID]) -> int:
+    return PromotionRule.objects.filter(
+        pk__in=list(rule_ids),
+        variants_dirty=False,
+    ).update(variants_dirty=True)
+
+
+def _get_leaf_predicates_ids(predicate, ids: dict[str, set[int]]):
+    if not isinstance(predicate, dict):
+        raise InvalidPredicateError
+    for key, value in predicate.items():
+        if key in (AND, OR) and isinstance(value, list):
+            for nested in value:
+                _get_leaf_predicates_ids(nested, ids)
+        elif key in _LEAF_PREDICATES:
+            ids[key].update(_get_ids(key, value))
+        else:
+            raise InvalidPredicateError
+
+
+def mark_new_variant_rules_variants_dirty(variant: ProductVariant) -> int:
+    """Mark rules whose catalogue predicate may match a newly created variant.
+
+    A predicate matches a variant only if one of its leaf predicates does, so rules
+    which don't refer to the variant, its product, the product's categories or its
+    collections are left as they are.
+    """
+    categories = Category.objects.filter(products__pk=variant.product_id)
+    variant_ids = {
+        VARIANT_PREDICATE: {variant.pk},
+        PRODUCT_PREDICATE: {variant.product_id},
+        CATEGORY_PREDICATE: set(
+            Category.tree.get_queryset_ancestors(
+                categories,
+                include_self=True,
+            ).values_list("pk", flat=True),
+        ),
+        COLLECTION_PREDICATE: set(
+            CollectionProduct.objects.filter(
+                product_id=variant.product_id,
+            ).values_list("collection_id", flat=True),
+        ),
+    }
+    rule_ids = []
+    for rule_id, predicate in (
+        PromotionRule.objects.exclude(catalogue_predicate={})
+        .filter(variants_dirty=False)
+        .values_list("pk", "catalogue_predicate")
+    ):
+        predicate_ids: dict[str, set[int]] = defaultdict(set)
+        try:
+            _get_leaf_predicates_ids(predicate, predicate_ids)
+        except InvalidPredicateError:
+            # The rule can't be materialized until the predicate is fixed.
+            continue
+        if any(ids & predicate_ids[key] for key, ids in variant_ids.items()):
+            rule_ids.append(rule_id)
+    return mark_rules_variants_dirty(rule_ids)
+
+
+def mark_catalogue_rules_variants_dirty() -> int:
+    """Mark all rules with a catalogue predicate, after the catalogue changed."""
+    return mark_rules_variants_dirty(
+        PromotionRule.objects.exclude(catalogue_predicate={}).values_list(
+            "pk",
+            flat=True,
+        ),
+    )
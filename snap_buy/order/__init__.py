@@ -342,3 +342,15 @@ class OrderGrantedRefundStatus:
         (SUCCESS, "The refund on related transactionItem is successfully processed"),
         (FAILURE, "The refund on related transactionItem failed"),
     ]
+
+
+class OrderExportFormat:
+    CSV = "csv"
+    JSONL = "jsonl"
+    PARQUET = "parquet"
+
+    CHOICES = [
+        (CSV, "CSV"),
+        (JSONL, "JSON Lines"),
+        (PARQUET, "Parquet"),
+    ]
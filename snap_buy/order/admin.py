@@ -1,9 +1,13 @@
 from django.contrib import admin
 
+from .models import ArchivedOrder
 from .models import Fulfillment
 from .models import FulfillmentLine
 from .models import Order
+from .models import OrderExport
 from .models import OrderLine
+from .models import SalesRollup
+from .models import SalesRollupVariant
 
 
 @admin.register(Order)
@@ -192,3 +196,51 @@ class FulfillmentAdmin(admin.ModelAdmin):
 class FulfillmentLineAdmin(admin.ModelAdmin):
     list_display = ("id", "order_line", "fulfillment", "quantity", "stock")
     list_filter = ("order_line", "fulfillment", "stock")
+
+
+@admin.register(SalesRollup)
+class SalesRollupAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "channel",
+        "period_type",
+        "period_start",
+        "status",
+        "orders_count",
+        "units",
+        "total_net_amount",
+        "total_gross_amount",
+    )
+    list_filter = ("channel", "period_type", "status")
+    date_hierarchy = "period_start"
+
+
+@admin.register(SalesRollupVariant)
+class SalesRollupVariantAdmin(admin.ModelAdmin):
+    list_display = ("id", "channel", "day", "variant", "quantity", "total_gross_amount")
+    list_filter = ("channel",)
+    date_hierarchy = "day"
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ("id", "number", "status", "created_at", "archived_at")
+    list_filter = ("status",)
+    search_fields = ("number", "checkout_token")
+    date_hierarchy = "archived_at"
+
+
+@admin.register(OrderExport)
+class OrderExportAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "file_format",
+        "created_from",
+        "created_to",
+        "status",
+        "lines_exported",
+        "lines_total",
+        "created_at",
+    )
+    list_filter = ("status", "file_format")
+    readonly_fields = ("lines_total", "lines_exported", "last_order_number")
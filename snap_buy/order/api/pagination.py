@@ -0,0 +1,11 @@
+from snap_buy.core.pagination import KeysetPagination
+
+
+class OrderKeysetPagination(KeysetPagination):
+    # Both orderings are backed by an index: `number` is unique and
+    # `order_updated_at_id_idx` covers `(updated_at, id)`.
+    orderings = {
+        "-number": ("-number",),
+        "updated_at": ("updated_at", "id"),
+    }
+    default_ordering = "-number"
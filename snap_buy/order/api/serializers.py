@@ -0,0 +1,29 @@
+from django.conf import settings
+from rest_framework import serializers
+
+
+class OrderListSerializer(serializers.Serializer):
+    """
+    Read-only serializer of the order rows listed by `OrderViewSet`, which are dicts.
+    """
+
+    id = serializers.UUIDField(read_only=True)
+    number = serializers.IntegerField(read_only=True)
+    status = serializers.CharField(read_only=True)
+    charge_status = serializers.CharField(read_only=True)
+    authorize_status = serializers.CharField(read_only=True)
+    channel = serializers.CharField(source="channel_slug", read_only=True)
+    user_email = serializers.EmailField(read_only=True)
+    currency = serializers.CharField(read_only=True)
+    total_net_amount = serializers.DecimalField(
+        max_digits=settings.DEFAULT_MAX_DIGITS,
+        decimal_places=settings.DEFAULT_DECIMAL_PLACES,
+        read_only=True,
+    )
+    total_gross_amount = serializers.DecimalField(
+        max_digits=settings.DEFAULT_MAX_DIGITS,
+        decimal_places=settings.DEFAULT_DECIMAL_PLACES,
+        read_only=True,
+    )
+    created_at = serializers.DateTimeField(read_only=True)
+    updated_at = serializers.DateTimeField(read_only=True)
@@ -0,0 +1,67 @@
+from django.db.models import F
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ParseError
+from rest_framework.mixins import ListModelMixin
+from rest_framework.permissions import IsAdminUser
+from rest_framework.viewsets import GenericViewSet
+
+from snap_buy.order.models import Order
+
+from .pagination import OrderKeysetPagination
+from .serializers import OrderListSerializer
+
+ORDER_LIST_FIELDS = (
+    "id",
+    "number",
+    "status",
+    "charge_status",
+    "authorize_status",
+    "user_email",
+    "currency",
+    "total_net_amount",
+    "total_gross_amount",
+    "created_at",
+    "updated_at",
+)
+
+
+class OrderViewSet(ListModelMixin, GenericViewSet):
+    """
+    List orders for the back-office with keyset pagination.
+
+    Orders can be filtered by `status`, `charge_status` and `channel` (slug), each
+    of which may be repeated, and by `created_after` and `created_before`.
+    """
+
+    serializer_class = OrderListSerializer
+    pagination_class = OrderKeysetPagination
+    permission_classes = [IsAdminUser]
+    queryset = Order.objects.all()
+
+    def get_queryset(self):
+        # A narrow projection instead of model instances with all money fields.
+        orders = (
+            super()
+            .get_queryset()
+            .values(*ORDER_LIST_FIELDS, channel_slug=F("channel__slug"))
+        )
+        return self.filter_queryset(orders)
+
+    def filter_queryset(self, queryset):
+        params = self.request.query_params
+        for field in ("status", "charge_status"):
+            if values := params.getlist(field):
+                queryset = queryset.filter(**{f"{field}__in": values})
+        if channels := params.getlist("channel"):
+            queryset = queryset.filter(channel__slug__in=channels)
+        for param, lookup in (
+            ("created_after", "created_at__gte"),
+            ("created_before", "created_at__lt"),
+        ):
+            if value := params.get(param):
+                created_at = parse_datetime(value)
+                if created_at is None:
+                    msg = f"Invalid `{param}`: {value}."
+                    raise ParseError(msg)
+                queryset = queryset.filter(**{lookup: created_at})
+        return queryset
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class OrdersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "snap_buy.order"
+
+    def ready(self):
+        import snap_buy.order.signals  # noqa: F401
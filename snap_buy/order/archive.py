@@ -0,0 +1,236 @@
+"""Archival of closed orders.
+
+Fulfilled and canceled orders which haven't changed for a while are serialized,
+together with their related rows, into `ArchivedOrder` and deleted from the order
+tables, which keeps the hot tables and their indexes small. `get_order` looks
+orders up in the archive when they aren't found in the order table.
+"""
+
+import datetime
+from collections import defaultdict
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from django.core import serializers
+from django.db import transaction
+from django.db.models import Exists
+from django.db.models import F
+from django.db.models import OuterRef
+from django.http import Http404
+from django.utils import timezone
+
+from snap_buy.payment.models import Payment
+from snap_buy.payment.models import Transaction
+from snap_buy.payment.models import TransactionItem
+from snap_buy.product.models import DigitalContentUrl
+from snap_buy.users.models import Address
+
+from . import OrderStatus
+from .models import ArchivedOrder
+from .models import Fulfillment
+from .models import FulfillmentLine
+from .models import Order
+from .models import OrderGrantedRefund
+from .models import OrderLine
+
+if TYPE_CHECKING:
+    from uuid import UUID
+
+ORDERS_ARCHIVE_BATCH_SIZE = 100
+ARCHIVED_ORDER_STATUSES = (OrderStatus.FULFILLED, OrderStatus.CANCELED)
+# Lookups supported by `get_order`, which are indexed in both tables.
+ORDER_LOOKUPS = ("pk", "id", "number", "checkout_token")
+
+
+def _get_archivable_orders(older_than: datetime.timedelta):
+    # Orders with transaction items, replacement orders or digital content URLs
+    # are kept, deleting them is either protected, would change other orders or
+    # would break the download links sent to customers.
+    return Order.objects.filter(
+        status__in=ARCHIVED_ORDER_STATUSES,
+        updated_at__lt=timezone.now() - older_than,
+    ).exclude(
+        Exists(TransactionItem.objects.filter(order_id=OuterRef("pk")))
+        | Exists(Order.objects.filter(original_id=OuterRef("pk")))
+        | Exists(DigitalContentUrl.objects.filter(line__order_id=OuterRef("pk"))),
+    )
+
+
+def _collect_related_rows(order_ids: list["UUID"]) -> dict["UUID", list]:
+    """Return the rows to archive with each order, parents before children."""
+    rows: dict[UUID, list] = defaultdict(list)
+    orders = (
+        Order.objects.filter(pk__in=order_ids)
+        .select_related("billing_address", "shipping_address")
+        .prefetch_related("gift_cards")
+    )
+    for order in orders:
+        rows[order.pk].extend(
+            address
+            for address in (order.billing_address, order.shipping_address)
+            if address
+        )
+        rows[order.pk].append(order)
+    for model, order_lookup in (
+        (OrderLine, "order_id"),
+        (Fulfillment, "order_id"),
+        (FulfillmentLine, "fulfillment__order_id"),
+        (OrderGrantedRefund, "order_id"),
+        (Payment, "order_id"),
+        (Transaction, "payment__order_id"),
+    ):
+        for instance in model.objects.filter(
+            **{f"{order_lookup}__in": order_ids},
+        ).annotate(archived_order_id=F(order_lookup)):
+            rows[instance.archived_order_id].append(instance)  # type: ignore[union-attr]
+    return rows
+
+
+def _delete_orders(order_ids: list["UUID"], address_ids: list[int]):
+    Transaction.objects.filter(payment__order_id__in=order_ids).delete()
+    Payment.objects.filter(order_id__in=order_ids).delete()
+    Order.objects.filter(pk__in=order_ids).delete()
+    Address.objects.filter(pk__in=address_ids).delete()
+
+
+def archive_orders(
+    older_than: datetime.timedelta | None = None,
+    batch_size: int = ORDERS_ARCHIVE_BATCH_SIZE,
+) -> int:
+    """Archive a batch of closed orders not updated for `older_than`.
+
+    The batch is locked with `SKIP LOCKED`, serialized into `ArchivedOrder` rows
+    and deleted in the same transaction. Return the number of archived orders.
+    """
+    older_than = older_than or settings.ORDER_ARCHIVE_AFTER
+    with transaction.atomic():
+        order_ids = list(
+            _get_archivable_orders(older_than)
+            .order_by("pk")
+            .select_for_update(skip_locked=True, of=("self",))
+            .values_list("pk", flat=True)[:batch_size],
+        )
+        if not order_ids:
+            return 0
+        rows = _collect_related_rows(order_ids)
+        archived_orders = []
+        address_ids: list[int] = []
+        for order_id, instances in rows.items():
+            order = next(
+                instance for instance in instances if isinstance(instance, Order)
+            )
+            address_ids.extend(
+                instance.pk for instance in instances if isinstance(instance, Address)
+            )
+            archived_orders.append(
+                ArchivedOrder(
+                    id=order_id,
+                    number=order.number,
+                    checkout_token=order.checkout_token,
+                    status=order.status,
+                    created_at=order.created_at,
+                    data=serializers.serialize("python", instances),
+                ),
+            )
+        ArchivedOrder.objects.bulk_create(archived_orders)
+        _delete_orders(order_ids, address_ids)
+    return len(order_ids)
+
+
+def _deserialize(archived_order: ArchivedOrder) -> list:
+    return [
+        deserialized.object
+        for deserialized in serializers.deserialize("python", archived_order.data)
+    ]
+
+
+def _set_prefetched(instance, related_name: str, objects: list):
+    """Make `<related_name>.all()` of the instance return the objects."""
+    queryset = getattr(instance, related_name).all()
+    queryset._result_cache = objects  # noqa: SLF001
+    queryset._prefetch_done = True  # noqa: SLF001
+    if not hasattr(instance, "_prefetched_objects_cache"):
+        instance._prefetched_objects_cache = {}  # noqa: SLF001
+    instance._prefetched_objects_cache[related_name] = queryset  # noqa: SLF001
+
+
+def load_archived_order(archived_order: ArchivedOrder) -> Order:
+    """Rebuild an unsaved order from the archive with its relations prefetched.
+
+    `lines`, `fulfillments` (with their `lines`), `granted_refunds` and
+    `payments` (with their `transactions`) are available without queries.
+    """
+    instances = _deserialize(archived_order)
+    by_model = defaultdict(list)
+    for instance in instances:
+        by_model[type(instance)].append(instance)
+    order = by_model[Order][0]
+    order.is_archived = True
+    addresses = {address.pk: address for address in by_model[Address]}
+    order.billing_address = addresses.get(order.billing_address_id)
+    order.shipping_address = addresses.get(order.shipping_address_id)
+
+    lines = {line.pk: line for line in by_model[OrderLine]}
+    fulfillment_lines = defaultdict(list)
+    for fulfillment_line in by_model[FulfillmentLine]:
+        fulfillment_line.order_line = lines[fulfillment_line.order_line_id]
+        fulfillment_lines[fulfillment_line.fulfillment_id].append(fulfillment_line)
+    for fulfillment in by_model[Fulfillment]:
+        _set_prefetched(fulfillment, "lines", fulfillment_lines[fulfillment.pk])
+    transactions = defaultdict(list)
+    for payment_transaction in by_model[Transaction]:
+        transactions[payment_transaction.payment_id].append(payment_transaction)
+    for payment in by_model[Payment]:
+        _set_prefetched(payment, "transactions", transactions[payment.pk])
+
+    _set_prefetched(order, "lines", list(lines.values()))
+    _set_prefetched(order, "fulfillments", by_model[Fulfillment])
+    _set_prefetched(order, "granted_refunds", by_model[OrderGrantedRefund])
+    _set_prefetched(order, "payments", by_model[Payment])
+    return order
+
+
+def get_order(**lookup) -> Order | None:
+    """Return the order by `pk`, `number` or `checkout_token`, even if archived.
+
+    Archived orders are returned unsaved, with `is_archived` set, and must not
+    be saved; use `restore_archived_order` to bring an order back.
+    """
+    if not lookup or set(lookup).difference(ORDER_LOOKUPS):
+        msg = f"Orders can be looked up only by one of: {', '.join(ORDER_LOOKUPS)}."
+        raise ValueError(msg)
+    order = Order.objects.filter(**lookup).first()
+    if order is not None:
+        return order
+    archived_order = ArchivedOrder.objects.filter(**lookup).first()
+    if archived_order is None:
+        return None
+    return load_archived_order(archived_order)
+
+
+def get_order_or_404(**lookup) -> Order:
+    """Return the order like `get_order`, raise `Http404` if it doesn't exist.
+
+    For read-only lookups; callers which save the order or start its payment use
+    `get_object_or_404(Order, ...)`, as archived orders are closed.
+    """
+    order = get_order(**lookup)
+    if order is None:
+        msg = "No order matches the given query."
+        raise Http404(msg)
+    return order
+
+
+def restore_archived_order(order_id: "UUID") -> Order:
+    """Move an archived order back to the order tables.
+
+    The order is marked as updated, so it isn't archived again right away and its
+    sales rollups are refreshed.
+    """
+    with transaction.atomic():
+        archived_order = ArchivedOrder.objects.select_for_update().get(pk=order_id)
+        for deserialized in serializers.deserialize("python", archived_order.data):
+            deserialized.save()
+        archived_order.delete()
+        Order.objects.filter(pk=order_id).update(updated_at=timezone.now())
+    return Order.objects.get(pk=order_id)
@@ -0,0 +1,568 @@
+"""Bulk import of orders from JSON rows.
+
+A row describes a single order::
+
+    {
+        "external_reference": "MP-1001",
+        "channel": "default-channel",
+        "user_email": "customer@example.com",
+        "status": "fulfilled",
+        "created_at": "2024-05-01T10:00:00+00:00",
+        "billing_address": {"first_name": "Jane", "country": "US", ...},
+        "shipping_address": {...},
+        "shipping_price_net": "5.00",
+        "shipping_price_gross": "6.15",
+        "lines": [
+            {"sku": "SKU-1", "quantity": 2, "unit_price_net": "10.00",
+             "unit_price_gross": "12.30"}
+        ],
+        "fulfillments": [
+            {"tracking_number": "", "lines": [{"line": 0, "quantity": 2}]}
+        ],
+        "payments": [
+            {"gateway": "mirumee.payments.dummy", "psp_reference": "PSP-1",
+             "total": "30.75", "captured_amount": "30.75",
+             "charge_status": "fully-charged"}
+        ]
+    }
+
+Fulfillment lines point to order lines by their index. The status is derived
+from the fulfillments when it is not given, the charge and authorize statuses
+are always derived from the payments. A fully charged payment without
+`captured_amount` captured its whole total.
+"""
+
+import datetime
+from collections import Counter
+from collections.abc import Iterable
+from collections.abc import Iterator
+from dataclasses import dataclass
+from dataclasses import field
+from decimal import Decimal
+from decimal import InvalidOperation
+from itertools import islice
+from typing import NamedTuple
+
+from django.core.exceptions import ValidationError
+from django.core.validators import DecimalValidator
+from django.db import DataError
+from django.db import IntegrityError
+from django.db import models
+from django.db import transaction
+from django.db.models import F
+from django.db.models import FloatField
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+
+from snap_buy.channel.models import Channel
+from snap_buy.payment import ChargeStatus
+from snap_buy.payment.models import Payment
+from snap_buy.product import ProductTypeKind
+from snap_buy.product.models import ProductVariant
+from snap_buy.users.models import Address
+
+from . import OrderAuthorizeStatus
+from . import OrderChargeStatus
+from . import OrderOrigin
+from . import OrderStatus
+from .models import Fulfillment
+from .models import FulfillmentLine
+from .models import Order
+from .models import OrderLine
+from .numbers import reserve_order_numbers
+from .totals import calculate_line_totals
+from .totals import calculate_order_totals
+
+ORDERS_IMPORT_CHUNK_SIZE = 1000
+
+ADDRESS_FIELDS = (
+    "first_name",
+    "last_name",
+    "company_name",
+    "street_address_1",
+    "street_address_2",
+    "city",
+    "city_area",
+    "postal_code",
+    "country_area",
+    "phone",
+)
+ORDER_STATUSES = {status for status, _label in OrderStatus.CHOICES}
+CHARGE_STATUSES = {status for status, _label in ChargeStatus.CHOICES}
+
+
+class InvalidOrderRowError(ValueError):
+    """Exception raised when an imported row doesn't describe a valid order."""
+
+
+@dataclass
+class OrderImportError:
+    row: int
+    external_reference: str | None
+    message: str
+
+
+@dataclass
+class OrderImportResult:
+    created: int = 0
+    skipped: int = 0
+    errors: list[OrderImportError] = field(default_factory=list)
+
+
+class VariantData(NamedTuple):
+    pk: int
+    product_name: str
+    variant_name: str
+    is_shipping_required: bool
+    is_gift_card: bool
+    weight: float | None
+
+
+class VariantCache:
+    """Variants looked up by SKU, filled with one query per batch of SKUs."""
+
+    def __init__(self):
+        self._variants: dict[str, VariantData | None] = {}
+
+    def load(self, skus: Iterable[str]):
+        missing = set(skus).difference(self._variants)
+        if not missing:
+            return
+        self._variants.update(dict.fromkeys(missing))
+        variants = (
+            ProductVariant.objects.filter(sku__in=missing)
+            .annotate(
+                product_name=F("product__name"),
+                is_shipping_required=F("product__product_type__is_shipping_required"),
+                product_type_kind=F("product__product_type__kind"),
+                effective_weight=Coalesce(
+                    "weight",
+                    "product__weight",
+                    "product__product_type__weight",
+                    output_field=FloatField(),
+                ),
+            )
+            .values_list(
+                "sku",
+                "pk",
+                "product_name",
+                "name",
+                "is_shipping_required",
+                "product_type_kind",
+                "effective_weight",
+            )
+        )
+        for sku, pk, product_name, name, shipping, kind, weight in variants:
+            self._variants[sku] = VariantData(
+                pk=pk,
+                product_name=product_name,
+                variant_name=name,
+                is_shipping_required=shipping,
+                is_gift_card=kind == ProductTypeKind.GIFT_CARD,
+                weight=weight,
+            )
+
+    def get(self, sku: str) -> VariantData | None:
+        return self._variants.get(sku)
+
+
+@dataclass
+class ImportedOrder:
+    """Unsaved rows of a single imported order."""
+
+    row: int
+    order: Order
+    addresses: list[Address] = field(default_factory=list)
+    lines: list[OrderLine] = field(default_factory=list)
+    fulfillments: list[Fulfillment] = field(default_factory=list)
+    fulfillment_lines: list[FulfillmentLine] = field(default_factory=list)
+    payments: list[Payment] = field(default_factory=list)
+
+
+def _decimal(
+    data: dict,
+    key: str,
+    model_field: models.DecimalField,
+    default: str | None = None,
+) -> Decimal:
+    """Return the value as a decimal which fits into the model field."""
+    value = data.get(key, default)
+    if value is None:
+        msg = f"Missing `{key}`."
+        raise InvalidOrderRowError(msg)
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation as e:
+        msg = f"Invalid `{key}`: {value}."
+        raise InvalidOrderRowError(msg) from e
+    validator = DecimalValidator(model_field.max_digits, model_field.decimal_places)
+    try:
+        validator(number)
+    except ValidationError as e:
+        msg = f"Invalid `{key}`: {value}. {' '.join(e.messages)}"
+        raise InvalidOrderRowError(msg) from e
+    return number
+
+
+def _datetime(data: dict, key: str) -> datetime.datetime:
+    try:
+        value = parse_datetime(data[key])
+    except ValueError:
+        # Well formatted, but not a valid date.
+        value = None
+    if value is None:
+        msg = f"Invalid `{key}`: {data[key]}."
+        raise InvalidOrderRowError(msg)
+    return value
+
+
+def _positive_int(data: dict, key: str) -> int:
+    try:
+        value = int(data[key])
+    except (KeyError, TypeError, ValueError) as e:
+        msg = f"Missing or invalid `{key}`."
+        raise InvalidOrderRowError(msg) from e
+    if value < 1:
+        msg = f"`{key}` must be positive."
+        raise InvalidOrderRowError(msg)
+    return value
+
+
+def _build_address(data: dict | None) -> Address | None:
+    if data is None:
+        return None
+    if not isinstance(data, dict) or not data.get("country"):
+        msg = "An address must be an object with a `country`."
+        raise InvalidOrderRowError(msg)
+    return Address(
+        country=data["country"],
+        **{name: data.get(name) or "" for name in ADDRESS_FIELDS},
+    )
+
+
+def _build_line(data: dict, order: Order, variants: VariantCache) -> OrderLine:
+    variant = variants.get(data.get("sku", ""))
+    if variant is None:
+        msg = f"Unknown SKU: {data.get('sku')}."
+        raise InvalidOrderRowError(msg)
+    unit_price_net = _decimal(
+        data,
+        "unit_price_net",
+        OrderLine.unit_price_net_amount.field,
+    )
+    unit_price_gross = _decimal(
+        data,
+        "unit_price_gross",
+        OrderLine.unit_price_gross_amount.field,
+    )
+    line = OrderLine(
+        order=order,
+        variant_id=variant.pk,
+        product_name=data.get("product_name") or variant.product_name,
+        variant_name=variant.variant_name,
+        product_sku=data["sku"],
+        product_variant_id=str(variant.pk),
+        is_shipping_required=variant.is_shipping_required,
+        is_gift_card=variant.is_gift_card,
+        quantity=_positive_int(data, "quantity"),
+        currency=order.currency,
+        unit_price_net_amount=unit_price_net,
+        unit_price_gross_amount=unit_price_gross,
+        undiscounted_unit_price_net_amount=unit_price_net,
+        undiscounted_unit_price_gross_amount=unit_price_gross,
+        base_unit_price_amount=unit_price_net,
+        undiscounted_base_unit_price_amount=unit_price_net,
+    )
+    line.variant_weight = variant.weight  # type: ignore[attr-defined]
+    for name, value in calculate_line_totals(line).items():
+        setattr(line, name, value)
+    return line
+
+
+def _build_fulfillments(imported: ImportedOrder, fulfillments: list[dict]):
+    fulfilled: Counter[int] = Counter()
+    imported.order.last_fulfillment_order = len(fulfillments)
+    for number, data in enumerate(fulfillments, start=1):
+        fulfillment = Fulfillment(
+            order=imported.order,
+            fulfillment_order=number,
+            tracking_number=data.get("tracking_number") or "",
+        )
+        imported.fulfillments.append(fulfillment)
+        for line_data in data.get("lines") or []:
+            index = line_data.get("line")
+            if not isinstance(index, int) or not 0 <= index < len(imported.lines):
+                msg = f"Fulfillment {number} points to an unknown line: {index}."
+                raise InvalidOrderRowError(msg)
+            quantity = _positive_int(line_data, "quantity")
+            fulfilled[index] += quantity
+            imported.fulfillment_lines.append(
+                FulfillmentLine(
+                    order_line=imported.lines[index],
+                    fulfillment=fulfillment,
+                    quantity=quantity,
+                ),
+            )
+    for index, quantity in fulfilled.items():
+        line = imported.lines[index]
+        if quantity > line.quantity:
+            msg = f"Line {index} is fulfilled more than ordered."
+            raise InvalidOrderRowError(msg)
+        line.quantity_fulfilled = quantity
+
+
+def _build_payment(data: dict, order: Order) -> Payment:
+    charge_status = data.get("charge_status", ChargeStatus.FULLY_CHARGED)
+    if charge_status not in CHARGE_STATUSES:
+        msg = f"Unknown charge status: {charge_status}."
+        raise InvalidOrderRowError(msg)
+    total = _decimal(data, "total", Payment.total.field)
+    # A fully charged payment captured its total unless the row says otherwise.
+    captured_amount = total if charge_status == ChargeStatus.FULLY_CHARGED else 0
+    return Payment(
+        order=order,
+        gateway=data.get("gateway") or "",
+        psp_reference=data.get("psp_reference"),
+        charge_status=charge_status,
+        total=total,
+        captured_amount=_decimal(
+            data,
+            "captured_amount",
+            Payment.captured_amount.field,
+            default=str(captured_amount),
+        ),
+        currency=order.currency,
+    )
+
+
+def _derive_charge_data(order: Order, payments: list[Payment]):
+    """Set the charged and authorized amounts and statuses from the payments.
+
+    Funds of payments which are not charged yet count as authorized. The order
+    totals have to be calculated first.
+    """
+    charged = sum((payment.captured_amount for payment in payments), Decimal(0))
+    authorized = sum(
+        (
+            payment.total
+            for payment in payments
+            if payment.charge_status == ChargeStatus.NOT_CHARGED
+        ),
+        Decimal(0),
+    )
+    total = order.total_gross_amount
+    order.total_charged_amount = charged
+    order.total_authorized_amount = authorized
+    if charged <= 0:
+        order.charge_status = OrderChargeStatus.NONE
+    elif charged < total:
+        order.charge_status = OrderChargeStatus.PARTIAL
+    elif charged == total:
+        order.charge_status = OrderChargeStatus.FULL
+    else:
+        order.charge_status = OrderChargeStatus.OVERCHARGED
+    if charged + authorized <= 0:
+        order.authorize_status = OrderAuthorizeStatus.NONE
+    elif charged + authorized < total:
+        order.authorize_status = OrderAuthorizeStatus.PARTIAL
+    else:
+        order.authorize_status = OrderAuthorizeStatus.FULL
+
+
+def _derive_status(lines: list[OrderLine]) -> str:
+    fulfilled = sum(line.quantity_fulfilled for line in lines)
+    if not fulfilled:
+        return OrderStatus.UNFULFILLED
+    if fulfilled < sum(line.quantity for line in lines):
+        return OrderStatus.PARTIALLY_FULFILLED
+    return OrderStatus.FULFILLED
+
+
+def _build_order(
+    row: int,
+    data: dict,
+    channels: dict[str, Channel],
+    variants: VariantCache,
+) -> ImportedOrder:
+    if not isinstance(data, dict):
+        msg = "A row must be an object."
+        raise InvalidOrderRowError(msg)
+    channel = channels.get(data.get("channel", ""))
+    if channel is None:
+        msg = f"Unknown channel: {data.get('channel')}."
+        raise InvalidOrderRowError(msg)
+    status = data.get("status")
+    if status is not None and status not in ORDER_STATUSES:
+        msg = f"Unknown status: {status}."
+        raise InvalidOrderRowError(msg)
+    if not data.get("lines"):
+        msg = "An order needs at least one line."
+        raise InvalidOrderRowError(msg)
+
+    shipping_price_net = _decimal(
+        data,
+        "shipping_price_net",
+        Order.shipping_price_net_amount.field,
+        default="0",
+    )
+    order = Order(
+        number=0,
+        external_reference=data.get("external_reference"),
+        channel=channel,
+        currency=data.get("currency") or channel.currency_code,
+        origin=OrderOrigin.BULK_CREATE,
+        user_email=data.get("user_email") or "",
+        shipping_price_net_amount=shipping_price_net,
+        shipping_price_gross_amount=_decimal(
+            data,
+            "shipping_price_gross",
+            Order.shipping_price_gross_amount.field,
+            default=str(shipping_price_net),
+        ),
+        base_shipping_price_amount=shipping_price_net,
+        undiscounted_base_shipping_price_amount=shipping_price_net,
+        should_refresh_prices=False,
+        search_index_dirty=True,
+    )
+    if data.get("created_at"):
+        order.created_at = _datetime(data, "created_at")
+
+    imported = ImportedOrder(row=row, order=order)
+    for key in ("billing_address", "shipping_address"):
+        address = _build_address(data.get(key))
+        if address is not None:
+            setattr(order, key, address)
+            imported.addresses.append(address)
+    imported.lines = [
+        _build_line(line_data, order, variants) for line_data in data["lines"]
+    ]
+    _build_fulfillments(imported, data.get("fulfillments") or [])
+    imported.payments = [
+        _build_payment(payment_data, order)
+        for payment_data in data.get("payments") or []
+    ]
+    order.status = status or _derive_status(imported.lines)
+    for name, value in calculate_order_totals(order, imported.lines).items():
+        setattr(order, name, value)
+    _derive_charge_data(order, imported.payments)
+    return imported
+
+
+def _write_orders(imported_orders: list[ImportedOrder]):
+    numbers = reserve_order_numbers(len(imported_orders))
+    for imported, number in zip(imported_orders, numbers, strict=True):
+        imported.order.number = number
+    with transaction.atomic():
+        Address.objects.bulk_create(
+            [address for imported in imported_orders for address in imported.addresses],
+        )
+        Order.objects.bulk_create([imported.order for imported in imported_orders])
+        for model, attribute in (
+            (OrderLine, "lines"),
+            (Fulfillment, "fulfillments"),
+            (FulfillmentLine, "fulfillment_lines"),
+            (Payment, "payments"),
+        ):
+            model.objects.bulk_create(
+                [
+                    instance
+                    for imported in imported_orders
+                    for instance in getattr(imported, attribute)
+                ],
+            )
+
+
+def _write_chunk(imported_orders: list[ImportedOrder], result: OrderImportResult):
+    try:
+        _write_orders(imported_orders)
+    except (DataError, ValidationError):
+        # A value rejected by the database fails the whole chunk, so the orders
+        # are written one by one to report only the failing rows.
+        for imported in imported_orders:
+            try:
+                _write_orders([imported])
+            except (DataError, ValidationError) as e:
+                result.errors.append(
+                    OrderImportError(
+                        imported.row,
+                        imported.order.external_reference,
+                        str(e),
+                    ),
+                )
+            else:
+                result.created += 1
+    else:
+        result.created += len(imported_orders)
+
+
+def _import_chunk(
+    chunk: list[tuple[int, dict]],
+    channels: dict[str, Channel],
+    variants: VariantCache,
+) -> OrderImportResult:
+    result = OrderImportResult()
+    references = [
+        data.get("external_reference") for _row, data in chunk if isinstance(data, dict)
+    ]
+    existing = set(
+        Order.objects.filter(external_reference__in=references).values_list(
+            "external_reference",
+            flat=True,
+        ),
+    )
+    variants.load(
+        line.get("sku", "")
+        for _row, data in chunk
+        if isinstance(data, dict)
+        for line in data.get("lines") or []
+        if isinstance(line, dict)
+    )
+    imported_orders = []
+    seen = set()
+    for row, data in chunk:
+        reference = data.get("external_reference") if isinstance(data, dict) else None
+        if reference is not None and (reference in existing or reference in seen):
+            result.skipped += 1
+            continue
+        try:
+            imported_orders.append(_build_order(row, data, channels, variants))
+        except (ValueError, AttributeError, TypeError) as e:
+            result.errors.append(OrderImportError(row, reference, str(e)))
+            continue
+        if reference is not None:
+            seen.add(reference)
+    if imported_orders:
+        _write_chunk(imported_orders, result)
+    return result
+
+
+def import_orders(
+    rows: Iterable[dict],
+    chunk_size: int = ORDERS_IMPORT_CHUNK_SIZE,
+) -> OrderImportResult:
+    """Import orders from parsed JSON rows in chunks.
+
+    Every chunk is validated first and then written with one `bulk_create` per
+    model in a single transaction. Rows whose `external_reference` already exists
+    are skipped, so an interrupted import can be run again. Invalid rows are
+    reported and don't stop the rest of the import.
+    """
+    channels = {channel.slug: channel for channel in Channel.objects.all()}
+    variants = VariantCache()
+    result = OrderImportResult()
+    numbered_rows: Iterator[tuple[int, dict]] = enumerate(rows, start=1)
+    while chunk := list(islice(numbered_rows, chunk_size)):
+        try:
+            chunk_result = _import_chunk(chunk, channels, variants)
+        except IntegrityError:
+            # Orders created concurrently are skipped on the second attempt.
+            try:
+                chunk_result = _import_chunk(chunk, channels, variants)
+            except IntegrityError as e:
+                chunk_result = OrderImportResult(
+                    errors=[OrderImportError(row, None, str(e)) for row, _ in chunk],
+                )
+        result.created += chunk_result.created
+        result.skipped += chunk_result.skipped
+        result.errors.extend(chunk_result.errors)
+    return result
@@ -0,0 +1,136 @@
+from collections.abc import Iterable
+from datetime import timedelta
+from typing import TYPE_CHECKING
+
+from django.db import transaction
+from django.db.models import Exists
+from django.db.models import OuterRef
+from django.db.models import Q
+from django.utils import timezone
+
+from snap_buy.channel.models import Channel
+from snap_buy.payment.models import Payment
+from snap_buy.payment.models import TransactionItem
+from snap_buy.warehouse.allocations import delete_allocations
+from snap_buy.warehouse.models import Allocation
+from snap_buy.warehouse.preorders import deallocate_preorders
+
+from . import OrderAuthorizeStatus
+from . import OrderChargeStatus
+from . import OrderStatus
+from .models import Order
+from .models import OrderLine
+
+if TYPE_CHECKING:
+    from uuid import UUID
+
+ORDERS_EXPIRATION_BATCH_SIZE = 100
+EXPIRED_ORDERS_DELETION_BATCH_SIZE = 100
+
+
+def _channels_cutoff_filter(field: str, channel_cutoffs: Iterable[tuple]) -> Q | None:
+    """Combine per-channel `<field> < cutoff` conditions into a single filter."""
+    lookup: Q | None = None
+    for channel_id, cutoff in channel_cutoffs:
+        condition = Q(channel_id=channel_id, **{f"{field}__lt": cutoff})
+        lookup = condition if lookup is None else lookup | condition
+    return lookup
+
+
+def _lock_orders(orders, batch_size: int) -> list["UUID"]:
+    return list(
+        orders.order_by("pk")
+        .select_for_update(skip_locked=True, of=("self",))
+        .values_list("pk", flat=True)[:batch_size],
+    )
+
+
+def release_orders_allocations(order_ids: Iterable["UUID"]):
+    """Release stock and preorder allocations of orders in bulk."""
+    line_ids = list(
+        OrderLine.objects.filter(order_id__in=list(order_ids)).values_list(
+            "pk",
+            flat=True,
+        ),
+    )
+    with transaction.atomic():
+        delete_allocations(
+            Allocation.objects.filter(order_line_id__in=line_ids).values_list(
+                "pk",
+                flat=True,
+            ),
+        )
+        deallocate_preorders(line_ids)
+
+
+def expire_orders(batch_size: int = ORDERS_EXPIRATION_BATCH_SIZE) -> int:
+    """Expire a batch of unpaid unconfirmed orders older than their channel allows.
+
+    Only channels with `expire_orders_after` (in minutes) set are swept. The
+    orders are locked with `SKIP LOCKED`, so concurrent workers and checkouts
+    completing payment never wait on the sweeper. Return the number of expired
+    orders.
+    """
+    now = timezone.now()
+    lookup = _channels_cutoff_filter(
+        "created_at",
+        (
+            (channel_id, now - timedelta(minutes=expire_after or 0))
+            for channel_id, expire_after in Channel.objects.filter(
+                expire_orders_after__gt=0,
+            ).values_list("pk", "expire_orders_after")
+        ),
+    )
+    if lookup is None:
+        return 0
+    orders = Order.objects.filter(
+        lookup,
+        status=OrderStatus.UNCONFIRMED,
+        charge_status=OrderChargeStatus.NONE,
+        authorize_status=OrderAuthorizeStatus.NONE,
+    )
+    with transaction.atomic():
+        order_ids = _lock_orders(orders, batch_size)
+        if not order_ids:
+            return 0
+        release_orders_allocations(order_ids)
+        Order.objects.filter(pk__in=order_ids).update(
+            status=OrderStatus.EXPIRED,
+            expired_at=now,
+            updated_at=now,
+        )
+    return len(order_ids)
+
+
+def delete_expired_orders(
+    batch_size: int = EXPIRED_ORDERS_DELETION_BATCH_SIZE,
+) -> int:
+    """Delete a batch of orders expired for longer than their channel retention.
+
+    Orders with payments or transactions are kept. The batch is small and
+    locked with `SKIP LOCKED`, so each transaction holds locks on `order_order`
+    only briefly. Return the number of deleted orders.
+    """
+    now = timezone.now()
+    lookup = _channels_cutoff_filter(
+        "expired_at",
+        (
+            (channel_id, now - delete_after)
+            for channel_id, delete_after in Channel.objects.values_list(
+                "pk",
+                "delete_expired_orders_after",
+            )
+        ),
+    )
+    if lookup is None:
+        return 0
+    orders = Order.objects.filter(lookup, status=OrderStatus.EXPIRED).exclude(
+        Exists(Payment.objects.filter(order_id=OuterRef("pk")))
+        | Exists(TransactionItem.objects.filter(order_id=OuterRef("pk"))),
+    )
+    with transaction.atomic():
+        order_ids = _lock_orders(orders, batch_size)
+        if not order_ids:
+            return 0
+        Order.objects.filter(pk__in=order_ids).delete()
+    return len(order_ids)
@@ -0,0 +1,358 @@
+"""Streaming export of order lines for accounting.
+
+Lines are read as tuples from a server-side cursor, ordered by order number,
+merged with the lines of archived orders, and written to part files in
+`ORDER_EXPORT_SPOOL_DIR`. Every part ends on an order boundary and is a checkpoint
+from which an interrupted export resumes. When all parts are written, they are
+merged into the export file saved to `OrderExport.content_file`. Memory use
+depends on the chunk sizes only, not on the number of exported lines.
+"""
+
+import csv
+import heapq
+import json
+import shutil
+from collections.abc import Callable
+from collections.abc import Generator
+from collections.abc import Iterator
+from contextlib import closing
+from contextlib import contextmanager
+from operator import attrgetter
+from operator import itemgetter
+from typing import TYPE_CHECKING
+from typing import cast
+
+from django.conf import settings
+from django.core.files import File
+from django.db import models
+from django.db.models import IntegerField
+from django.db.models import Sum
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+from snap_buy.channel.models import Channel
+from snap_buy.core import JobStatus
+from snap_buy.core.utils.json_serializer import PreciseJsonEncoder
+
+from . import OrderExportFormat
+from .archive import load_archived_order
+from .models import ArchivedOrder
+from .models import OrderExport
+from .models import OrderLine
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+# Lines written to a part, which is extended to the end of its last order.
+ORDER_EXPORT_PART_SIZE = 100_000
+# Rows fetched from the server-side cursor and written at once.
+ORDER_EXPORT_CHUNK_SIZE = 2000
+# Archived orders fetched and deserialized at once.
+ORDER_EXPORT_ARCHIVED_CHUNK_SIZE = 500
+ORDER_EXPORT_PARQUET_ROW_GROUP_SIZE = 100_000
+# Column names and `OrderLine` lookups; the order number must come first.
+ORDER_EXPORT_FIELDS = (
+    ("order_number", "order__number"),
+    ("order_created_at", "order__created_at"),
+    ("order_status", "order__status"),
+    ("channel", "order__channel__slug"),
+    ("currency", "currency"),
+    ("order_subtotal_net", "order__subtotal_net_amount"),
+    ("order_subtotal_gross", "order__subtotal_gross_amount"),
+    ("order_shipping_net", "order__shipping_price_net_amount"),
+    ("order_shipping_gross", "order__shipping_price_gross_amount"),
+    ("order_total_net", "order__total_net_amount"),
+    ("order_total_gross", "order__total_gross_amount"),
+    ("line_id", "id"),
+    ("product_sku", "product_sku"),
+    ("quantity", "quantity"),
+    ("unit_discount", "unit_discount_amount"),
+    ("unit_price_net", "unit_price_net_amount"),
+    ("unit_price_gross", "unit_price_gross_amount"),
+    ("total_price_net", "total_price_net_amount"),
+    ("total_price_gross", "total_price_gross_amount"),
+    ("tax_rate", "tax_rate"),
+)
+ORDER_EXPORT_HEADERS = [header for header, _ in ORDER_EXPORT_FIELDS]
+
+
+def _get_export_fields() -> list[models.Field]:
+    fields = []
+    for _, lookup in ORDER_EXPORT_FIELDS:
+        model: type[models.Model] = OrderLine
+        *relations, name = lookup.split("__")
+        for relation in relations:
+            field = model._meta.get_field(relation)  # noqa: SLF001
+            model = cast(type[models.Model], field.related_model)
+        fields.append(cast(models.Field, model._meta.get_field(name)))  # noqa: SLF001
+    return fields
+
+
+def _get_arrow_schema():
+    import pyarrow as pa
+
+    arrow_fields = []
+    for header, field in zip(ORDER_EXPORT_HEADERS, _get_export_fields(), strict=True):
+        if isinstance(field, models.DecimalField):
+            arrow_type = pa.decimal128(field.max_digits, field.decimal_places)
+        elif isinstance(field, models.DateTimeField):
+            arrow_type = pa.timestamp("us", tz="UTC")
+        elif isinstance(field, models.IntegerField):
+            arrow_type = pa.int64()
+        else:
+            arrow_type = pa.string()
+        arrow_fields.append(pa.field(header, arrow_type, nullable=field.null))
+    return pa.schema(arrow_fields)
+
+
+@contextmanager
+def _csv_writer(path: "Path") -> Iterator[Callable[[list[tuple]], None]]:
+    with path.open("w", newline="") as f:
+        yield csv.writer(f).writerows
+
+
+@contextmanager
+def _jsonl_writer(path: "Path") -> Iterator[Callable[[list[tuple]], None]]:
+    with path.open("w") as f:
+
+        def write(rows: list[tuple]):
+            f.writelines(
+                json.dumps(
+                    dict(zip(ORDER_EXPORT_HEADERS, row, strict=True)),
+                    cls=PreciseJsonEncoder,
+                )
+                + "\n"
+                for row in rows
+            )
+
+        yield write
+
+
+@contextmanager
+def _parquet_writer(path: "Path") -> Iterator[Callable[[list[tuple]], None]]:
+    import pyarrow as pa
+    from pyarrow import parquet
+
+    schema = _get_arrow_schema()
+    uuid_columns = {
+        index
+        for index, field in enumerate(_get_export_fields())
+        if isinstance(field, models.UUIDField)
+    }
+    with parquet.ParquetWriter(path, schema) as writer:
+
+        def write(rows: list[tuple]):
+            columns = [
+                pa.array(
+                    [str(value) for value in column]
+                    if index in uuid_columns
+                    else column,
+                    type=schema.field(index).type,
+                )
+                for index, column in enumerate(zip(*rows, strict=True))
+            ]
+            writer.write_batch(pa.record_batch(columns, schema=schema))
+
+        yield write
+
+
+PART_WRITERS = {
+    OrderExportFormat.CSV: _csv_writer,
+    OrderExportFormat.JSONL: _jsonl_writer,
+    OrderExportFormat.PARQUET: _parquet_writer,
+}
+
+
+def _get_spool_dir(export: OrderExport) -> "Path":
+    return settings.ORDER_EXPORT_SPOOL_DIR / str(export.pk)
+
+
+def _get_part_path(export: OrderExport, index: int) -> "Path":
+    return _get_spool_dir(export) / f"part-{index:06d}.{export.file_format}"
+
+
+def _get_lines(export: OrderExport):
+    return OrderLine.objects.filter(
+        order__created_at__gte=export.created_from,
+        order__created_at__lt=export.created_to,
+    )
+
+
+def _get_archived_orders(export: OrderExport):
+    return ArchivedOrder.objects.filter(
+        created_at__gte=export.created_from,
+        created_at__lt=export.created_to,
+    )
+
+
+def _count_lines(export: OrderExport) -> int:
+    """Count the lines to export, including lines of archived orders."""
+    archived_lines = RawSQL(
+        "SELECT count(*) FROM jsonb_array_elements(data) AS row "
+        "WHERE row->>'model' = %s",
+        (OrderLine._meta.label_lower,),  # noqa: SLF001
+        output_field=IntegerField(),
+    )
+    archived_lines_count = _get_archived_orders(export).aggregate(
+        total=Coalesce(Sum(archived_lines), 0),
+    )["total"]
+    return _get_lines(export).count() + archived_lines_count
+
+
+def _get_archived_value(order, line: OrderLine, lookup: str, channel_slugs: dict):
+    if lookup == "order__channel__slug":
+        return channel_slugs.get(order.channel_id)
+    if lookup.startswith("order__"):
+        return getattr(order, lookup.removeprefix("order__"))
+    return getattr(line, lookup)
+
+
+def _iter_archived_rows(export: OrderExport) -> Generator[tuple, None, None]:
+    archived_orders = _get_archived_orders(export)
+    if export.last_order_number is not None:
+        archived_orders = archived_orders.filter(number__gt=export.last_order_number)
+    channel_slugs = dict(Channel.objects.values_list("pk", "slug"))
+    for archived_order in archived_orders.order_by("number").iterator(
+        chunk_size=ORDER_EXPORT_ARCHIVED_CHUNK_SIZE,
+    ):
+        order = load_archived_order(archived_order)
+        for line in sorted(order.lines.all(), key=attrgetter("pk")):
+            yield tuple(
+                _get_archived_value(order, line, lookup, channel_slugs)
+                for _, lookup in ORDER_EXPORT_FIELDS
+            )
+
+
+def _iter_rows(export: OrderExport) -> Generator[tuple, None, None]:
+    lines = _get_lines(export)
+    if export.last_order_number is not None:
+        lines = lines.filter(order__number__gt=export.last_order_number)
+    rows = (
+        lines.order_by("order__number", "pk")
+        .values_list(*(lookup for _, lookup in ORDER_EXPORT_FIELDS))
+        .iterator(chunk_size=ORDER_EXPORT_CHUNK_SIZE)
+    )
+    archived_rows = _iter_archived_rows(export)
+    with closing(rows), closing(archived_rows):
+        yield from heapq.merge(rows, archived_rows, key=itemgetter(0))
+
+
+def prepare_order_export(export: OrderExport):
+    """Drop parts written after the last checkpoint and count the lines to export.
+
+    If checkpointed parts are missing, e.g. when the spool directory isn't shared
+    by the workers, the export starts over.
+    """
+    spool_dir = _get_spool_dir(export)
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    checkpointed = {
+        _get_part_path(export, index) for index in range(1, export.parts_count + 1)
+    }
+    existing = set(spool_dir.iterdir())
+    for path in existing - checkpointed:
+        path.unlink()
+    if not checkpointed.issubset(existing):
+        for path in existing & checkpointed:
+            path.unlink()
+        export.parts_count = 0
+        export.lines_exported = 0
+        export.last_order_number = None
+    if export.lines_total is None:
+        export.lines_total = _count_lines(export)
+    export.save(
+        update_fields=[
+            "parts_count",
+            "lines_exported",
+            "last_order_number",
+            "lines_total",
+            "updated_at",
+        ],
+    )
+
+
+def write_order_export_part(export: OrderExport) -> bool:
+    """Write the next part of the export and checkpoint it.
+
+    Return `False` when there are no more lines to export.
+    """
+    index = export.parts_count + 1
+    path = _get_part_path(export, index)
+    tmp_path = path.with_suffix(".tmp")
+    lines_count = 0
+    last_order_number = None
+    chunk: list[tuple] = []
+    write_part = PART_WRITERS[export.file_format]
+    with write_part(tmp_path) as write, closing(_iter_rows(export)) as rows:
+        for row in rows:
+            order_number = row[0]
+            if (
+                lines_count >= ORDER_EXPORT_PART_SIZE
+                and order_number != last_order_number
+            ):
+                break
+            chunk.append(row)
+            lines_count += 1
+            last_order_number = order_number
+            if len(chunk) == ORDER_EXPORT_CHUNK_SIZE:
+                write(chunk)
+                chunk = []
+        if chunk:
+            write(chunk)
+    if not lines_count:
+        tmp_path.unlink()
+        return False
+    tmp_path.rename(path)
+    export.parts_count = index
+    export.lines_exported += lines_count
+    export.last_order_number = last_order_number
+    export.save(
+        update_fields=[
+            "parts_count",
+            "lines_exported",
+            "last_order_number",
+            "updated_at",
+        ],
+    )
+    return True
+
+
+def _merge_parquet_parts(parts: list["Path"], path: "Path"):
+    from pyarrow import parquet
+
+    with parquet.ParquetWriter(path, _get_arrow_schema()) as writer:
+        for part in parts:
+            for batch in parquet.ParquetFile(part).iter_batches(
+                batch_size=ORDER_EXPORT_PARQUET_ROW_GROUP_SIZE,
+            ):
+                writer.write_batch(batch)
+
+
+def _merge_parts(export: OrderExport, path: "Path"):
+    parts = [
+        _get_part_path(export, index) for index in range(1, export.parts_count + 1)
+    ]
+    if export.file_format == OrderExportFormat.PARQUET:
+        _merge_parquet_parts(parts, path)
+        return
+    with path.open("w", newline="") as output:
+        if export.file_format == OrderExportFormat.CSV:
+            csv.writer(output).writerow(ORDER_EXPORT_HEADERS)
+        for part in parts:
+            with part.open(newline="") as f:
+                shutil.copyfileobj(f, output)
+
+
+def finish_order_export(export: OrderExport):
+    """Merge the parts into the export file and mark the export as done."""
+    spool_dir = _get_spool_dir(export)
+    filename = (
+        f"orders-{export.created_from:%Y%m%d}-{export.created_to:%Y%m%d}"
+        f".{export.file_format}"
+    )
+    path = spool_dir / filename
+    _merge_parts(export, path)
+    with path.open("rb") as f:
+        export.content_file.save(filename, File(f), save=False)
+    export.status = JobStatus.SUCCESS
+    export.save(update_fields=["content_file", "status", "updated_at"])
+    shutil.rmtree(spool_dir)
@@ -0,0 +1,25 @@
+from collections import Counter
+from collections.abc import Iterable
+
+from django.db import transaction
+
+from .models import Fulfillment
+from .numbers import reserve_fulfillment_orders
+
+
+def bulk_create_fulfillments(fulfillments: Iterable[Fulfillment]) -> list[Fulfillment]:
+    """Number and create fulfillments of one or many orders at once.
+
+    Fulfillments of the same order get contiguous numbers in the given order.
+    The numbers of all orders are reserved with a single UPDATE and the
+    fulfillments are inserted with one `bulk_create`.
+    """
+    fulfillments = list(fulfillments)
+    with transaction.atomic():
+        next_numbers = reserve_fulfillment_orders(
+            Counter(fulfillment.order_id for fulfillment in fulfillments),
+        )
+        for fulfillment in fulfillments:
+            fulfillment.fulfillment_order = next_numbers[fulfillment.order_id]
+            next_numbers[fulfillment.order_id] += 1
+        return Fulfillment.objects.bulk_create(fulfillments)
@@ -0,0 +1,58 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.utils.dateparse import parse_date
+
+from snap_buy.core import JobStatus
+from snap_buy.order import OrderExportFormat
+from snap_buy.order.models import OrderExport
+from snap_buy.order.tasks import export_orders_task
+
+
+class Command(BaseCommand):
+    help = "Queue an export of the lines of orders created between two dates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("start", nargs="?", help="First day, YYYY-MM-DD.")
+        parser.add_argument("end", nargs="?", help="Day after the last, YYYY-MM-DD.")
+        parser.add_argument(
+            "--format",
+            choices=[choice for choice, _ in OrderExportFormat.CHOICES],
+            default=OrderExportFormat.CSV,
+        )
+        parser.add_argument(
+            "--resume",
+            type=int,
+            metavar="EXPORT_ID",
+            help="Resume a failed export from its last checkpoint.",
+        )
+
+    def handle(self, *args, **options):
+        if options["resume"] is not None:
+            export = self._resume(options["resume"])
+        else:
+            export = OrderExport.objects.create(
+                file_format=options["format"],
+                created_from=self._parse_day(options["start"]),
+                created_to=self._parse_day(options["end"]),
+            )
+        export_orders_task.delay(export.pk)
+        self.stdout.write(self.style.SUCCESS(f"Queued export {export.pk}."))
+
+    def _resume(self, export_id: int) -> OrderExport:
+        updated = OrderExport.objects.filter(
+            pk=export_id,
+            status=JobStatus.FAILED,
+        ).update(status=JobStatus.PENDING, message="")
+        if not updated:
+            msg = f"There is no failed export {export_id}."
+            raise CommandError(msg)
+        return OrderExport.objects.get(pk=export_id)
+
+    def _parse_day(self, value: str | None) -> datetime.datetime:
+        day = parse_date(value) if value else None
+        if day is None:
+            msg = "Pass the start and end days as YYYY-MM-DD."
+            raise CommandError(msg)
+        return datetime.datetime.combine(day, datetime.time(), tzinfo=datetime.UTC)
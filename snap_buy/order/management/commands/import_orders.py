@@ -0,0 +1,51 @@
+import json
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from snap_buy.order.bulk_import import ORDERS_IMPORT_CHUNK_SIZE
+from snap_buy.order.bulk_import import import_orders
+
+
+class Command(BaseCommand):
+    help = "Import orders from a JSONL file with one order per line."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path of the file, `-` for stdin.")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=ORDERS_IMPORT_CHUNK_SIZE,
+            help="Number of orders written per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if path == "-":
+            result = import_orders(self._read_rows(sys.stdin), options["chunk_size"])
+        else:
+            with Path(path).open() as f:
+                result = import_orders(self._read_rows(f), options["chunk_size"])
+        for error in result.errors:
+            reference = (
+                f" ({error.external_reference})" if error.external_reference else ""
+            )
+            self.stderr.write(f"Row {error.row}{reference}: {error.message}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {result.created} orders, skipped {result.skipped} "
+                f"existing orders, {len(result.errors)} rows failed.",
+            ),
+        )
+
+    def _read_rows(self, f):
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                msg = f"Invalid JSON in line {line_number}: {e}."
+                raise CommandError(msg) from e
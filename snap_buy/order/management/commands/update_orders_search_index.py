@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from snap_buy.order.search import ORDERS_BATCH_SIZE
+from snap_buy.order.search import get_search_index_backlog
+from snap_buy.order.search import index_dirty_orders
+from snap_buy.order.search import update_orders_search_fields_after
+
+
+class Command(BaseCommand):
+    help = "Update the search document and search vector of orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Reindex all orders instead of the dirty orders only.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=ORDERS_BATCH_SIZE,
+            help="Number of orders written per UPDATE statement.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if not options["full"]:
+            stats = index_dirty_orders(batch_size)
+            self._report(stats.indexed, stats.duration, stats.backlog)
+            return
+
+        start = time.monotonic()
+        indexed = 0
+        # Orders are walked by pk with short keyset queries instead of a cursor
+        # held open over millions of rows.
+        last_pk = None
+        while True:
+            order_ids = update_orders_search_fields_after(last_pk, batch_size)
+            if not order_ids:
+                break
+            indexed += len(order_ids)
+            last_pk = order_ids[-1]
+            self.stdout.write(f"Indexed {indexed} orders...")
+        self._report(indexed, time.monotonic() - start, get_search_index_backlog())
+
+    def _report(self, indexed, duration, backlog):
+        rate = indexed / duration if duration else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {indexed} orders in {duration:.2f}s ({rate:.1f} rows/s). "
+                f"Backlog: {backlog}.",
+            ),
+        )
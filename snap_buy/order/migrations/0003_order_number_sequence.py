@@ -0,0 +1,24 @@
+# Generated by Django 5.0.8 on 2026-10-17 02:07
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("order", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            CREATE SEQUENCE IF NOT EXISTS order_order_number_seq
+                OWNED BY order_order.number;
+            SELECT setval(
+                'order_order_number_seq',
+                COALESCE((SELECT MAX(number) FROM order_order), 0) + 1,
+                false
+            );
+            """,
+            reverse_sql="DROP SEQUENCE IF EXISTS order_order_number_seq;",
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.8 on 2026-10-17 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("order", "0003_order_number_sequence"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="search_index_dirty",
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
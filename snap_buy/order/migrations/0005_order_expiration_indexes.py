@@ -0,0 +1,28 @@
+# Generated by Django 5.0.8 on 2026-10-17 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("order", "0004_order_search_index_dirty"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("status", "unconfirmed")),
+                fields=["channel", "created_at"],
+                name="order_unconfirmed_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("status", "expired")),
+                fields=["channel", "expired_at"],
+                name="order_expired_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.8 on 2026-10-17 02:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("order", "0005_order_expiration_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="last_fulfillment_order",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE order_order
+            SET last_fulfillment_order = fulfillment.last_fulfillment_order
+            FROM (
+                SELECT order_id, MAX(fulfillment_order) AS last_fulfillment_order
+                FROM order_fulfillment
+                GROUP BY order_id
+            ) AS fulfillment
+            WHERE order_order.id = fulfillment.order_id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.8 on 2026-10-17 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("order", "0006_order_last_fulfillment_order"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["updated_at", "id"],
+                name="order_updated_at_id_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,173 @@
+# Generated by Django 5.0.8 on 2026-10-17 02:18
+
+import datetime
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_sales_rollup_watermark(apps, schema_editor):
+    SalesRollupWatermark = apps.get_model("order", "SalesRollupWatermark")
+    # The first run rolls up all existing orders.
+    SalesRollupWatermark.objects.create(
+        updated_at=datetime.datetime(1970, 1, 1, tzinfo=datetime.UTC),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("channel", "0001_initial"),
+        ("order", "0007_order_updated_at_id_idx"),
+        ("product", "0003_preorder_quantity_allocated"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SalesRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period_type",
+                    models.CharField(
+                        choices=[
+                            ("day", "Day"),
+                            ("week", "Week"),
+                            ("month", "Month"),
+                            ("year", "Year"),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                ("period_start", models.DateField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("draft", "Draft"),
+                            ("unconfirmed", "Unconfirmed"),
+                            ("unfulfilled", "Unfulfilled"),
+                            ("partially fulfilled", "Partially fulfilled"),
+                            ("partially_returned", "Partially returned"),
+                            ("returned", "Returned"),
+                            ("fulfilled", "Fulfilled"),
+                            ("canceled", "Canceled"),
+                            ("expired", "Expired"),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                ("orders_count", models.PositiveIntegerField(default=0)),
+                ("units", models.PositiveIntegerField(default=0)),
+                (
+                    "total_net_amount",
+                    models.DecimalField(
+                        decimal_places=3,
+                        default=Decimal("0"),
+                        max_digits=12,
+                    ),
+                ),
+                (
+                    "total_gross_amount",
+                    models.DecimalField(
+                        decimal_places=3,
+                        default=Decimal("0"),
+                        max_digits=12,
+                    ),
+                ),
+                (
+                    "channel",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sales_rollups",
+                        to="channel.channel",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("period_start", "pk"),
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("channel", "period_type", "period_start", "status"),
+                        name="order_sales_rollup_unique",
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="SalesRollupVariant",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("quantity", models.PositiveIntegerField(default=0)),
+                (
+                    "total_gross_amount",
+                    models.DecimalField(
+                        decimal_places=3,
+                        default=Decimal("0"),
+                        max_digits=12,
+                    ),
+                ),
+                (
+                    "channel",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sales_rollup_variants",
+                        to="channel.channel",
+                    ),
+                ),
+                (
+                    "variant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sales_rollups",
+                        to="product.productvariant",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("day", "pk"),
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("channel", "day", "variant"),
+                        name="order_sales_rollup_variant_unique",
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="SalesRollupWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("updated_at", models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(
+            create_sales_rollup_watermark,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.0.8 on 2026-10-17 02:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+import snap_buy.core.utils.json_serializer
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("order", "0008_salesrollup_salesrollupvariant_salesrollupwatermark"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedOrder",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(editable=False, primary_key=True, serialize=False),
+                ),
+                ("number", models.IntegerField(editable=False, unique=True)),
+                (
+                    "checkout_token",
+                    models.CharField(blank=True, db_index=True, max_length=36),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("draft", "Draft"),
+                            ("unconfirmed", "Unconfirmed"),
+                            ("unfulfilled", "Unfulfilled"),
+                            ("partially fulfilled", "Partially fulfilled"),
+                            ("partially_returned", "Partially returned"),
+                            ("returned", "Returned"),
+                            ("fulfilled", "Fulfilled"),
+                            ("canceled", "Canceled"),
+                            ("expired", "Expired"),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                (
+                    "archived_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                    ),
+                ),
+                (
+                    "data",
+                    models.JSONField(
+                        encoder=snap_buy.core.utils.json_serializer.PreciseJsonEncoder,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("-number",),
+            },
+        ),
+    ]
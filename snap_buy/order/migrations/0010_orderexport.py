@@ -0,0 +1,80 @@
+# Generated by Django 5.0.8 on 2026-10-17 02:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("order", "0009_archivedorder"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderExport",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("success", "Success"),
+                            ("failed", "Failed"),
+                            ("deleted", "Deleted"),
+                        ],
+                        default="pending",
+                        max_length=50,
+                    ),
+                ),
+                ("message", models.CharField(blank=True, max_length=255)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "file_format",
+                    models.CharField(
+                        choices=[
+                            ("csv", "CSV"),
+                            ("jsonl", "JSON Lines"),
+                            ("parquet", "Parquet"),
+                        ],
+                        default="csv",
+                        max_length=32,
+                    ),
+                ),
+                ("created_from", models.DateTimeField()),
+                ("created_to", models.DateTimeField()),
+                (
+                    "content_file",
+                    models.FileField(blank=True, upload_to="order_exports"),
+                ),
+                ("lines_total", models.PositiveBigIntegerField(blank=True, null=True)),
+                ("lines_exported", models.PositiveBigIntegerField(default=0)),
+                ("parts_count", models.PositiveIntegerField(default=0)),
+                ("last_order_number", models.IntegerField(blank=True, null=True)),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("-created_at",),
+            },
+        ),
+    ]
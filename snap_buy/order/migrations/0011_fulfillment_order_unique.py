@@ -0,0 +1,19 @@
+# Generated by Django 5.0.8 on 2026-10-17 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("order", "0010_orderexport"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="fulfillment",
+            constraint=models.UniqueConstraint(
+                fields=("order", "fulfillment_order"),
+                name="fulfillment_order_unique",
+            ),
+        ),
+    ]
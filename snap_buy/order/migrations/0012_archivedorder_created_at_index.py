@@ -0,0 +1,17 @@
+# Generated by Django 5.0.8 on 2026-10-17 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("order", "0011_fulfillment_order_unique"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="archivedorder",
+            name="created_at",
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
@@ -10,10 +10,11 @@ from django.contrib.postgres.indexes import BTreeIndex
 from django.contrib.postgres.indexes import GinIndex
 from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import connection
 from django.db import models
+from django.db.models import Exists
 from django.db.models import JSONField
-from django.db.models import Max
+from django.db.models import OuterRef
+from django.db.models import Q
 from django.utils.timezone import now
 from django_measurement.models import MeasurementField
 from django_prices.models import MoneyField
@@ -22,10 +23,13 @@ from measurement.measures import Weight
 
 from snap_buy.app.models import App
 from snap_buy.channel.models import Channel
+from snap_buy.core import TimePeriodType
+from snap_buy.core.models import Job
 from snap_buy.core.models import ModelWithExternalReference
 from snap_buy.core.models import ModelWithMetadata
 from snap_buy.core.units import WeightUnits
 from snap_buy.core.utils.json_serializer import CustomJsonEncoder
+from snap_buy.core.utils.json_serializer import PreciseJsonEncoder
 from snap_buy.core.weight import zero_weight
 from snap_buy.discount import DiscountValueType
 from snap_buy.discount.models import Voucher
@@ -34,30 +38,46 @@ from snap_buy.payment import TransactionKind
 from snap_buy.payment.model_helpers import get_subtotal
 from snap_buy.payment.models import Payment
 from snap_buy.permission.enums import OrderPermissions
+from snap_buy.product.models import DigitalContent
 from snap_buy.shipping.models import ShippingMethod
 
 from . import FulfillmentStatus
 from . import OrderAuthorizeStatus
 from . import OrderChargeStatus
+from . import OrderExportFormat
 from . import OrderGrantedRefundStatus
 from . import OrderOrigin
 from . import OrderStatus
+from .numbers import order_number_allocator
+from .numbers import reserve_fulfillment_orders
 
 if TYPE_CHECKING:
     from snap_buy.users.models import User
 
+# Orders in those statuses can be neither canceled nor captured.
+NON_ACTIONABLE_ORDER_STATUSES = frozenset(
+    [OrderStatus.DRAFT, OrderStatus.CANCELED, OrderStatus.EXPIRED],
+)
+# Fulfillments in those statuses don't prevent canceling the order.
+CANCELABLE_FULFILLMENT_STATUSES = (
+    FulfillmentStatus.CANCELED,
+    FulfillmentStatus.REFUNDED,
+    FulfillmentStatus.REPLACED,
+    FulfillmentStatus.REFUNDED_AND_RETURNED,
+    FulfillmentStatus.RETURNED,
+)
+
 
 def get_order_number():
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT nextval('order_order_number_seq')")
-        result = cursor.fetchone()
-        return result[0]
+    return order_number_allocator.next()
 
 
 class Order(ModelWithMetadata, ModelWithExternalReference):
     id = models.UUIDField(primary_key=True, editable=False, unique=True, default=uuid4)
     number = models.IntegerField(unique=True, default=get_order_number, editable=False)
     use_old_id = models.BooleanField(default=False)
+    # The highest `Fulfillment.fulfillment_order` handed out for the order.
+    last_fulfillment_order = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(default=now, editable=False)
     updated_at = models.DateTimeField(auto_now=True, editable=False, db_index=True)
     expired_at = models.DateTimeField(blank=True, null=True)
@@ -336,6 +356,7 @@ class Order(ModelWithMetadata, ModelWithExternalReference):
     redirect_url = models.URLField(blank=True, null=True)
     search_document = models.TextField(blank=True, default="")
     search_vector = SearchVectorField(blank=True, null=True)
+    search_index_dirty = models.BooleanField(default=False, db_index=True)
     # this field is used only for draft/unconfirmed orders
     should_refresh_prices = models.BooleanField(default=True)
     tax_exemption = models.BooleanField(default=False)
@@ -366,14 +387,41 @@ class Order(ModelWithMetadata, ModelWithExternalReference):
                 opclasses=["gin_trgm_ops"],
             ),
             models.Index(fields=["created_at"], name="idx_order_created_at"),
+            models.Index(fields=["updated_at", "id"], name="order_updated_at_id_idx"),
             GinIndex(fields=["voucher_code"], name="order_voucher_code_idx"),
             GinIndex(
                 fields=["user_email", "user_id"],
                 name="order_user_email_user_id_idx",
             ),
             BTreeIndex(fields=["checkout_token"], name="checkout_token_btree_idx"),
+            # Partial indexes used by the expiration sweeper.
+            models.Index(
+                fields=["channel", "created_at"],
+                name="order_unconfirmed_idx",
+                condition=Q(status=OrderStatus.UNCONFIRMED),
+            ),
+            models.Index(
+                fields=["channel", "expired_at"],
+                name="order_expired_idx",
+                condition=Q(status=OrderStatus.EXPIRED),
+            ),
         ]
 
+    def save(self, *args, **kwargs):
+        # The counter is only incremented by `reserve_fulfillment_orders`, so a
+        # full save of an order loaded earlier must not write back a stale value.
+        if (
+            not self._state.adding
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields  # type: ignore[attr-defined]
+                if not field.primary_key and field.name != "last_fulfillment_order"
+            ]
+        return super().save(*args, **kwargs)
+
     def is_fully_paid(self):
         return self.total_charged >= self.total.gross
 
@@ -446,33 +494,18 @@ class Order(ModelWithMetadata, ModelWithExternalReference):
         return self.status in statuses
 
     def can_cancel(self):
-        statuses_allowed_to_cancel = [
-            FulfillmentStatus.CANCELED,
-            FulfillmentStatus.REFUNDED,
-            FulfillmentStatus.REPLACED,
-            FulfillmentStatus.REFUNDED_AND_RETURNED,
-            FulfillmentStatus.RETURNED,
-        ]
         return (
             not self.fulfillments.exclude(
-                status__in=statuses_allowed_to_cancel,
+                status__in=CANCELABLE_FULFILLMENT_STATUSES,
             ).exists()
-        ) and self.status not in {
-            OrderStatus.CANCELED,
-            OrderStatus.DRAFT,
-            OrderStatus.EXPIRED,
-        }
+        ) and self.status not in NON_ACTIONABLE_ORDER_STATUSES
 
     def can_capture(self, payment=None):
         if not payment:
             payment = self.get_last_payment()
         if not payment:
             return False
-        order_status_ok = self.status not in {
-            OrderStatus.DRAFT,
-            OrderStatus.CANCELED,
-            OrderStatus.EXPIRED,
-        }
+        order_status_ok = self.status not in NON_ACTIONABLE_ORDER_STATUSES
         return payment.can_capture() and order_status_ok
 
     def can_void(self, payment=None):
@@ -499,18 +532,25 @@ class Order(ModelWithMetadata, ModelWithExternalReference):
         return self.total_charged - self.total.gross
 
 
+def _has_digital_content() -> Exists:
+    # The SQL counterpart of `OrderLine.is_digital`.
+    return Exists(
+        DigitalContent.objects.filter(
+            product_variant_id=OuterRef("variant_id"),
+            product_variant__product__product_type__is_digital=True,
+            product_variant__product__product_type__is_shipping_required=False,
+        ),
+    )
+
+
 class OrderLineQueryset(models.QuerySet["OrderLine"]):
     def digital(self):
-        """Return lines with digital products."""
-        for line in self.all():
-            if line.is_digital:
-                yield line
+        """Return lines with digital products which have digital content."""
+        return self.filter(_has_digital_content())
 
     def physical(self):
         """Return lines with physical products."""
-        for line in self.all():
-            if not line.is_digital:
-                yield line
+        return self.filter(~_has_digital_content())
 
 
 OrderLineManager = models.Manager.from_queryset(OrderLineQueryset)
@@ -768,6 +808,12 @@ class Fulfillment(ModelWithMetadata):
 
     class Meta(ModelWithMetadata.Meta):
         ordering = ("pk",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=["order", "fulfillment_order"],
+                name="fulfillment_order_unique",
+            ),
+        ]
 
     def __str__(self):
         return f"Fulfillment #{self.composed_id}"
@@ -776,12 +822,10 @@ class Fulfillment(ModelWithMetadata):
         return iter(self.lines.all())
 
     def save(self, *args, **kwargs):
-        """Assign an auto incremented value as a fulfillment order."""
+        """Assign the next number from the order's counter as a fulfillment order."""
         if not self.pk:
-            groups = self.order.fulfillments.all()
-            existing_max = groups.aggregate(Max("fulfillment_order"))
-            existing_max = existing_max.get("fulfillment_order__max")
-            self.fulfillment_order = existing_max + 1 if existing_max is not None else 1
+            numbers = reserve_fulfillment_orders({self.order_id: 1})
+            self.fulfillment_order = numbers[self.order_id]
         return super().save(*args, **kwargs)
 
     @property
@@ -873,3 +917,145 @@ class OrderGrantedRefund(models.Model):
 
     class Meta:
         ordering = ("created_at", "id")
+
+
+class SalesRollup(models.Model):
+    """Order figures of a channel for a period, per order status."""
+
+    channel = models.ForeignKey(
+        Channel,
+        related_name="sales_rollups",
+        on_delete=models.CASCADE,
+    )
+    period_type = models.CharField(max_length=32, choices=TimePeriodType.CHOICES)
+    period_start = models.DateField()
+    status = models.CharField(max_length=32, choices=OrderStatus.CHOICES)
+    orders_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    total_net_amount = models.DecimalField(
+        max_digits=settings.DEFAULT_MAX_DIGITS,
+        decimal_places=settings.DEFAULT_DECIMAL_PLACES,
+        default=Decimal(0),
+    )
+    total_gross_amount = models.DecimalField(
+        max_digits=settings.DEFAULT_MAX_DIGITS,
+        decimal_places=settings.DEFAULT_DECIMAL_PLACES,
+        default=Decimal(0),
+    )
+
+    class Meta:
+        ordering = ("period_start", "pk")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["channel", "period_type", "period_start", "status"],
+                name="order_sales_rollup_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.channel_id} {self.period_type} {self.period_start} {self.status}"
+
+
+class SalesRollupVariant(models.Model):
+    """Units and revenue of a variant sold in a channel on a day."""
+
+    channel = models.ForeignKey(
+        Channel,
+        related_name="sales_rollup_variants",
+        on_delete=models.CASCADE,
+    )
+    day = models.DateField()
+    variant = models.ForeignKey(
+        "product.ProductVariant",
+        related_name="sales_rollups",
+        on_delete=models.CASCADE,
+    )
+    quantity = models.PositiveIntegerField(default=0)
+    total_gross_amount = models.DecimalField(
+        max_digits=settings.DEFAULT_MAX_DIGITS,
+        decimal_places=settings.DEFAULT_DECIMAL_PLACES,
+        default=Decimal(0),
+    )
+
+    class Meta:
+        ordering = ("day", "pk")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["channel", "day", "variant"],
+                name="order_sales_rollup_variant_unique",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.channel_id} {self.day} {self.variant_id}"
+
+
+class SalesRollupWatermark(models.Model):
+    """Orders updated up to `updated_at` are counted in the sales rollups."""
+
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return str(self.updated_at)
+
+
+class ArchivedOrder(models.Model):
+    """A closed order moved out of the order tables with its related rows.
+
+    `data` holds the serialized order, addresses, lines, fulfillments, granted
+    refunds, payments and payment transactions; Postgres compresses it on disk.
+    """
+
+    id = models.UUIDField(primary_key=True, editable=False)
+    number = models.IntegerField(unique=True, editable=False)
+    checkout_token = models.CharField(max_length=36, blank=True, db_index=True)
+    status = models.CharField(max_length=32, choices=OrderStatus.CHOICES)
+    created_at = models.DateTimeField(db_index=True)
+    archived_at = models.DateTimeField(default=now, editable=False)
+    data = JSONField(encoder=PreciseJsonEncoder)
+
+    class Meta:
+        ordering = ("-number",)
+
+    def __str__(self):
+        return f"#{self.id}"
+
+
+class OrderExport(Job):
+    """An export of the lines of orders created in `[created_from, created_to)`.
+
+    The export is written in parts, one per checkpoint; `last_order_number` is the
+    number of the last order written, from which an interrupted export resumes.
+    """
+
+    file_format = models.CharField(
+        max_length=32,
+        choices=OrderExportFormat.CHOICES,
+        default=OrderExportFormat.CSV,
+    )
+    created_from = models.DateTimeField()
+    created_to = models.DateTimeField()
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
+    content_file = models.FileField(upload_to="order_exports", blank=True)
+    lines_total = models.PositiveBigIntegerField(null=True, blank=True)
+    lines_exported = models.PositiveBigIntegerField(default=0)
+    parts_count = models.PositiveIntegerField(default=0)
+    last_order_number = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("-created_at",)
+
+    def __str__(self):
+        return f"{self.file_format} export {self.created_from} - {self.created_to}"
+
+    @property
+    def progress(self) -> float | None:
+        if not self.lines_total:
+            return None
+        return min(self.lines_exported / self.lines_total, 1.0)
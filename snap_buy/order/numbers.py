@@ -0,0 +1,93 @@
+import os
+import threading
+from collections.abc import Mapping
+from typing import TYPE_CHECKING
+from typing import Any
+
+from django.conf import settings
+from django.db import connection
+from django.db import transaction
+
+if TYPE_CHECKING:
+    from uuid import UUID
+
+RESERVE_ORDER_NUMBERS_SQL = """
+SELECT nextval('order_order_number_seq') FROM generate_series(1, %s)
+"""
+
+LOCK_ORDERS_SQL = """
+SELECT id FROM order_order WHERE id = ANY(%(order_ids)s::uuid[])
+ORDER BY id FOR NO KEY UPDATE
+"""
+
+RESERVE_FULFILLMENT_ORDERS_SQL = """
+UPDATE order_order
+SET last_fulfillment_order = order_order.last_fulfillment_order + reserved.count
+FROM unnest(%(order_ids)s::uuid[], %(counts)s::integer[]) AS reserved(order_id, count)
+WHERE order_order.id = reserved.order_id
+RETURNING order_order.id, order_order.last_fulfillment_order
+"""
+
+
+def reserve_order_numbers(count: int) -> list[int]:
+    """Take `count` numbers from the order number sequence in one round-trip.
+
+    The numbers are unique across workers, but not necessarily consecutive.
+    """
+    if count <= 0:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(RESERVE_ORDER_NUMBERS_SQL, [count])
+        return sorted(number for (number,) in cursor.fetchall())
+
+
+def reserve_fulfillment_orders(counts: Mapping["UUID", int]) -> dict["UUID", int]:
+    """Reserve `count` consecutive fulfillment numbers for each of the orders.
+
+    The counters are incremented with a single UPDATE, which keeps the order rows
+    locked until the end of the transaction, so concurrent fulfillments of the
+    same order get disjoint numbers. Return the first reserved number per order.
+    """
+    counts = {order_id: count for order_id, count in counts.items() if count > 0}
+    if not counts:
+        return {}
+    params: dict[str, Any] = {
+        "order_ids": list(counts),
+        "counts": list(counts.values()),
+    }
+    with transaction.atomic(), connection.cursor() as cursor:
+        if len(counts) > 1:
+            # Lock the rows in a fixed order to avoid deadlocks between batches.
+            cursor.execute(LOCK_ORDERS_SQL, params)
+        cursor.execute(RESERVE_FULFILLMENT_ORDERS_SQL, params)
+        return {
+            order_id: last - counts[order_id] + 1
+            for order_id, last in cursor.fetchall()
+        }
+
+
+class OrderNumberAllocator:
+    """Hand out order numbers from blocks reserved from the sequence.
+
+    Numbers left in the block when the process exits are never used, so every
+    process leaves at most `block_size - 1` gaps. The block is dropped in forked
+    processes, which would otherwise hand out the same numbers as the parent.
+    """
+
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._numbers: list[int] = []
+        self._pid = os.getpid()
+
+    def next(self) -> int:
+        with self._lock:
+            if self._pid != os.getpid():
+                self._numbers = []
+                self._pid = os.getpid()
+            if not self._numbers:
+                self._numbers = reserve_order_numbers(self.block_size)[::-1]
+            return self._numbers.pop()
+
+
+order_number_allocator = OrderNumberAllocator(settings.ORDER_NUMBER_BLOCK_SIZE)
@@ -1,8 +1,7 @@
-from django.shortcuts import get_object_or_404
 from django.utils.translation import gettext_lazy as _
 from rest_framework.permissions import BasePermission
 
-from snap_buy.order.models import Order
+from snap_buy.order.archive import get_order_or_404
 
 
 class IsOrderPending(BasePermission):
@@ -25,7 +24,7 @@ class IsOrderItemByBuyerOrAdmin(BasePermission):
 
     def has_permission(self, request, view):
         order_id = view.kwargs.get("order_id")
-        order = get_object_or_404(Order, id=order_id)
+        order = get_order_or_404(id=order_id)
         return order.buyer == request.user or request.user.is_staff
 
     def has_object_permission(self, request, view, obj):
@@ -56,7 +55,7 @@ class IsOrderItemPending(BasePermission):
 
     def has_permission(self, request, view):
         order_id = view.kwargs.get("order_id")
-        order = get_object_or_404(Order, id=order_id)
+        order = get_order_or_404(id=order_id)
 
         if view.action in ("list",):
             return True
@@ -0,0 +1,496 @@
+"""Sales figures pre-aggregated per channel, period and order status.
+
+Daily rollups are rebuilt from orders for every day with an order updated since
+the watermark; weekly, monthly and yearly rollups are summed from the daily ones.
+Orders are assigned to the day they were created on, in the current time zone.
+Archived orders still count in the rollups of the days they were created on.
+"""
+
+import datetime
+from collections import defaultdict
+from collections.abc import Iterable
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import DateField
+from django.db.models import Q
+from django.db.models import QuerySet
+from django.db.models import Sum
+from django.db.models.functions import Trunc
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from snap_buy.core import TimePeriodType
+
+from . import OrderStatus
+from .archive import load_archived_order
+from .models import ArchivedOrder
+from .models import Order
+from .models import OrderLine
+from .models import SalesRollup
+from .models import SalesRollupVariant
+from .models import SalesRollupWatermark
+
+# Orders updated within the lag may still be in uncommitted transactions.
+SALES_ROLLUPS_LAG = datetime.timedelta(minutes=1)
+SALES_ROLLUPS_DAYS_BATCH_SIZE = 31
+# Orders whose updates are rolled up in one transaction.
+SALES_ROLLUPS_WINDOW_SIZE = 5000
+# Archived orders deserialized at once when their days are rebuilt.
+ARCHIVED_ORDERS_CHUNK_SIZE = 500
+TOP_VARIANTS_LIMIT = 10
+# Only these orders count as sales of their variants.
+SOLD_ORDER_STATUSES = (
+    OrderStatus.UNFULFILLED,
+    OrderStatus.PARTIALLY_FULFILLED,
+    OrderStatus.FULFILLED,
+    OrderStatus.PARTIALLY_RETURNED,
+    OrderStatus.RETURNED,
+)
+ROLLUP_FIGURES = ("orders_count", "units", "total_net_amount", "total_gross_amount")
+VARIANT_ROLLUP_FIGURES = ("quantity", "total_gross_amount")
+SUMMED_PERIOD_TYPES = (TimePeriodType.WEEK, TimePeriodType.MONTH, TimePeriodType.YEAR)
+
+
+def get_period_start(day: datetime.date, period_type: str) -> datetime.date:
+    if period_type == TimePeriodType.WEEK:
+        return day - datetime.timedelta(days=day.weekday())
+    if period_type == TimePeriodType.MONTH:
+        return day.replace(day=1)
+    if period_type == TimePeriodType.YEAR:
+        return day.replace(month=1, day=1)
+    return day
+
+
+def get_next_period_start(start: datetime.date, period_type: str) -> datetime.date:
+    if period_type == TimePeriodType.WEEK:
+        return start + datetime.timedelta(days=7)
+    if period_type == TimePeriodType.MONTH:
+        return (start + datetime.timedelta(days=31)).replace(day=1)
+    if period_type == TimePeriodType.YEAR:
+        return start.replace(year=start.year + 1)
+    return start + datetime.timedelta(days=1)
+
+
+def _day_start(day: datetime.date) -> datetime.datetime:
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _created_on(days: Iterable[datetime.date]) -> Q:
+    """Filter orders created on any of the days, using the `created_at` index."""
+    lookup = Q()
+    for day in days:
+        lookup |= Q(
+            created_at__gte=_day_start(day),
+            created_at__lt=_day_start(day + datetime.timedelta(days=1)),
+        )
+    return lookup
+
+
+def _aggregate_orders(orders: QuerySet[Order]) -> list[SalesRollup]:
+    """Aggregate orders into unsaved daily rollups."""
+    rollups = {}
+    for channel_id, day, status, orders_count, net, gross in (
+        orders.annotate(day=TruncDate("created_at"))
+        .values("channel", "day", "status")
+        .annotate(
+            orders_count=Count("pk"),
+            net=Sum("total_net_amount"),
+            gross=Sum("total_gross_amount"),
+        )
+        .values_list("channel", "day", "status", "orders_count", "net", "gross")
+        .order_by()
+    ):
+        rollups[channel_id, day, status] = SalesRollup(
+            channel_id=channel_id,
+            period_type=TimePeriodType.DAY,
+            period_start=day,
+            status=status,
+            orders_count=orders_count,
+            total_net_amount=net,
+            total_gross_amount=gross,
+        )
+    # Units are summed separately, joining lines would multiply the order totals.
+    for channel_id, day, status, units in (
+        OrderLine.objects.filter(order__in=orders)
+        .annotate(day=TruncDate("order__created_at"))
+        .values("order__channel", "day", "order__status")
+        .annotate(units=Sum("quantity"))
+        .values_list("order__channel", "day", "order__status", "units")
+        .order_by()
+    ):
+        rollups[channel_id, day, status].units = units
+    return list(rollups.values())
+
+
+def _aggregate_variants(orders: QuerySet[Order]) -> list[SalesRollupVariant]:
+    """Aggregate lines of sold orders into unsaved daily variant rollups."""
+    return [
+        SalesRollupVariant(
+            channel_id=channel_id,
+            day=day,
+            variant_id=variant_id,
+            quantity=quantity,
+            total_gross_amount=total_gross_amount,
+        )
+        for channel_id, day, variant_id, quantity, total_gross_amount in (
+            OrderLine.objects.filter(
+                order__in=orders.filter(status__in=SOLD_ORDER_STATUSES),
+                variant__isnull=False,
+            )
+            .annotate(day=TruncDate("order__created_at"))
+            .values("order__channel", "day", "variant_id")
+            .annotate(units=Sum("quantity"), gross=Sum("total_price_gross_amount"))
+            .values_list("order__channel", "day", "variant_id", "units", "gross")
+            .order_by()
+        )
+    ]
+
+
+def _aggregate_archived_orders(
+    channel_ids: list[int],
+    days: list[datetime.date],
+) -> tuple[list[SalesRollup], list[SalesRollupVariant]]:
+    """Aggregate archived orders into unsaved daily and daily variant rollups.
+
+    Archived orders are deserialized, but only orders updated before the archive
+    cutoff are archived, so their days are rarely rebuilt.
+    """
+    rollups: dict[tuple, SalesRollup] = {}
+    variant_rollups: dict[tuple, SalesRollupVariant] = {}
+    for archived_order in (
+        ArchivedOrder.objects.filter(_created_on(days))
+        .order_by()
+        .iterator(chunk_size=ARCHIVED_ORDERS_CHUNK_SIZE)
+    ):
+        order = load_archived_order(archived_order)
+        if order.channel_id not in channel_ids:
+            continue
+        day = timezone.localtime(order.created_at).date()
+        lines = order.lines.all()
+        rollup = rollups.setdefault(
+            (order.channel_id, day, order.status),
+            SalesRollup(
+                channel_id=order.channel_id,
+                period_type=TimePeriodType.DAY,
+                period_start=day,
+                status=order.status,
+            ),
+        )
+        rollup.orders_count += 1
+        rollup.units += sum(line.quantity for line in lines)
+        rollup.total_net_amount += order.total_net_amount
+        rollup.total_gross_amount += order.total_gross_amount
+        if order.status not in SOLD_ORDER_STATUSES:
+            continue
+        for line in lines:
+            if line.variant_id is None:
+                continue
+            variant_rollup = variant_rollups.setdefault(
+                (order.channel_id, day, line.variant_id),
+                SalesRollupVariant(
+                    channel_id=order.channel_id,
+                    day=day,
+                    variant_id=line.variant_id,
+                ),
+            )
+            variant_rollup.quantity += line.quantity
+            variant_rollup.total_gross_amount += line.total_price_gross_amount
+    return list(rollups.values()), list(variant_rollups.values())
+
+
+def _merge_rollups(
+    rollups: list,
+    other_rollups: list,
+    key_fields: tuple[str, ...],
+    figures: tuple[str, ...],
+) -> list:
+    """Add figures of the other rollups to the rollups with the same key."""
+    merged = {
+        tuple(getattr(rollup, field) for field in key_fields): rollup
+        for rollup in rollups
+    }
+    for other in other_rollups:
+        key = tuple(getattr(other, field) for field in key_fields)
+        rollup = merged.setdefault(key, other)
+        if rollup is not other:
+            for figure in figures:
+                value = getattr(rollup, figure) + getattr(other, figure)
+                setattr(rollup, figure, value)
+    return list(merged.values())
+
+
+def refresh_daily_rollups(channel_ids: list[int], days: list[datetime.date]):
+    """Rebuild daily rollups of the channels for the days from their orders."""
+    orders = Order.objects.filter(_created_on(days), channel_id__in=channel_ids)
+    archived_rollups, archived_variant_rollups = _aggregate_archived_orders(
+        channel_ids,
+        days,
+    )
+    rollups = _merge_rollups(
+        _aggregate_orders(orders),
+        archived_rollups,
+        ("channel_id", "period_start", "status"),
+        ROLLUP_FIGURES,
+    )
+    variant_rollups = _merge_rollups(
+        _aggregate_variants(orders),
+        archived_variant_rollups,
+        ("channel_id", "day", "variant_id"),
+        VARIANT_ROLLUP_FIGURES,
+    )
+    with transaction.atomic():
+        SalesRollup.objects.filter(
+            channel_id__in=channel_ids,
+            period_type=TimePeriodType.DAY,
+            period_start__in=days,
+        ).delete()
+        SalesRollup.objects.bulk_create(rollups)
+        SalesRollupVariant.objects.filter(
+            channel_id__in=channel_ids,
+            day__in=days,
+        ).delete()
+        SalesRollupVariant.objects.bulk_create(variant_rollups)
+
+
+def _sum_daily_rollups(daily_rollups: QuerySet[SalesRollup], period_type: str):
+    """Sum daily rollups into unsaved rollups of the period type."""
+    return [
+        SalesRollup(
+            channel_id=row["channel_id"],
+            period_type=period_type,
+            period_start=row["period"],
+            status=row["status"],
+            **{figure: row[f"{figure}_sum"] for figure in ROLLUP_FIGURES},
+        )
+        for row in daily_rollups.values(
+            "channel_id",
+            "status",
+            period=Trunc("period_start", period_type, output_field=DateField()),
+        )
+        .annotate(**{f"{figure}_sum": Sum(figure) for figure in ROLLUP_FIGURES})
+        .order_by()
+    ]
+
+
+def refresh_period_rollups(
+    channel_ids: list[int],
+    period_type: str,
+    period_starts: Iterable[datetime.date],
+):
+    """Rebuild rollups of weeks, months or years from their daily rollups."""
+    period_starts = sorted(set(period_starts))
+    if not period_starts:
+        return
+    in_periods = Q()
+    for start in period_starts:
+        in_periods |= Q(
+            period_start__gte=start,
+            period_start__lt=get_next_period_start(start, period_type),
+        )
+    daily_rollups = SalesRollup.objects.filter(
+        in_periods,
+        channel_id__in=channel_ids,
+        period_type=TimePeriodType.DAY,
+    )
+    with transaction.atomic():
+        SalesRollup.objects.filter(
+            channel_id__in=channel_ids,
+            period_type=period_type,
+            period_start__in=period_starts,
+        ).delete()
+        SalesRollup.objects.bulk_create(_sum_daily_rollups(daily_rollups, period_type))
+
+
+def _get_changed_days(
+    updated_after: datetime.datetime,
+    updated_before: datetime.datetime,
+) -> dict[datetime.date, set[int]]:
+    """Return the channels with orders updated in the range, per creation day."""
+    changed_days: dict[datetime.date, set[int]] = defaultdict(set)
+    for channel_id, day in (
+        Order.objects.filter(
+            updated_at__gt=updated_after,
+            updated_at__lte=updated_before,
+        )
+        .annotate(day=TruncDate("created_at"))
+        .values_list("channel", "day")
+        .order_by()
+        .distinct()
+    ):
+        changed_days[day].add(channel_id)
+    return changed_days
+
+
+def _get_window_end(
+    updated_after: datetime.datetime,
+    updated_before: datetime.datetime,
+    window_size: int,
+) -> tuple[datetime.datetime, int]:
+    """Return the end of the window with the next `window_size` updated orders.
+
+    Return the number of orders in the window too.
+    """
+    updated_at = list(
+        Order.objects.filter(
+            updated_at__gt=updated_after,
+            updated_at__lte=updated_before,
+        )
+        .order_by("updated_at")
+        .values_list("updated_at", flat=True)[:window_size],
+    )
+    if len(updated_at) < window_size:
+        return updated_before, len(updated_at)
+    return updated_at[-1], len(updated_at)
+
+
+def update_sales_rollups(window_size: int = SALES_ROLLUPS_WINDOW_SIZE) -> int:
+    """Refresh rollups of days with orders updated in the next window.
+
+    The window starts at the watermark and holds up to `window_size` orders, so
+    the first run over a large history is split into transactions of bounded
+    size, each moving the watermark forward. The watermark row is locked with
+    `SKIP LOCKED`, so only one worker updates the rollups at a time. Return the
+    number of orders in the window.
+    """
+    with transaction.atomic():
+        watermark = (
+            SalesRollupWatermark.objects.select_for_update(skip_locked=True)
+            .order_by("pk")
+            .first()
+        )
+        if watermark is None:
+            return 0
+        updated_before, orders_count = _get_window_end(
+            watermark.updated_at,
+            timezone.now() - SALES_ROLLUPS_LAG,
+            window_size,
+        )
+        changed_days = _get_changed_days(watermark.updated_at, updated_before)
+        days = iter(sorted(changed_days))
+        while batch := list(islice(days, SALES_ROLLUPS_DAYS_BATCH_SIZE)):
+            channel_ids = sorted(set().union(*(changed_days[day] for day in batch)))
+            refresh_daily_rollups(channel_ids, batch)
+        channel_ids = sorted(set().union(*changed_days.values()))
+        for period_type in SUMMED_PERIOD_TYPES:
+            refresh_period_rollups(
+                channel_ids,
+                period_type,
+                (get_period_start(day, period_type) for day in changed_days),
+            )
+        if updated_before > watermark.updated_at:
+            watermark.updated_at = updated_before
+            watermark.save(update_fields=["updated_at"])
+    return orders_count
+
+
+def _get_open_period_rollups(
+    channel_id: int,
+    period_type: str,
+    period_start: datetime.date,
+) -> list[SalesRollup]:
+    """Return rollups of the period which includes today.
+
+    Days before today are summed from their daily rollups, only orders created
+    today are aggregated live.
+    """
+    today = timezone.localdate()
+    rollups = _sum_daily_rollups(
+        SalesRollup.objects.filter(
+            channel_id=channel_id,
+            period_type=TimePeriodType.DAY,
+            period_start__gte=period_start,
+            period_start__lt=today,
+        ),
+        period_type,
+    )
+    live_rollups = _aggregate_orders(
+        Order.objects.filter(_created_on([today]), channel_id=channel_id),
+    )
+    by_status = {rollup.status: rollup for rollup in rollups}
+    for live_rollup in live_rollups:
+        rollup = by_status.get(live_rollup.status)
+        if rollup is None:
+            live_rollup.period_type = period_type
+            live_rollup.period_start = period_start
+            rollups.append(live_rollup)
+            continue
+        for figure in ROLLUP_FIGURES:
+            setattr(
+                rollup,
+                figure,
+                getattr(rollup, figure) + getattr(live_rollup, figure),
+            )
+    return rollups
+
+
+def get_sales_rollups(
+    channel_id: int,
+    period_type: str,
+    start: datetime.date,
+    end: datetime.date,
+) -> list[SalesRollup]:
+    """Return rollups of the channel for periods between `start` and `end`.
+
+    Closed periods are read from the stored rollups; the open period, which
+    includes today, is completed with a live aggregation of today's orders.
+    """
+    open_period_start = get_period_start(timezone.localdate(), period_type)
+    rollups = list(
+        SalesRollup.objects.filter(
+            channel_id=channel_id,
+            period_type=period_type,
+            period_start__gte=get_period_start(start, period_type),
+            period_start__lte=end,
+            period_start__lt=open_period_start,
+        ),
+    )
+    if open_period_start <= end:
+        rollups.extend(
+            _get_open_period_rollups(channel_id, period_type, open_period_start),
+        )
+    return rollups
+
+
+def get_top_variants(
+    channel_id: int,
+    start: datetime.date,
+    end: datetime.date,
+    limit: int = TOP_VARIANTS_LIMIT,
+) -> list[tuple[int, int, Decimal]]:
+    """Return `(variant_id, quantity, total_gross_amount)` of best selling variants.
+
+    Days before today are read from the daily variant rollups and today's orders
+    are aggregated live.
+    """
+    today = timezone.localdate()
+    sums: dict[int, list] = defaultdict(lambda: [0, Decimal(0)])
+    variant_rollups = (
+        SalesRollupVariant.objects.filter(
+            channel_id=channel_id,
+            day__gte=start,
+            day__lte=min(end, today - datetime.timedelta(days=1)),
+        )
+        .values("variant_id")
+        .annotate(quantity_sum=Sum("quantity"), gross=Sum("total_gross_amount"))
+        .values_list("variant_id", "quantity_sum", "gross")
+        .order_by()
+    )
+    rows = list(variant_rollups)
+    if start <= today <= end:
+        rows.extend(
+            (rollup.variant_id, rollup.quantity, rollup.total_gross_amount)
+            for rollup in _aggregate_variants(
+                Order.objects.filter(_created_on([today]), channel_id=channel_id),
+            )
+        )
+    for variant_id, quantity, total_gross_amount in rows:
+        sums[variant_id][0] += quantity
+        sums[variant_id][1] += total_gross_amount
+    top_variants = sorted(sums.items(), key=lambda item: item[1][0], reverse=True)
+    return [
+        (variant_id, quantity, total_gross_amount)
+        for variant_id, (quantity, total_gross_amount) in top_variants[:limit]
+    ]
@@ -0,0 +1,181 @@
+import logging
+import operator
+import time
+from collections.abc import Iterable
+from functools import reduce
+from typing import TYPE_CHECKING
+
+from django.contrib.postgres.search import SearchVector
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models import Value
+
+from snap_buy.core.utils.batches import run_batches
+from snap_buy.product.search import SearchIndexStats
+
+from .models import Order
+
+if TYPE_CHECKING:
+    from uuid import UUID
+
+logger = logging.getLogger(__name__)
+
+ORDERS_BATCH_SIZE = 500
+SEARCH_FIELDS = ("search_document", "search_vector", "search_index_dirty")
+# Changing any of those fields through `Order.save` marks the order as dirty.
+INDEXED_ORDER_FIELDS = frozenset(
+    ["number", "user_email", "billing_address", "shipping_address", "voucher_code"],
+)
+ADDRESS_FIELDS = (
+    "first_name",
+    "last_name",
+    "company_name",
+    "street_address_1",
+    "street_address_2",
+    "city",
+    "postal_code",
+    "phone",
+)
+
+
+def prefetch_orders_for_search(orders: QuerySet[Order]) -> QuerySet[Order]:
+    return orders.select_related(
+        "billing_address",
+        "shipping_address",
+    ).prefetch_related(
+        "lines",
+        "payments",
+        "payment_transactions",
+    )
+
+
+def _address_search_values(address) -> list[str]:
+    values = [getattr(address, field) for field in ADDRESS_FIELDS]
+    values.append(address.country.code)
+    return [str(value) for value in values if value]
+
+
+def _order_search_values(order: Order) -> list[tuple[str, str]]:
+    """Return the searchable values of an order along with their weights."""
+    values = [(str(order.number), "A")]
+    if order.user_email:
+        values.append((order.user_email, "A"))
+    for address in (order.billing_address, order.shipping_address):
+        if address:
+            values.extend((value, "B") for value in _address_search_values(address))
+    for line in order.lines.all():
+        if line.product_sku:
+            values.append((line.product_sku, "B"))
+        values.append((line.product_name, "C"))
+        if line.variant_name:
+            values.append((line.variant_name, "C"))
+    if order.voucher_code:
+        values.append((order.voucher_code, "C"))
+    psp_references = [payment.psp_reference for payment in order.payments.all()]
+    psp_references.extend(
+        transaction.psp_reference for transaction in order.payment_transactions.all()
+    )
+    values.extend((reference, "D") for reference in psp_references if reference)
+    return values
+
+
+def prepare_order_search_document_value(order: Order) -> str:
+    values = [value for value, _weight in _order_search_values(order)]
+    return "\n".join(values).lower()
+
+
+def prepare_order_search_vector_value(order: Order) -> SearchVector:
+    vectors = [
+        SearchVector(Value(value), config="simple", weight=weight)
+        for value, weight in _order_search_values(order)
+    ]
+    return reduce(operator.add, vectors)
+
+
+def update_orders_search_fields(orders: Iterable[Order]) -> int:
+    """Fill the search fields of prefetched orders with a single bulk UPDATE."""
+    orders = list(orders)
+    for order in orders:
+        order.search_document = prepare_order_search_document_value(order)
+        order.search_vector = prepare_order_search_vector_value(order)
+        order.search_index_dirty = False
+    Order.objects.bulk_update(orders, SEARCH_FIELDS)
+    return len(orders)
+
+
+def update_dirty_orders_search_fields(batch_size: int = ORDERS_BATCH_SIZE) -> int:
+    """Index a batch of dirty orders.
+
+    The batch is locked with `SKIP LOCKED` so concurrent workers pick disjoint sets
+    of orders. Return the number of indexed orders.
+    """
+    with transaction.atomic():
+        order_ids = list(
+            Order.objects.filter(search_index_dirty=True)
+            .order_by("updated_at")
+            .select_for_update(skip_locked=True, of=("self",))
+            .values_list("pk", flat=True)[:batch_size],
+        )
+        if not order_ids:
+            return 0
+        orders = prefetch_orders_for_search(Order.objects.filter(pk__in=order_ids))
+        return update_orders_search_fields(orders)
+
+
+def update_orders_search_fields_after(
+    last_pk: "UUID | None",
+    batch_size: int = ORDERS_BATCH_SIZE,
+) -> list["UUID"]:
+    """Index the batch of orders following `last_pk` in pk order.
+
+    The batch is locked while it is indexed, so changes committed concurrently
+    mark their orders dirty again instead of being overwritten by a stale index.
+    Return the pks of the indexed orders.
+    """
+    orders = Order.objects.order_by("pk").select_for_update(of=("self",))
+    if last_pk is not None:
+        orders = orders.filter(pk__gt=last_pk)
+    with transaction.atomic():
+        order_ids = list(orders.values_list("pk", flat=True)[:batch_size])
+        if not order_ids:
+            return []
+        update_orders_search_fields(
+            prefetch_orders_for_search(Order.objects.filter(pk__in=order_ids)),
+        )
+    return order_ids
+
+
+def get_search_index_backlog() -> int:
+    return Order.objects.filter(search_index_dirty=True).count()
+
+
+def index_dirty_orders(
+    batch_size: int = ORDERS_BATCH_SIZE,
+    time_budget: float | None = None,
+) -> SearchIndexStats:
+    """Index dirty orders batch by batch until none are left or time runs out."""
+    start = time.monotonic()
+    indexed = run_batches(
+        lambda: update_dirty_orders_search_fields(batch_size),
+        batch_size,
+        time_budget,
+    )
+    stats = SearchIndexStats(
+        indexed=indexed,
+        duration=time.monotonic() - start,
+        backlog=get_search_index_backlog(),
+    )
+    logger.info(
+        "Indexed %s orders in %.2fs (%.1f rows/s), %s orders left in backlog.",
+        stats.indexed,
+        stats.duration,
+        stats.rows_per_second,
+        stats.backlog,
+    )
+    return stats
+
+
+def mark_orders_search_index_dirty(orders: QuerySet[Order]) -> int:
+    # Orders already marked are updated too: an indexer may be clearing their flag
+    # with values read before the change, the UPDATE waits for it to commit.
+    return orders.update(search_index_dirty=True)
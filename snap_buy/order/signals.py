@@ -0,0 +1,59 @@
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from snap_buy.payment.models import Payment
+from snap_buy.payment.models import TransactionItem
+from snap_buy.users.models import Address
+
+from . import OrderStatus
+from .models import Order
+from .models import OrderLine
+from .search import INDEXED_ORDER_FIELDS
+from .search import mark_orders_search_index_dirty
+
+
+@receiver(pre_save, sender=Order)
+def order_pre_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None:
+        instance.search_index_dirty = True
+
+
+@receiver(post_save, sender=Order)
+def order_post_save(sender, instance, update_fields=None, **kwargs):
+    # Partial saves do not persist the flag set on the instance.
+    if update_fields and INDEXED_ORDER_FIELDS.intersection(update_fields):
+        mark_orders_search_index_dirty(Order.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=OrderLine)
+@receiver(post_delete, sender=OrderLine)
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=TransactionItem)
+def order_search_data_changed(sender, instance, **kwargs):
+    if instance.order_id:
+        mark_orders_search_index_dirty(Order.objects.filter(pk=instance.order_id))
+
+
+@receiver(post_save, sender=OrderLine)
+@receiver(post_delete, sender=OrderLine)
+def order_line_changed(sender, instance, **kwargs):
+    # Totals of draft and unconfirmed orders are recalculated in the background
+    # from the stored unit prices of the lines.
+    Order.objects.filter(
+        pk=instance.order_id,
+        status__in=[OrderStatus.DRAFT, OrderStatus.UNCONFIRMED],
+        should_refresh_prices=False,
+    ).update(should_refresh_prices=True)
+
+
+@receiver(post_save, sender=Address)
+def address_saved(sender, instance, created, **kwargs):
+    if not created:
+        mark_orders_search_index_dirty(
+            Order.objects.filter(
+                Q(billing_address_id=instance.pk) | Q(shipping_address_id=instance.pk),
+            ),
+        )
@@ -0,0 +1,111 @@
+from collections.abc import Iterable
+from typing import TYPE_CHECKING
+from typing import NamedTuple
+
+from django.db.models import Exists
+from django.db.models import OuterRef
+
+from snap_buy.payment import ChargeStatus
+from snap_buy.payment import TransactionKind
+from snap_buy.payment.models import REFUNDABLE_CHARGE_STATUSES
+from snap_buy.payment.models import Payment
+from snap_buy.payment.models import Transaction
+
+from .models import CANCELABLE_FULFILLMENT_STATUSES
+from .models import NON_ACTIONABLE_ORDER_STATUSES
+from .models import Fulfillment
+from .models import Order
+
+if TYPE_CHECKING:
+    from uuid import UUID
+
+
+class OrderStates(NamedTuple):
+    can_cancel: bool
+    is_pre_authorized: bool
+    is_captured: bool
+    can_capture: bool
+    can_void: bool
+    can_refund: bool
+    can_mark_as_paid: bool
+
+
+def _has_successful_payment(kind: str) -> Exists:
+    # Same filters as `Order.is_pre_authorized` and `Order.is_captured`.
+    return Exists(
+        Payment.objects.filter(
+            order_id=OuterRef("pk"),
+            is_active=True,
+            transactions__kind=kind,
+            transactions__action_required=False,
+        ).filter(transactions__is_success=True),
+    )
+
+
+def _get_last_payments(order_ids: list["UUID"]) -> dict["UUID", dict]:
+    """Return the last non-partial payment of each order, like `get_last_payment`."""
+    payments = (
+        Payment.objects.filter(order_id__in=order_ids, partial=False)
+        .annotate(
+            is_authorized=Exists(
+                Transaction.objects.filter(
+                    payment_id=OuterRef("pk"),
+                    kind=TransactionKind.AUTH,
+                    is_success=True,
+                    action_required=False,
+                ),
+            ),
+        )
+        .order_by("order_id", "-pk")
+        .distinct("order_id")
+        .values("order_id", "is_active", "charge_status", "is_authorized")
+    )
+    return {payment["order_id"]: payment for payment in payments}
+
+
+def get_orders_states(order_ids: Iterable["UUID"]) -> dict["UUID", OrderStates]:
+    """Evaluate the action flags of many orders with two queries.
+
+    The flags match `Order.can_cancel`, `is_pre_authorized`, `is_captured`,
+    `can_capture`, `can_void`, `can_refund` and `can_mark_as_paid`, which query
+    the database for every order.
+    """
+    order_ids = list(order_ids)
+    orders = (
+        Order.objects.filter(pk__in=order_ids)
+        .annotate(
+            has_blocking_fulfillments=Exists(
+                Fulfillment.objects.filter(order_id=OuterRef("pk")).exclude(
+                    status__in=CANCELABLE_FULFILLMENT_STATUSES,
+                ),
+            ),
+            is_pre_authorized=_has_successful_payment(TransactionKind.AUTH),
+            is_captured=_has_successful_payment(TransactionKind.CAPTURE),
+            has_payments=Exists(Payment.objects.filter(order_id=OuterRef("pk"))),
+        )
+        .values_list(
+            "pk",
+            "status",
+            "has_blocking_fulfillments",
+            "is_pre_authorized",
+            "is_captured",
+            "has_payments",
+        )
+        .order_by()
+    )
+    last_payments = _get_last_payments(order_ids)
+    states = {}
+    for pk, status, blocked, pre_authorized, captured, has_payments in orders:
+        actionable = status not in NON_ACTIONABLE_ORDER_STATUSES
+        payment = last_payments.get(pk, {})
+        not_charged = payment.get("charge_status") == ChargeStatus.NOT_CHARGED
+        states[pk] = OrderStates(
+            can_cancel=actionable and not blocked,
+            is_pre_authorized=pre_authorized,
+            is_captured=captured,
+            can_capture=actionable and not_charged and payment["is_active"],
+            can_void=not_charged and payment["is_authorized"],
+            can_refund=payment.get("charge_status") in REFUNDABLE_CHARGE_STATUSES,
+            can_mark_as_paid=not has_payments,
+        )
+    return states
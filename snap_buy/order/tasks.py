@@ -0,0 +1,140 @@
+from celery import shared_task
+from django.conf import settings
+
+from snap_buy.core import JobStatus
+from snap_buy.core.utils.batches import iter_within_time_budget
+from snap_buy.core.utils.batches import run_batches
+
+from .archive import ORDERS_ARCHIVE_BATCH_SIZE
+from .archive import archive_orders
+from .expiration import EXPIRED_ORDERS_DELETION_BATCH_SIZE
+from .expiration import ORDERS_EXPIRATION_BATCH_SIZE
+from .expiration import delete_expired_orders
+from .expiration import expire_orders
+from .export import finish_order_export
+from .export import prepare_order_export
+from .export import write_order_export_part
+from .models import OrderExport
+from .rollups import SALES_ROLLUPS_WINDOW_SIZE
+from .rollups import update_sales_rollups
+from .search import ORDERS_BATCH_SIZE
+from .search import index_dirty_orders
+from .totals import ORDERS_TOTALS_BATCH_SIZE
+from .totals import recalculate_marked_orders_totals
+
+# Merging the parts of large exports and uploading the file takes longer.
+ORDER_EXPORT_FINISH_TIME_LIMIT = 30 * 60
+
+
+@shared_task()
+def update_orders_search_vector_task(batch_size=ORDERS_BATCH_SIZE):
+    """Index orders marked with `search_index_dirty`.
+
+    Return the indexing throughput and the remaining backlog, so they can be read
+    from the task result.
+    """
+    stats = index_dirty_orders(
+        batch_size,
+        time_budget=settings.BATCH_TASKS_TIME_BUDGET,
+    )
+    return stats.as_dict()
+
+
+@shared_task()
+def recalculate_orders_totals_task():
+    """Recalculate totals of orders marked with `should_refresh_prices`.
+
+    Unit prices of the lines are not refreshed, see
+    `recalculate_marked_orders_totals`.
+    """
+    return run_batches(
+        recalculate_marked_orders_totals,
+        ORDERS_TOTALS_BATCH_SIZE,
+        settings.BATCH_TASKS_TIME_BUDGET,
+    )
+
+
+@shared_task()
+def expire_orders_task():
+    """Expire unpaid unconfirmed orders and release their allocations."""
+    return run_batches(
+        expire_orders,
+        ORDERS_EXPIRATION_BATCH_SIZE,
+        settings.BATCH_TASKS_TIME_BUDGET,
+    )
+
+
+@shared_task()
+def delete_expired_orders_task():
+    """Delete orders expired for longer than the channel retention period.
+
+    Batches left when the time budget runs out are deleted by the next run.
+    """
+    return run_batches(
+        delete_expired_orders,
+        EXPIRED_ORDERS_DELETION_BATCH_SIZE,
+        settings.BATCH_TASKS_TIME_BUDGET,
+    )
+
+
+@shared_task()
+def update_sales_rollups_task():
+    """Refresh sales rollups of days with orders updated since the last run."""
+    return run_batches(
+        update_sales_rollups,
+        SALES_ROLLUPS_WINDOW_SIZE,
+        settings.BATCH_TASKS_TIME_BUDGET,
+    )
+
+
+@shared_task()
+def archive_orders_task():
+    """Move closed orders past `ORDER_ARCHIVE_AFTER` to the archive."""
+    return run_batches(
+        archive_orders,
+        ORDERS_ARCHIVE_BATCH_SIZE,
+        settings.BATCH_TASKS_TIME_BUDGET,
+    )
+
+
+def _fail_order_export(export: OrderExport, error: Exception):
+    export.status = JobStatus.FAILED
+    export.message = str(error)[:255]
+    export.save(update_fields=["status", "message", "updated_at"])
+
+
+@shared_task()
+def export_orders_task(export_id: int):
+    """Write parts of a pending export, continuing in a new task when out of time.
+
+    A failed export resumes from its last part when set back to pending and
+    queued again.
+    """
+    export = OrderExport.objects.filter(pk=export_id, status=JobStatus.PENDING).first()
+    if export is None:
+        return
+    try:
+        prepare_order_export(export)
+        for _ in iter_within_time_budget(settings.BATCH_TASKS_TIME_BUDGET):
+            if not write_order_export_part(export):
+                finish_order_export_task.delay(export_id)
+                return
+    except Exception as e:
+        _fail_order_export(export, e)
+        raise
+    export_orders_task.delay(export_id)
+
+
+@shared_task(
+    soft_time_limit=ORDER_EXPORT_FINISH_TIME_LIMIT,
+    time_limit=ORDER_EXPORT_FINISH_TIME_LIMIT + 60,
+)
+def finish_order_export_task(export_id: int):
+    export = OrderExport.objects.filter(pk=export_id, status=JobStatus.PENDING).first()
+    if export is None:
+        return
+    try:
+        finish_order_export(export)
+    except Exception as e:
+        _fail_order_export(export, e)
+        raise
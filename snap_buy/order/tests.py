@@ -0,0 +1,844 @@
+import csv
+import datetime
+import json
+import os
+from base64 import urlsafe_b64encode
+from decimal import Decimal
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.db.models import Sum
+from django.http import Http404
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from snap_buy.channel.models import Channel
+from snap_buy.core import TimePeriodType
+from snap_buy.order import FulfillmentStatus
+from snap_buy.order import OrderAuthorizeStatus
+from snap_buy.order import OrderChargeStatus
+from snap_buy.order import OrderOrigin
+from snap_buy.order import OrderStatus
+from snap_buy.order.archive import archive_orders
+from snap_buy.order.archive import get_order_or_404
+from snap_buy.order.archive import restore_archived_order
+from snap_buy.order.bulk_import import import_orders
+from snap_buy.order.expiration import delete_expired_orders
+from snap_buy.order.expiration import expire_orders
+from snap_buy.order.export import finish_order_export
+from snap_buy.order.export import prepare_order_export
+from snap_buy.order.export import write_order_export_part
+from snap_buy.order.models import ArchivedOrder
+from snap_buy.order.models import Fulfillment
+from snap_buy.order.models import Order
+from snap_buy.order.models import OrderExport
+from snap_buy.order.models import OrderLine
+from snap_buy.order.models import SalesRollup
+from snap_buy.order.models import SalesRollupWatermark
+from snap_buy.order.numbers import OrderNumberAllocator
+from snap_buy.order.numbers import reserve_order_numbers
+from snap_buy.order.permissions import IsOrderItemPending
+from snap_buy.order.rollups import SALES_ROLLUPS_LAG
+from snap_buy.order.rollups import update_sales_rollups
+from snap_buy.order.search import mark_orders_search_index_dirty
+from snap_buy.order.states import get_orders_states
+from snap_buy.order.totals import recalculate_marked_orders_totals
+from snap_buy.payment import ChargeStatus
+from snap_buy.payment import TransactionKind
+from snap_buy.payment.models import Payment
+from snap_buy.payment.models import Transaction
+from snap_buy.payment.models import TransactionItem
+from snap_buy.product import ProductTypeKind
+from snap_buy.product.models import DigitalContent
+from snap_buy.product.models import Product
+from snap_buy.product.models import ProductType
+from snap_buy.product.models import ProductVariant
+from snap_buy.users.models import Address
+from snap_buy.warehouse.models import Allocation
+from snap_buy.warehouse.models import Stock
+from snap_buy.warehouse.models import Warehouse
+
+pytestmark = pytest.mark.django_db
+
+ORDERS_COUNTS = [10, 100]
+ORDER_NUMBERS_BLOCK_SIZE = 3
+# One query for the orders and one for their last payments.
+ORDERS_STATES_QUERIES = 2
+STATUSES = [
+    OrderStatus.UNFULFILLED,
+    OrderStatus.FULFILLED,
+    OrderStatus.DRAFT,
+    OrderStatus.CANCELED,
+]
+CHARGE_STATUSES = [
+    ChargeStatus.NOT_CHARGED,
+    ChargeStatus.FULLY_CHARGED,
+    ChargeStatus.PARTIALLY_REFUNDED,
+]
+
+
+def _create_orders(channel, count) -> list[Order]:
+    """Create orders with a mix of statuses, payments and fulfillments."""
+    orders = Order.objects.bulk_create(
+        [
+            Order(
+                number=number,
+                channel=channel,
+                origin=OrderOrigin.CHECKOUT,
+                currency="USD",
+                status=STATUSES[number % len(STATUSES)],
+            )
+            for number in range(1, count + 1)
+        ],
+    )
+    payments = Payment.objects.bulk_create(
+        [
+            Payment(
+                order=order,
+                gateway="mirumee.payments.dummy",
+                charge_status=CHARGE_STATUSES[index % len(CHARGE_STATUSES)],
+                total=Decimal(10),
+                currency="USD",
+            )
+            for index, order in enumerate(orders)
+            if index % 5
+        ],
+    )
+    Transaction.objects.bulk_create(
+        [
+            Transaction(
+                payment=payment,
+                kind=[TransactionKind.AUTH, TransactionKind.CAPTURE][index % 2],
+                is_success=True,
+                amount=Decimal(10),
+                currency="USD",
+                gateway_response={},
+            )
+            for index, payment in enumerate(payments)
+        ],
+    )
+    Fulfillment.objects.bulk_create(
+        [
+            Fulfillment(
+                order=order,
+                fulfillment_order=1,
+                status=[FulfillmentStatus.FULFILLED, FulfillmentStatus.CANCELED][
+                    index % 2
+                ],
+            )
+            for index, order in enumerate(orders[::3])
+        ],
+    )
+    return orders
+
+
+def _get_legacy_states(orders) -> list[tuple]:
+    return [
+        (
+            order.can_cancel(),
+            order.is_pre_authorized(),
+            order.is_captured(),
+            order.can_capture(),
+            order.can_void(),
+            order.can_refund(),
+            order.can_mark_as_paid(),
+        )
+        for order in orders
+    ]
+
+
+def test_get_orders_states_matches_order_methods(channel):
+    orders = _create_orders(channel, 20)
+
+    states = get_orders_states([order.pk for order in orders])
+
+    assert [tuple(states[order.pk]) for order in orders] == _get_legacy_states(
+        orders,
+    )
+
+
+@pytest.mark.parametrize("orders_count", ORDERS_COUNTS)
+def test_get_orders_states_queries(orders_count, channel, django_assert_num_queries):
+    orders = _create_orders(channel, orders_count)
+    order_ids = [order.pk for order in orders]
+
+    with CaptureQueriesContext(connection) as legacy:
+        _get_legacy_states(Order.objects.filter(pk__in=order_ids))
+    with django_assert_num_queries(ORDERS_STATES_QUERIES):
+        get_orders_states(order_ids)
+
+    assert len(legacy.captured_queries) > orders_count
+
+
+def test_fulfillment_orders_survive_full_order_save(channel):
+    order = Order.objects.create(
+        channel=channel,
+        origin=OrderOrigin.CHECKOUT,
+        currency="USD",
+        status=OrderStatus.UNFULFILLED,
+    )
+    first = Fulfillment.objects.create(order=order)
+    order.status = OrderStatus.FULFILLED
+    order.save()
+
+    second = Fulfillment.objects.create(order=order)
+
+    assert (first.fulfillment_order, second.fulfillment_order) == (1, 2)
+    order.refresh_from_db()
+    assert order.status == OrderStatus.FULFILLED
+
+
+def test_reserve_order_numbers_are_unique():
+    first = reserve_order_numbers(ORDER_NUMBERS_BLOCK_SIZE)
+    second = reserve_order_numbers(ORDER_NUMBERS_BLOCK_SIZE)
+
+    assert len(set(first + second)) == ORDER_NUMBERS_BLOCK_SIZE * 2
+    assert max(first) < min(second)
+    assert reserve_order_numbers(0) == []
+
+
+def test_order_number_allocator_refills_block(django_assert_num_queries):
+    allocator = OrderNumberAllocator(ORDER_NUMBERS_BLOCK_SIZE)
+
+    with django_assert_num_queries(1):
+        block = [allocator.next() for _ in range(ORDER_NUMBERS_BLOCK_SIZE)]
+    with django_assert_num_queries(1):
+        next_number = allocator.next()
+
+    assert block == sorted(set(block))
+    assert next_number > block[-1]
+    assert next_number not in reserve_order_numbers(ORDER_NUMBERS_BLOCK_SIZE)
+
+
+def test_order_number_allocator_drops_block_after_fork(
+    monkeypatch,
+    django_assert_num_queries,
+):
+    allocator = OrderNumberAllocator(ORDER_NUMBERS_BLOCK_SIZE)
+    parent_number = allocator.next()
+    child_pid = os.getpid() + 1
+    monkeypatch.setattr(os, "getpid", lambda: child_pid)
+
+    with django_assert_num_queries(1):
+        child_numbers = [allocator.next() for _ in range(ORDER_NUMBERS_BLOCK_SIZE - 1)]
+
+    # The parent block still holds the numbers following `parent_number`.
+    assert min(child_numbers) > parent_number + ORDER_NUMBERS_BLOCK_SIZE - 1
+
+
+@pytest.fixture()
+def variant(product) -> ProductVariant:
+    return ProductVariant.objects.create(product=product, sku="SKU-1")
+
+
+def _order_row(reference: str, **data) -> dict:
+    return {
+        "external_reference": reference,
+        "channel": "default-channel",
+        "lines": [
+            {
+                "sku": "SKU-1",
+                "quantity": 2,
+                "unit_price_net": "10.00",
+                "unit_price_gross": "12.30",
+            },
+        ],
+        **data,
+    }
+
+
+def test_import_orders(channel, variant):
+    row = _order_row(
+        "R-1",
+        fulfillments=[{"lines": [{"line": 0, "quantity": 2}]}],
+        payments=[{"gateway": "mirumee.payments.dummy", "total": "24.60"}],
+    )
+
+    result = import_orders([row])
+
+    assert (result.created, result.skipped, result.errors) == (1, 0, [])
+    order = Order.objects.get(external_reference="R-1")
+    assert order.status == OrderStatus.FULFILLED
+    assert order.total_gross_amount == Decimal("24.60")
+    assert order.lines.get().quantity_fulfilled == order.lines.get().quantity
+    assert order.fulfillments.get().fulfillment_order == order.last_fulfillment_order
+
+
+@pytest.mark.parametrize(
+    ("payments", "statuses", "total_charged"),
+    [
+        ([], (OrderChargeStatus.NONE, OrderAuthorizeStatus.NONE), "0"),
+        (
+            [{"total": "24.60"}],
+            (OrderChargeStatus.FULL, OrderAuthorizeStatus.FULL),
+            "24.60",
+        ),
+        (
+            [{"total": "24.60", "charge_status": ChargeStatus.NOT_CHARGED}],
+            (OrderChargeStatus.NONE, OrderAuthorizeStatus.FULL),
+            "0",
+        ),
+        (
+            [
+                {
+                    "total": "24.60",
+                    "captured_amount": "10.00",
+                    "charge_status": ChargeStatus.PARTIALLY_CHARGED,
+                },
+            ],
+            (OrderChargeStatus.PARTIAL, OrderAuthorizeStatus.PARTIAL),
+            "10.00",
+        ),
+        (
+            [{"total": "20.00"}, {"total": "10.00"}],
+            (OrderChargeStatus.OVERCHARGED, OrderAuthorizeStatus.FULL),
+            "30.00",
+        ),
+    ],
+)
+def test_import_orders_derives_charge_data(
+    payments,
+    statuses,
+    total_charged,
+    channel,
+    variant,
+):
+    import_orders([_order_row("R-1", payments=payments)])
+
+    order = Order.objects.get(external_reference="R-1")
+    assert (order.charge_status, order.authorize_status) == statuses
+    assert order.total_charged_amount == Decimal(total_charged)
+    assert order.is_fully_paid() == (
+        statuses[0] in [OrderChargeStatus.FULL, OrderChargeStatus.OVERCHARGED]
+    )
+
+
+def test_import_orders_skips_existing_orders(channel, variant):
+    import_orders([_order_row("R-1")])
+
+    result = import_orders([_order_row("R-1"), _order_row("R-2")])
+
+    assert (result.created, result.skipped) == (1, 1)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"shipping_price_net": "1e20"},
+        {"shipping_price_net": "NaN"},
+        {"created_at": "2024-13-01T00:00:00+00:00"},
+        {"status": "unknown"},
+        # Passes validation, but overflows the line total in the database.
+        {
+            "lines": [
+                {
+                    "sku": "SKU-1",
+                    "quantity": 10**12,
+                    "unit_price_net": "10.00",
+                    "unit_price_gross": "10.00",
+                },
+            ],
+        },
+    ],
+)
+def test_import_orders_reports_invalid_rows(data, channel, variant):
+    rows = [_order_row("R-1"), _order_row("R-2", **data), _order_row("R-3")]
+
+    result = import_orders(rows)
+
+    assert result.created == len(rows) - 1
+    assert [(error.row, error.external_reference) for error in result.errors] == [
+        (2, "R-2"),
+    ]
+    assert set(Order.objects.values_list("external_reference", flat=True)) == {
+        "R-1",
+        "R-3",
+    }
+
+
+def _get_daily_orders_count() -> int:
+    return SalesRollup.objects.filter(period_type=TimePeriodType.DAY).aggregate(
+        total=Sum("orders_count"),
+    )["total"]
+
+
+def test_update_sales_rollups_in_windows(channel):
+    orders = _create_orders(channel, 3)
+    updated_at = timezone.now() - SALES_ROLLUPS_LAG * 2
+    for index, order in enumerate(orders):
+        Order.objects.filter(pk=order.pk).update(
+            updated_at=updated_at + datetime.timedelta(seconds=index),
+        )
+    window_size = len(orders) - 1
+
+    assert update_sales_rollups(window_size=window_size) == window_size
+    watermark = SalesRollupWatermark.objects.get()
+    assert watermark.updated_at == Order.objects.get(pk=orders[1].pk).updated_at
+    assert update_sales_rollups(window_size=window_size) == 1
+    assert update_sales_rollups(window_size=window_size) == 0
+    assert _get_daily_orders_count() == len(orders)
+
+
+def test_sales_rollups_keep_archived_orders(channel, settings):
+    orders = _create_orders(channel, len(STATUSES))
+    created_at = timezone.now() - settings.ORDER_ARCHIVE_AFTER * 2
+    Order.objects.update(created_at=created_at, updated_at=created_at)
+    update_sales_rollups()
+    archived_count = archive_orders()
+    # Rebuild the day of the archived orders from the remaining ones.
+    SalesRollupWatermark.objects.update(updated_at=created_at - SALES_ROLLUPS_LAG)
+
+    update_sales_rollups()
+
+    assert archived_count
+    assert _get_daily_orders_count() == len(orders)
+
+
+def test_restored_order_is_not_archived_again(channel, settings):
+    _create_orders(channel, len(STATUSES))
+    updated_at = timezone.now() - settings.ORDER_ARCHIVE_AFTER * 2
+    Order.objects.update(updated_at=updated_at)
+    archive_orders()
+    archived_order = ArchivedOrder.objects.earliest("pk")
+
+    order = restore_archived_order(archived_order.pk)
+
+    assert order.updated_at > updated_at
+    assert not archive_orders()
+
+
+@pytest.mark.parametrize(("action", "allowed"), [("list", True), ("create", False)])
+def test_order_permissions_read_archived_orders(action, allowed, channel, settings):
+    _create_orders(channel, len(STATUSES))
+    Order.objects.update(updated_at=timezone.now() - settings.ORDER_ARCHIVE_AFTER * 2)
+    archive_orders()
+    archived_order = ArchivedOrder.objects.earliest("pk")
+    view = SimpleNamespace(action=action, kwargs={"order_id": archived_order.pk})
+
+    assert get_order_or_404(id=archived_order.pk).pk == archived_order.pk
+    assert IsOrderItemPending().has_permission(None, view) == allowed
+    with pytest.raises(Http404):
+        get_order_or_404(id=uuid4())
+
+
+def test_export_orders_includes_archived_orders(channel, variant, settings, tmp_path):
+    settings.ORDER_EXPORT_SPOOL_DIR = tmp_path
+    references = ("R-1", "R-2", "R-3")
+    fulfillments = [{"lines": [{"line": 0, "quantity": 2}]}]
+    import_orders(
+        [_order_row(reference, fulfillments=fulfillments) for reference in references],
+    )
+    created_at = timezone.now() - settings.ORDER_ARCHIVE_AFTER * 2
+    Order.objects.update(created_at=created_at, updated_at=created_at)
+    Order.objects.filter(external_reference="R-2").update(updated_at=timezone.now())
+    archive_orders()
+    export = OrderExport.objects.create(
+        created_from=created_at - datetime.timedelta(days=1),
+        created_to=created_at + datetime.timedelta(days=1),
+    )
+
+    prepare_order_export(export)
+    while write_order_export_part(export):
+        pass
+    finish_order_export(export)
+
+    assert ArchivedOrder.objects.count() == len(references) - 1
+    with export.content_file.open("r") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == export.lines_exported == export.lines_total == len(references)
+    order_numbers = [int(row["order_number"]) for row in rows]
+    assert order_numbers == sorted(order_numbers)
+    assert {row["channel"] for row in rows} == {channel.slug}
+
+
+@pytest.mark.parametrize("status", [OrderStatus.DRAFT, OrderStatus.UNCONFIRMED])
+def test_changed_lines_mark_order_prices_to_refresh(status, channel, variant):
+    import_orders([_order_row("R-1", status=status)])
+    order = Order.objects.get(external_reference="R-1")
+    Order.objects.filter(pk=order.pk).update(should_refresh_prices=False)
+    line = order.lines.get()
+
+    line.quantity += 1
+    line.save(update_fields=["quantity"])
+
+    order.refresh_from_db()
+    assert order.should_refresh_prices
+    Order.objects.filter(pk=order.pk).update(should_refresh_prices=False)
+
+    line.delete()
+
+    order.refresh_from_db()
+    assert order.should_refresh_prices
+
+
+def test_recalculate_marked_orders_totals_matches_lines(channel, variant):
+    line_data = _order_row("R-1")["lines"][0]
+    row = _order_row(
+        "R-1",
+        status=OrderStatus.DRAFT,
+        lines=[
+            line_data,
+            {**line_data, "quantity": 3, "unit_price_gross": "12.31"},
+            {**line_data, "quantity": 1, "unit_price_net": "0.99"},
+        ],
+    )
+    import_orders([row])
+    order = Order.objects.get(external_reference="R-1")
+    # Change the lines behind the engine's back, the totals are stale now.
+    order.lines.update(quantity=F("quantity") + 1)
+    order.lines.filter(quantity=2).delete()
+
+    assert recalculate_marked_orders_totals() == 1
+
+    order.refresh_from_db()
+    lines = list(order.lines.all())
+    assert len(lines) == len(row["lines"]) - 1
+    for line in lines:
+        assert line.total_price == line.unit_price * line.quantity
+        assert line.undiscounted_total_price == (
+            line.undiscounted_unit_price * line.quantity
+        )
+    assert order.subtotal == order.get_subtotal()
+    assert order.total == order.get_subtotal() + order.shipping_price
+    assert not order.should_refresh_prices
+
+
+def test_mark_orders_search_index_dirty_updates_marked_orders(channel):
+    orders = _create_orders(channel, len(STATUSES))
+    Order.objects.filter(pk=orders[0].pk).update(search_index_dirty=True)
+
+    assert mark_orders_search_index_dirty(Order.objects.all()) == len(orders)
+
+
+def test_update_orders_search_index_full(channel):
+    orders = _create_orders(channel, len(STATUSES))
+    Order.objects.update(search_index_dirty=True)
+
+    call_command("update_orders_search_index", "--full", batch_size=len(orders) - 1)
+
+    assert not Order.objects.filter(search_index_dirty=True).exists()
+    assert not Order.objects.filter(search_document="").exists()
+
+
+def _create_channel(slug: str, **fields) -> Channel:
+    return Channel.objects.create(
+        name=slug,
+        slug=slug,
+        currency_code="USD",
+        default_country="US",
+        **fields,
+    )
+
+
+def _create_order(channel, status: str, **fields) -> Order:
+    return Order.objects.create(
+        channel=channel,
+        origin=OrderOrigin.CHECKOUT,
+        currency="USD",
+        status=status,
+        **fields,
+    )
+
+
+def test_expire_orders_uses_channel_cutoffs(channel):
+    Channel.objects.filter(pk=channel.pk).update(expire_orders_after=10)
+    created_at = timezone.now() - datetime.timedelta(minutes=30)
+    expired = _create_order(channel, OrderStatus.UNCONFIRMED, created_at=created_at)
+    kept = [
+        _create_order(
+            _create_channel("later-expiry", expire_orders_after=60),
+            OrderStatus.UNCONFIRMED,
+            created_at=created_at,
+        ),
+        _create_order(
+            _create_channel("no-expiry"),
+            OrderStatus.UNCONFIRMED,
+            created_at=created_at,
+        ),
+        _create_order(channel, OrderStatus.UNCONFIRMED),
+        _create_order(channel, OrderStatus.UNFULFILLED, created_at=created_at),
+    ]
+
+    assert expire_orders() == 1
+
+    expired.refresh_from_db()
+    assert expired.status == OrderStatus.EXPIRED
+    assert expired.expired_at
+    for order in kept:
+        status = order.status
+        order.refresh_from_db()
+        assert order.status == status
+
+
+@pytest.mark.parametrize(
+    "charge_data",
+    [
+        {"charge_status": OrderChargeStatus.PARTIAL},
+        {"authorize_status": OrderAuthorizeStatus.FULL},
+    ],
+)
+def test_expire_orders_skips_charged_or_authorized_orders(charge_data, channel):
+    Channel.objects.filter(pk=channel.pk).update(expire_orders_after=10)
+    order = _create_order(
+        channel,
+        OrderStatus.UNCONFIRMED,
+        created_at=timezone.now() - datetime.timedelta(hours=1),
+        **charge_data,
+    )
+
+    assert expire_orders() == 0
+
+    order.refresh_from_db()
+    assert order.status == OrderStatus.UNCONFIRMED
+
+
+def test_expire_orders_releases_allocations(channel, variant):
+    Channel.objects.filter(pk=channel.pk).update(expire_orders_after=10)
+    created_at = timezone.now() - datetime.timedelta(hours=1)
+    import_orders(
+        [
+            _order_row(
+                "R-1",
+                status=OrderStatus.UNCONFIRMED,
+                created_at=created_at.isoformat(),
+            ),
+        ],
+    )
+    line = OrderLine.objects.get()
+    stock = Stock.objects.create(
+        warehouse=Warehouse.objects.create(
+            name="Warehouse",
+            slug="warehouse",
+            address=Address.objects.create(country="US"),
+        ),
+        product_variant=variant,
+        quantity=line.quantity,
+    )
+    # Saving the allocation allocates its quantity in the stock.
+    Allocation.objects.create(
+        order_line=line,
+        stock=stock,
+        quantity_allocated=line.quantity,
+    )
+
+    assert expire_orders() == 1
+
+    assert not Allocation.objects.exists()
+    stock.refresh_from_db()
+    assert stock.quantity_allocated == 0
+
+
+def test_delete_expired_orders_keeps_orders_with_payments(channel):
+    expired_at = (
+        timezone.now() - channel.delete_expired_orders_after - datetime.timedelta(1)
+    )
+    deleted, with_payment, with_transaction = (
+        _create_order(channel, OrderStatus.EXPIRED, expired_at=expired_at)
+        for _ in range(3)
+    )
+    Payment.objects.create(
+        order=with_payment,
+        gateway="mirumee.payments.dummy",
+        total=Decimal(10),
+        currency="USD",
+    )
+    TransactionItem.objects.create(order=with_transaction, currency="USD")
+    recently_expired = _create_order(
+        channel,
+        OrderStatus.EXPIRED,
+        expired_at=timezone.now(),
+    )
+
+    assert delete_expired_orders() == 1
+
+    assert not Order.objects.filter(pk=deleted.pk).exists()
+    assert set(Order.objects.values_list("pk", flat=True)) == {
+        with_payment.pk,
+        with_transaction.pk,
+        recently_expired.pk,
+    }
+
+
+@pytest.fixture()
+def admin_client(user) -> APIClient:
+    user.is_staff = True
+    user.save(update_fields=["is_staff"])
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def _list_orders(client, **params) -> list[dict]:
+    """Return the orders of all pages, following the `next` links."""
+    results: list[dict] = []
+    response = client.get(reverse("api:order-list"), params)
+    # A cursor which doesn't move forward would follow the same page forever.
+    for _ in range(Order.objects.count() + 1):
+        assert response.status_code == status.HTTP_200_OK
+        results.extend(response.data["results"])
+        if not response.data["next"]:
+            return results
+        response = client.get(response.data["next"])
+    pytest.fail("The pages don't end.")
+
+
+@pytest.mark.parametrize(
+    ("ordering", "order_by"),
+    [
+        ({}, ["-number"]),
+        ({"ordering": "-number"}, ["-number"]),
+        ({"ordering": "updated_at"}, ["updated_at", "pk"]),
+    ],
+)
+def test_order_list_pages(ordering, order_by, admin_client, channel):
+    _create_orders(channel, len(STATUSES) * 2)
+    # Half of the orders share `updated_at`, so pages are split inside ties.
+    Order.objects.filter(number__gt=len(STATUSES)).update(updated_at=timezone.now())
+
+    orders = _list_orders(admin_client, page_size=3, **ordering)
+
+    assert [order["id"] for order in orders] == [
+        str(pk) for pk in Order.objects.order_by(*order_by).values_list("pk", flat=True)
+    ]
+
+
+def _encode_cursor(values: list) -> str:
+    return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+@pytest.mark.parametrize(
+    ("params", "status_code"),
+    [
+        ({"ordering": "number"}, status.HTTP_400_BAD_REQUEST),
+        ({"created_after": "yesterday"}, status.HTTP_400_BAD_REQUEST),
+        ({"cursor": "not a cursor"}, status.HTTP_404_NOT_FOUND),
+        ({"cursor": _encode_cursor({"number": 1})}, status.HTTP_404_NOT_FOUND),
+        ({"cursor": _encode_cursor(["not a number"])}, status.HTTP_404_NOT_FOUND),
+        (
+            {"ordering": "updated_at", "cursor": _encode_cursor([1])},
+            status.HTTP_404_NOT_FOUND,
+        ),
+    ],
+)
+def test_order_list_rejects_invalid_params(params, status_code, admin_client):
+    response = admin_client.get(reverse("api:order-list"), params)
+
+    assert response.status_code == status_code
+
+
+FILTERED_ORDER_CREATED_AT = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+
+
+@pytest.mark.parametrize(
+    ("params", "lookup"),
+    [
+        (
+            {"status": [OrderStatus.DRAFT, OrderStatus.CANCELED]},
+            {"status__in": [OrderStatus.DRAFT, OrderStatus.CANCELED]},
+        ),
+        (
+            {"charge_status": OrderChargeStatus.FULL},
+            {"charge_status": OrderChargeStatus.FULL},
+        ),
+        ({"channel": "other-channel"}, {"channel__slug": "other-channel"}),
+        (
+            {"created_before": "2024-01-02T00:00:00+00:00"},
+            {"created_at__lt": FILTERED_ORDER_CREATED_AT + datetime.timedelta(1)},
+        ),
+        (
+            {"created_after": "2024-01-02T00:00:00+00:00"},
+            {"created_at__gte": FILTERED_ORDER_CREATED_AT + datetime.timedelta(1)},
+        ),
+    ],
+)
+def test_order_list_filters(params, lookup, admin_client, channel):
+    orders = _create_orders(channel, len(STATUSES) * 2)
+    Order.objects.filter(pk=orders[0].pk).update(
+        channel=_create_channel("other-channel"),
+        charge_status=OrderChargeStatus.FULL,
+    )
+    Order.objects.filter(pk=orders[1].pk).update(created_at=FILTERED_ORDER_CREATED_AT)
+
+    listed = {order["id"] for order in _list_orders(admin_client, **params)}
+
+    expected = {
+        str(pk) for pk in Order.objects.filter(**lookup).values_list("pk", flat=True)
+    }
+    assert listed == expected
+    assert 0 < len(expected) < len(orders)
+
+
+def test_order_list_requires_admin(user, channel):
+    _create_orders(channel, 1)
+    client = APIClient()
+    url = reverse("api:order-list")
+
+    assert client.get(url).status_code in {
+        status.HTTP_401_UNAUTHORIZED,
+        status.HTTP_403_FORBIDDEN,
+    }
+    client.force_authenticate(user)
+    assert client.get(url).status_code == status.HTTP_403_FORBIDDEN
+
+
+def test_order_line_digital_and_physical_match_is_digital(channel, product):
+    ProductType.objects.filter(pk=product.product_type_id).update(
+        is_digital=True,
+        is_shipping_required=False,
+    )
+    shippable_product = Product.objects.create(
+        name="Shippable product",
+        slug="shippable-product",
+        product_type=ProductType.objects.create(
+            name="Shippable type",
+            slug="shippable-type",
+            kind=ProductTypeKind.NORMAL,
+            is_digital=True,
+        ),
+    )
+    with_content, without_content, shippable, deleted = (
+        ProductVariant.objects.create(product=variant_product, sku=sku)
+        for variant_product, sku in [
+            (product, "WITH-CONTENT"),
+            (product, "WITHOUT-CONTENT"),
+            (shippable_product, "SHIPPABLE"),
+            (product, "DELETED"),
+        ]
+    )
+    DigitalContent.objects.bulk_create(
+        [
+            DigitalContent(product_variant=variant)
+            for variant in (with_content, shippable, deleted)
+        ],
+    )
+    line_data = _order_row("R-1")["lines"][0]
+    import_orders(
+        [
+            _order_row(
+                "R-1",
+                lines=[
+                    {**line_data, "sku": variant.sku}
+                    for variant in (with_content, without_content, shippable, deleted)
+                ],
+            ),
+        ],
+    )
+    # The line keeps its data, but loses the variant.
+    deleted.delete()
+
+    lines = list(OrderLine.objects.select_related("variant"))
+    digital = set(OrderLine.objects.digital().values_list("pk", flat=True))
+    physical = set(OrderLine.objects.physical().values_list("pk", flat=True))
+
+    assert digital == {line.pk for line in lines if line.is_digital}
+    assert physical == {line.pk for line in lines if not line.is_digital}
+    assert digital == {
+        line.pk for line in lines if line.product_sku == with_content.sku
+    }
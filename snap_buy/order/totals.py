@@ -0,0 +1,180 @@
+from collections import defaultdict
+from collections.abc import Iterable
+from decimal import Decimal
+from typing import TYPE_CHECKING
+
+from django.db import transaction
+from django.db.models import FloatField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from measurement.measures import Weight
+
+from . import OrderStatus
+from .models import Order
+from .models import OrderLine
+
+if TYPE_CHECKING:
+    from uuid import UUID
+
+ORDERS_TOTALS_BATCH_SIZE = 100
+
+LINE_TOTAL_FIELDS = (
+    "total_price_net_amount",
+    "total_price_gross_amount",
+    "undiscounted_total_price_net_amount",
+    "undiscounted_total_price_gross_amount",
+)
+ORDER_TOTAL_FIELDS = (
+    "subtotal_net_amount",
+    "subtotal_gross_amount",
+    "total_net_amount",
+    "total_gross_amount",
+    "undiscounted_total_net_amount",
+    "undiscounted_total_gross_amount",
+    "weight",
+)
+LINE_FIELDS = (
+    "order",
+    "quantity",
+    "unit_price_net_amount",
+    "unit_price_gross_amount",
+    "undiscounted_unit_price_net_amount",
+    "undiscounted_unit_price_gross_amount",
+    *LINE_TOTAL_FIELDS,
+)
+ORDER_FIELDS = (
+    "shipping_price_net_amount",
+    "shipping_price_gross_amount",
+    "undiscounted_base_shipping_price_amount",
+    *ORDER_TOTAL_FIELDS,
+)
+
+
+def calculate_line_totals(line: OrderLine) -> dict[str, Decimal]:
+    return {
+        "total_price_net_amount": line.unit_price_net_amount * line.quantity,
+        "total_price_gross_amount": line.unit_price_gross_amount * line.quantity,
+        "undiscounted_total_price_net_amount": (
+            line.undiscounted_unit_price_net_amount * line.quantity
+        ),
+        "undiscounted_total_price_gross_amount": (
+            line.undiscounted_unit_price_gross_amount * line.quantity
+        ),
+    }
+
+
+def calculate_order_totals(
+    order: Order,
+    lines: list[OrderLine],
+) -> dict[str, Decimal | Weight]:
+    """Return order totals summed from the lines and the shipping price.
+
+    The lines need a `variant_weight` attribute in the standard weight unit.
+    """
+    sums = dict.fromkeys(LINE_TOTAL_FIELDS, Decimal(0))
+    weight = 0.0
+    for line in lines:
+        for field in LINE_TOTAL_FIELDS:
+            sums[field] += getattr(line, field)
+        weight += (line.variant_weight or 0.0) * line.quantity  # type: ignore[attr-defined]
+    undiscounted_shipping = order.undiscounted_base_shipping_price_amount
+    return {
+        "subtotal_net_amount": sums["total_price_net_amount"],
+        "subtotal_gross_amount": sums["total_price_gross_amount"],
+        "total_net_amount": (
+            sums["total_price_net_amount"] + order.shipping_price_net_amount
+        ),
+        "total_gross_amount": (
+            sums["total_price_gross_amount"] + order.shipping_price_gross_amount
+        ),
+        "undiscounted_total_net_amount": (
+            sums["undiscounted_total_price_net_amount"] + undiscounted_shipping
+        ),
+        "undiscounted_total_gross_amount": (
+            sums["undiscounted_total_price_gross_amount"] + undiscounted_shipping
+        ),
+        # Weights are stored and annotated in the standard unit.
+        "weight": Weight(**{Weight.STANDARD_UNIT: weight}),
+    }
+
+
+def _set_changed(instance, values: dict) -> bool:
+    changed = False
+    for field, value in values.items():
+        if getattr(instance, field) != value:
+            setattr(instance, field, value)
+            changed = True
+    return changed
+
+
+def recalculate_orders_totals(order_ids: Iterable["UUID"]) -> int:
+    """Recalculate line and order totals of orders in one pass.
+
+    Lines of all the orders are read with a single query and their totals are
+    derived from the stored unit prices, order totals from the line totals and
+    the shipping price. Only changed lines and orders are written back, with one
+    `bulk_update` per model. Return the number of updated orders.
+    """
+    order_ids = list(order_ids)
+    lines = (
+        OrderLine.objects.filter(order_id__in=order_ids)
+        .annotate(
+            variant_weight=Coalesce(
+                "variant__weight",
+                "variant__product__weight",
+                "variant__product__product_type__weight",
+                output_field=FloatField(),
+            ),
+        )
+        .only(*LINE_FIELDS)
+        .order_by()
+    )
+    order_lines = defaultdict(list)
+    changed_lines = []
+    for line in lines:
+        if _set_changed(line, calculate_line_totals(line)):
+            changed_lines.append(line)
+        order_lines[line.order_id].append(line)
+
+    changed_orders = []
+    now = timezone.now()
+    for order in Order.objects.filter(pk__in=order_ids).only(*ORDER_FIELDS):
+        changed = _set_changed(
+            order,
+            calculate_order_totals(order, order_lines[order.pk]),
+        )
+        if changed:
+            order.updated_at = now
+            changed_orders.append(order)
+    with transaction.atomic():
+        OrderLine.objects.bulk_update(changed_lines, LINE_TOTAL_FIELDS)
+        Order.objects.bulk_update(changed_orders, [*ORDER_TOTAL_FIELDS, "updated_at"])
+    return len(changed_orders)
+
+
+def recalculate_marked_orders_totals(
+    batch_size: int = ORDERS_TOTALS_BATCH_SIZE,
+) -> int:
+    """Recalculate totals of a batch of orders marked with `should_refresh_prices`.
+
+    Only draft and unconfirmed orders are processed. Unit prices of the lines are
+    kept as stored, they are not looked up again in the channel listings, so the
+    flag is cleared once the totals match the lines. The orders are locked with
+    `SKIP LOCKED`, so concurrent workers pick disjoint batches. Return the number
+    of processed orders.
+    """
+    with transaction.atomic():
+        order_ids = list(
+            Order.objects.filter(
+                should_refresh_prices=True,
+                status__in=[OrderStatus.DRAFT, OrderStatus.UNCONFIRMED],
+            )
+            .order_by("updated_at")
+            .select_for_update(skip_locked=True, of=("self",))
+            .values_list("pk", flat=True)[:batch_size],
+        )
+        if not order_ids:
+            return 0
+        recalculate_orders_totals(order_ids)
+        Order.objects.filter(pk__in=order_ids).update(should_refresh_prices=False)
+    return len(order_ids)
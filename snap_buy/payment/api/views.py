@@ -70,6 +70,8 @@ class StripeCheckoutSessionCreateAPIView(APIView):
     )
 
     def post(self, request, *args, **kwargs):
+        # Archived orders are closed and can't be paid, so the archive isn't
+        # looked up.
         order = get_object_or_404(Order, id=self.kwargs.get("order_id"))
 
         order_items = []
@@ -135,6 +137,7 @@ class StripeWebhookAPIView(APIView):
             payment.status = "C"
             payment.save()
 
+            # The order is saved, which archived orders must not be.
             order = get_object_or_404(Order, id=order_id)
             order.status = "C"
             order.save()
@@ -26,6 +26,12 @@ from . import TransactionAction
 from . import TransactionEventType
 from . import TransactionKind
 
+REFUNDABLE_CHARGE_STATUSES = (
+    ChargeStatus.PARTIALLY_CHARGED,
+    ChargeStatus.FULLY_CHARGED,
+    ChargeStatus.PARTIALLY_REFUNDED,
+)
+
 
 class TransactionItem(ModelWithMetadata):
     token = models.UUIDField(unique=True, default=uuid4)
@@ -420,12 +426,7 @@ class Payment(ModelWithMetadata):
         return self.not_charged and self.is_authorized
 
     def can_refund(self):
-        can_refund_charge_status = (
-            ChargeStatus.PARTIALLY_CHARGED,
-            ChargeStatus.FULLY_CHARGED,
-            ChargeStatus.PARTIALLY_REFUNDED,
-        )
-        return self.charge_status in can_refund_charge_status
+        return self.charge_status in REFUNDABLE_CHARGE_STATUSES
 
     def can_confirm(self):
         return self.is_active and self.not_charged
@@ -1,8 +1,7 @@
-from django.shortcuts import get_object_or_404
 from django.utils.translation import gettext_lazy as _
 from rest_framework.permissions import BasePermission
 
-from snap_buy.order.models import Order
+from snap_buy.order.archive import get_order_or_404
 
 
 class IsPaymentByUser(BaseException):
@@ -36,7 +35,7 @@ class IsPaymentForOrderNotCompleted(BasePermission):
     def has_permission(self, request, view):
         if request.user.is_authenticated:
             order_id = view.kwargs.get("order_id")
-            order = get_object_or_404(Order, id=order_id)
+            order = get_order_or_404(id=order_id)
             return order.status != "C"
         return False
 
@@ -49,7 +48,7 @@ class DoesOrderHaveAddress(BasePermission):
     def has_permission(self, request, view):
         if request.user.is_authenticated:
             order_id = view.kwargs.get("order_id")
-            order = get_object_or_404(Order, id=order_id)
+            order = get_order_or_404(id=order_id)
             return order.shipping_address and order.billing_address
         return False
 
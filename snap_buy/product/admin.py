@@ -16,6 +16,7 @@ from .models import ProductType
 from .models import ProductVariant
 from .models import ProductVariantChannelListing
 from .models import ProductVariantTranslation
+from .models import ProductVisibility
 from .models import VariantChannelListingPromotionRule
 from .models import VariantMedia
 
@@ -167,6 +168,26 @@ class ProductChannelListingAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(ProductVisibility)
+class ProductVisibilityAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "product",
+        "channel",
+        "is_published",
+        "visible_in_listings",
+        "has_priced_variant",
+        "published_from",
+        "updated_at",
+    )
+    list_filter = (
+        "channel",
+        "is_published",
+        "visible_in_listings",
+        "has_priced_variant",
+    )
+
+
 @admin.register(ProductVariant)
 class ProductVariantAdmin(admin.ModelAdmin):
     list_display = (
@@ -182,6 +203,7 @@ class ProductVariantAdmin(admin.ModelAdmin):
         "is_preorder",
         "preorder_end_date",
         "preorder_global_threshold",
+        "preorder_global_quantity_allocated",
         "quantity_limit_per_customer",
         "created_at",
         "updated_at",
@@ -218,6 +240,7 @@ class ProductVariantChannelListingAdmin(admin.ModelAdmin):
         "cost_price_amount",
         "discounted_price_amount",
         "preorder_quantity_threshold",
+        "preorder_quantity_allocated",
         "price",
         "cost_price",
         "discounted_price",
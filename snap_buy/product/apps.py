@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "snap_buy.product"
+
+    def ready(self):
+        import snap_buy.product.signals  # noqa: F401
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from snap_buy.core.utils.batches import iter_batches
+from snap_buy.product.models import Product
+from snap_buy.product.utils.visibility import VISIBILITY_BATCH_SIZE
+from snap_buy.product.utils.visibility import update_products_visibility
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized product visibility table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=VISIBILITY_BATCH_SIZE,
+            help="Number of products processed per batch.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        product_ids = (
+            Product.objects.order_by("pk")
+            .values_list("pk", flat=True)
+            .iterator(chunk_size=batch_size)
+        )
+        total = 0
+        for batch in iter_batches(product_ids, batch_size):
+            total += update_products_visibility(batch)
+        self.stdout.write(self.style.SUCCESS(f"Updated {total} visibility rows."))
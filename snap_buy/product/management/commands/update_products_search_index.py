@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from snap_buy.product.search import PRODUCTS_BATCH_SIZE
+from snap_buy.product.search import get_search_index_backlog
+from snap_buy.product.search import index_dirty_products
+from snap_buy.product.search import update_products_search_fields_after
+
+
+class Command(BaseCommand):
+    help = "Update the search document and search vector of products."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Reindex the whole catalogue instead of the dirty products only.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=PRODUCTS_BATCH_SIZE,
+            help="Number of products written per UPDATE statement.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if not options["full"]:
+            stats = index_dirty_products(batch_size)
+            self._report(stats.indexed, stats.duration, stats.backlog)
+            return
+
+        start = time.monotonic()
+        indexed = 0
+        # Products are walked by pk with short keyset queries instead of a cursor
+        # held open over the whole catalogue.
+        last_pk = None
+        while True:
+            product_ids = update_products_search_fields_after(last_pk, batch_size)
+            if not product_ids:
+                break
+            indexed += len(product_ids)
+            last_pk = product_ids[-1]
+            self.stdout.write(f"Indexed {indexed} products...")
+        self._report(indexed, time.monotonic() - start, get_search_index_backlog())
+
+    def _report(self, indexed, duration, backlog):
+        rate = indexed / duration if duration else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {indexed} products in {duration:.2f}s ({rate:.1f} rows/s). "
+                f"Backlog: {backlog}.",
+            ),
+        )
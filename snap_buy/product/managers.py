@@ -3,9 +3,9 @@ from typing import TYPE_CHECKING
 from typing import Union
 
 import pytz
+from django.conf import settings
 from django.db import models
 from django.db.models import BooleanField
-from django.db.models import Case
 from django.db.models import DateTimeField
 from django.db.models import Exists
 from django.db.models import ExpressionWrapper
@@ -15,8 +15,8 @@ from django.db.models import Q
 from django.db.models import Subquery
 from django.db.models import Sum
 from django.db.models import Value
-from django.db.models import When
 from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 from snap_buy.channel.models import Channel
 from snap_buy.permission.utils import has_one_of_permissions
@@ -57,6 +57,8 @@ class ProductsQueryset(models.QuerySet):
 
         if not channel.is_active:
             return self.none()
+        if settings.PRODUCT_VISIBILITY_MATERIALIZED:
+            return self.published_with_variants_materialized(channel)
         variant_channel_listings = (
             ProductVariantChannelListing.objects.using(self.db)
             .filter(
@@ -72,6 +74,21 @@ class ProductsQueryset(models.QuerySet):
             Exists(variants.filter(product_id=OuterRef("pk"))),
         )
 
+    def published_with_variants_materialized(self, channel: Channel):
+        """Return products published with priced variants in the channel.
+
+        The result is equal to `published_with_variants` but it is read from
+        the `ProductVisibility` table with a single join instead of evaluating
+        the channel listings of products and variants.
+        """
+        if not channel.is_active:
+            return self.none()
+        return self.filter(
+            visibility__channel_id=channel.id,
+            visibility__is_published=True,
+            visibility__has_priced_variant=True,
+        )
+
     def visible_to_user(
         self,
         requestor: Union["User", None],
@@ -176,6 +193,37 @@ ProductManager = models.Manager.from_queryset(ProductsQueryset)
 
 
 class ProductVariantQueryset(models.QuerySet):
+    def _quantity_reserved(self):
+        from snap_buy.warehouse.models import Reservation
+
+        return Coalesce(
+            Subquery(
+                Reservation.objects.using(self.db)
+                .filter(
+                    stock__product_variant_id=OuterRef("pk"),
+                    reserved_until__gt=timezone.now(),
+                )
+                .order_by()
+                .values("stock__product_variant_id")
+                .annotate(total=Sum("quantity_reserved"))
+                .values("total"),
+                output_field=models.IntegerField(),
+            ),
+            Value(0),
+        )
+
+    def _annotate_quantities(self, quantity, quantity_allocated):
+        quantity_reserved = self._quantity_reserved()
+        return self.annotate(
+            quantity=quantity,
+            quantity_allocated=quantity_allocated,
+            quantity_reserved=quantity_reserved,
+            available_quantity=ExpressionWrapper(
+                quantity - quantity_allocated - quantity_reserved,
+                output_field=models.IntegerField(),
+            ),
+        )
+
     def annotate_quantities(self):
         """Annotate the queryset with quantity-related fields.
 
@@ -183,35 +231,29 @@ class ProductVariantQueryset(models.QuerySet):
         - `quantity`: The total quantity in stock for each product variant.
         - `quantity_allocated`: The total quantity allocated from the stock
           for each product variant.
+        - `quantity_reserved`: The total quantity of active checkout reservations
+          of the stock for each product variant.
         - `available_quantity`: The available quantity for each product variant,
-          which is calculated as `quantity - quantity_allocated`.
+          which is calculated as `quantity - quantity_allocated - quantity_reserved`.
         """
+        if settings.STOCK_SUMMARY_MATERIALIZED:
+            return self.annotate_quantities_from_summary()
 
-        from snap_buy.warehouse.models import Allocation
-
-        allocations_subquery = (
-            Allocation.objects.using(self.db)
-            .filter(stock__product_variant=OuterRef("pk"))
-            .values("stock__product_variant")
-            .annotate(total_allocated=Coalesce(Sum("quantity_allocated"), 0))
-            .values("total_allocated")
+        return self._annotate_quantities(
+            Coalesce(Sum("stocks__quantity"), Value(0)),
+            Coalesce(Sum("stocks__quantity_allocated"), Value(0)),
         )
 
-        return self.annotate(
-            quantity=Coalesce(Sum("stocks__quantity"), Value(0)),
-            quantity_allocated=Coalesce(
-                Subquery(allocations_subquery, output_field=models.IntegerField()),
-                Value(0),
-            ),
-            available_quantity=Case(
-                When(quantity_allocated=None, then=F("quantity")),
-                default=F("quantity")
-                - Coalesce(
-                    Subquery(allocations_subquery, output_field=models.IntegerField()),
-                    Value(0),
-                ),
-                output_field=models.IntegerField(),
-            ),
+    def annotate_quantities_from_summary(self):
+        """Annotate the queryset with quantity-related fields.
+
+        The fields are equal to the ones from `annotate_quantities` but the stock
+        quantities are read from `ProductVariantStockSummary` with a single join.
+        Reservations expire with time, so they are always summed from the stocks.
+        """
+        return self._annotate_quantities(
+            Coalesce(F("stock_summary__quantity"), Value(0)),
+            Coalesce(F("stock_summary__quantity_allocated"), Value(0)),
         )
 
     def available_in_channel(self, channel: Channel | None):
@@ -280,9 +322,14 @@ ProductVariantManager = models.Manager.from_queryset(ProductVariantQueryset)
 
 
 class ProductVariantChannelListingQuerySet(models.QuerySet):
-    def annotate_preorder_quantity_allocated(self):
+    def annotate_preorder_allocations_quantity(self):
+        """Annotate the sum of preorder allocations.
+
+        `preorder_quantity_allocated` is a counter kept up to date by preorder
+        allocations; the sum is meant for verifying it.
+        """
         return self.annotate(
-            preorder_quantity_allocated=Coalesce(
+            preorder_allocations_quantity=Coalesce(
                 Sum("preorder_allocations__quantity"),
                 0,
             ),
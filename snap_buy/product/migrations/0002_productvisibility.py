@@ -0,0 +1,67 @@
+# Generated by Django 5.0.8 on 2026-10-17 01:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("channel", "0001_initial"),
+        ("product", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductVisibility",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("is_published", models.BooleanField(default=False)),
+                ("visible_in_listings", models.BooleanField(default=False)),
+                ("has_priced_variant", models.BooleanField(default=False)),
+                ("published_from", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "channel",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="product_visibility",
+                        to="channel.channel",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="visibility",
+                        to="product.product",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("pk",),
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(
+                            ("has_priced_variant", True), ("is_published", True)
+                        ),
+                        fields=["channel", "product"],
+                        name="product_visibility_lookup_idx",
+                    ),
+                    models.Index(
+                        condition=models.Q(("is_published", False)),
+                        fields=["published_from"],
+                        name="product_visibility_sched_idx",
+                    ),
+                ],
+                "unique_together": {("product", "channel")},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.8 on 2026-10-17 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("product", "0002_productvisibility"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productvariant",
+            name="preorder_global_quantity_allocated",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="productvariantchannellisting",
+            name="preorder_quantity_allocated",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -350,6 +350,49 @@ class ProductChannelListing(PublishableModel):
         )
 
 
+class ProductVisibility(models.Model):
+    """Materialized storefront visibility of a product in a channel.
+
+    Rows are derived from `ProductChannelListing` and `ProductVariantChannelListing`
+    and kept in sync by `snap_buy.product.utils.visibility`.
+    `is_published` is the effective publication state at the time the row was
+    computed; `published_from` holds the scheduled publication date of a published
+    listing so the periodic sweep can flip rows once that date passes.
+    """
+
+    product = models.ForeignKey(
+        Product,
+        related_name="visibility",
+        on_delete=models.CASCADE,
+    )
+    channel = models.ForeignKey(
+        Channel,
+        related_name="product_visibility",
+        on_delete=models.CASCADE,
+    )
+    is_published = models.BooleanField(default=False)
+    visible_in_listings = models.BooleanField(default=False)
+    has_priced_variant = models.BooleanField(default=False)
+    published_from = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [["product", "channel"]]
+        ordering = ("pk",)
+        indexes = [
+            models.Index(
+                fields=["channel", "product"],
+                name="product_visibility_lookup_idx",
+                condition=models.Q(is_published=True, has_priced_variant=True),
+            ),
+            models.Index(
+                fields=["published_from"],
+                name="product_visibility_sched_idx",
+                condition=models.Q(is_published=False),
+            ),
+        ]
+
+
 class ProductVariant(SortableModel, ModelWithMetadata, ModelWithExternalReference):
     sku = models.CharField(max_length=255, unique=True, null=True, blank=True)
     name = models.CharField(max_length=255, blank=True)
@@ -366,6 +409,8 @@ class ProductVariant(SortableModel, ModelWithMetadata, ModelWithExternalReferenc
     is_preorder = models.BooleanField(default=False)
     preorder_end_date = models.DateTimeField(null=True, blank=True)
     preorder_global_threshold = models.IntegerField(blank=True, null=True)
+    # Maintained by preorder allocations, see `snap_buy.warehouse.preorders`.
+    preorder_global_quantity_allocated = models.IntegerField(default=0)
     quantity_limit_per_customer = models.IntegerField(
         blank=True,
         null=True,
@@ -536,6 +581,8 @@ class ProductVariantChannelListing(models.Model):
     )
 
     preorder_quantity_threshold = models.IntegerField(blank=True, null=True)
+    # Maintained by preorder allocations, see `snap_buy.warehouse.preorders`.
+    preorder_quantity_allocated = models.IntegerField(default=0)
 
     objects = managers.ProductVariantChannelListingManager()
 
@@ -0,0 +1,186 @@
+import logging
+import operator
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from functools import reduce
+
+from django.contrib.postgres.search import SearchVector
+from django.db import transaction
+from django.db.models import Prefetch
+from django.db.models import QuerySet
+from django.db.models import Value
+
+from snap_buy.core.utils.batches import run_batches
+
+from .models import Product
+from .models import ProductVariant
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS_BATCH_SIZE = 300
+SEARCH_FIELDS = ("search_document", "search_vector", "search_index_dirty")
+# Changing any of those fields through `Product.save` marks the product as dirty.
+INDEXED_PRODUCT_FIELDS = frozenset(
+    ["name", "description", "description_plaintext", "category"],
+)
+
+
+@dataclass
+class SearchIndexStats:
+    indexed: int
+    duration: float
+    backlog: int
+
+    @property
+    def rows_per_second(self) -> float:
+        if not self.duration:
+            return 0.0
+        return self.indexed / self.duration
+
+    def as_dict(self) -> dict:
+        return {
+            "indexed": self.indexed,
+            "duration": round(self.duration, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+            "backlog": self.backlog,
+        }
+
+
+def prefetch_products_for_search(products: QuerySet[Product]) -> QuerySet[Product]:
+    return products.select_related("category").prefetch_related(
+        "translations",
+        Prefetch(
+            "variants",
+            queryset=ProductVariant.objects.prefetch_related("translations"),
+        ),
+    )
+
+
+def _product_search_values(product: Product) -> list[tuple[str, str]]:
+    """Return the searchable values of a product along with their weights."""
+    values = [(product.name, "A")]
+    values.extend(
+        (translation.name, "A")
+        for translation in product.translations.all()
+        if translation.name
+    )
+    for variant in product.variants.all():
+        if variant.sku:
+            values.append((variant.sku, "A"))
+        if variant.name:
+            values.append((variant.name, "B"))
+        values.extend(
+            (translation.name, "B")
+            for translation in variant.translations.all()
+            if translation.name
+        )
+    if product.category:
+        values.append((product.category.name, "C"))
+    if product.description_plaintext:
+        values.append((product.description_plaintext, "D"))
+    return values
+
+
+def prepare_product_search_document_value(product: Product) -> str:
+    values = [value for value, _weight in _product_search_values(product)]
+    return "\n".join(values).lower()
+
+
+def prepare_product_search_vector_value(product: Product) -> SearchVector:
+    vectors = [
+        SearchVector(Value(value), config="simple", weight=weight)
+        for value, weight in _product_search_values(product)
+    ]
+    return reduce(operator.add, vectors)
+
+
+def update_products_search_fields(products: Iterable[Product]) -> int:
+    """Fill the search fields of prefetched products with a single bulk UPDATE."""
+    products = list(products)
+    for product in products:
+        product.search_document = prepare_product_search_document_value(product)
+        product.search_vector = prepare_product_search_vector_value(product)
+        product.search_index_dirty = False
+    Product.objects.bulk_update(products, SEARCH_FIELDS)
+    return len(products)
+
+
+def update_dirty_products_search_fields(batch_size: int = PRODUCTS_BATCH_SIZE) -> int:
+    """Index a batch of dirty products.
+
+    The batch is locked with `SKIP LOCKED` so concurrent workers pick disjoint sets
+    of products. Return the number of indexed products.
+    """
+    with transaction.atomic():
+        product_ids = list(
+            Product.objects.filter(search_index_dirty=True)
+            .order_by("updated_at")
+            .select_for_update(skip_locked=True, of=("self",))
+            .values_list("pk", flat=True)[:batch_size],
+        )
+        if not product_ids:
+            return 0
+        products = prefetch_products_for_search(
+            Product.objects.filter(pk__in=product_ids),
+        )
+        return update_products_search_fields(products)
+
+
+def update_products_search_fields_after(
+    last_pk: int | None,
+    batch_size: int = PRODUCTS_BATCH_SIZE,
+) -> list[int]:
+    """Index the batch of products following `last_pk` in pk order.
+
+    The batch is locked while it is indexed, so changes committed concurrently
+    mark their products dirty again instead of being overwritten by a stale index.
+    Return the pks of the indexed products.
+    """
+    products = Product.objects.order_by("pk").select_for_update(of=("self",))
+    if last_pk is not None:
+        products = products.filter(pk__gt=last_pk)
+    with transaction.atomic():
+        product_ids = list(products.values_list("pk", flat=True)[:batch_size])
+        if not product_ids:
+            return []
+        update_products_search_fields(
+            prefetch_products_for_search(Product.objects.filter(pk__in=product_ids)),
+        )
+    return product_ids
+
+
+def get_search_index_backlog() -> int:
+    return Product.objects.filter(search_index_dirty=True).count()
+
+
+def index_dirty_products(
+    batch_size: int = PRODUCTS_BATCH_SIZE,
+    time_budget: float | None = None,
+) -> SearchIndexStats:
+    """Index dirty products batch by batch until none are left or time runs out."""
+    start = time.monotonic()
+    indexed = run_batches(
+        lambda: update_dirty_products_search_fields(batch_size),
+        batch_size,
+        time_budget,
+    )
+    stats = SearchIndexStats(
+        indexed=indexed,
+        duration=time.monotonic() - start,
+        backlog=get_search_index_backlog(),
+    )
+    logger.info(
+        "Indexed %s products in %.2fs (%.1f rows/s), %s products left in backlog.",
+        stats.indexed,
+        stats.duration,
+        stats.rows_per_second,
+        stats.backlog,
+    )
+    return stats
+
+
+def mark_products_search_index_dirty(products: QuerySet[Product]) -> int:
+    # Products already marked are updated too: an indexer may be clearing their
+    # flag with values read before the change, the UPDATE waits for it to commit.
+    return products.update(search_index_dirty=True)
@@ -0,0 +1,90 @@
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from .models import Category
+from .models import Product
+from .models import ProductChannelListing
+from .models import ProductTranslation
+from .models import ProductVariant
+from .models import ProductVariantChannelListing
+from .models import ProductVariantTranslation
+from .search import INDEXED_PRODUCT_FIELDS
+from .search import mark_products_search_index_dirty
+from .utils.variant_prices import mark_discounted_prices_dirty
+from .utils.visibility import schedule_products_visibility_update
+
+
+@receiver(post_save, sender=ProductChannelListing)
+@receiver(post_delete, sender=ProductChannelListing)
+def product_channel_listing_changed(sender, instance, **kwargs):
+    schedule_products_visibility_update([instance.product_id])
+
+
+@receiver(post_save, sender=ProductVariantChannelListing)
+@receiver(post_delete, sender=ProductVariantChannelListing)
+def variant_channel_listing_changed(sender, instance, **kwargs):
+    product_ids = ProductVariant.objects.filter(pk=instance.variant_id).values_list(
+        "product_id",
+        flat=True,
+    )
+    schedule_products_visibility_update(product_ids)
+
+
+@receiver(post_save, sender=ProductVariantChannelListing)
+@receiver(post_delete, sender=ProductVariantChannelListing)
+def variant_channel_listing_price_changed(
+    sender,
+    instance,
+    update_fields=None,
+    **kwargs,
+):
+    if update_fields is None or "price_amount" in update_fields:
+        mark_discounted_prices_dirty(
+            ProductVariant.objects.filter(pk=instance.variant_id).values_list(
+                "product_id",
+                flat=True,
+            ),
+            [instance.channel_id],
+        )
+
+
+@receiver(post_delete, sender=ProductVariant)
+def variant_deleted(sender, instance, **kwargs):
+    schedule_products_visibility_update([instance.product_id])
+
+
+@receiver(pre_save, sender=Product)
+def product_pre_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None:
+        instance.search_index_dirty = True
+
+
+@receiver(post_save, sender=Product)
+def product_post_save(sender, instance, update_fields=None, **kwargs):
+    # Partial saves do not persist the flag set on the instance.
+    if update_fields and INDEXED_PRODUCT_FIELDS.intersection(update_fields):
+        mark_products_search_index_dirty(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=ProductTranslation)
+@receiver(post_delete, sender=ProductTranslation)
+def product_search_data_changed(sender, instance, **kwargs):
+    mark_products_search_index_dirty(Product.objects.filter(pk=instance.product_id))
+
+
+@receiver(post_save, sender=ProductVariantTranslation)
+@receiver(post_delete, sender=ProductVariantTranslation)
+def variant_translation_changed(sender, instance, **kwargs):
+    mark_products_search_index_dirty(
+        Product.objects.filter(variants__pk=instance.product_variant_id),
+    )
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or "name" in update_fields):
+        mark_products_search_index_dirty(instance.products.all())
@@ -0,0 +1,47 @@
+from celery import shared_task
+from django.conf import settings
+
+from snap_buy.core.utils.batches import run_batches
+
+from .search import PRODUCTS_BATCH_SIZE
+from .search import index_dirty_products
+from .utils.variant_prices import DISCOUNTED_PRICES_BATCH_SIZE
+from .utils.variant_prices import update_discounted_prices_for_dirty_listings
+from .utils.visibility import get_products_with_passed_publication_date
+from .utils.visibility import update_products_visibility
+
+
+@shared_task()
+def update_products_visibility_task(product_ids):
+    update_products_visibility(product_ids)
+
+
+@shared_task()
+def update_scheduled_products_visibility_task():
+    """Publish visibility rows whose scheduled `published_at` date has passed."""
+    product_ids = list(get_products_with_passed_publication_date())
+    return update_products_visibility(product_ids)
+
+
+@shared_task()
+def update_products_search_vector_task(batch_size=PRODUCTS_BATCH_SIZE):
+    """Index products marked with `search_index_dirty`.
+
+    Return the indexing throughput and the remaining backlog, so they can be read
+    from the task result.
+    """
+    stats = index_dirty_products(
+        batch_size,
+        time_budget=settings.BATCH_TASKS_TIME_BUDGET,
+    )
+    return stats.as_dict()
+
+
+@shared_task()
+def update_discounted_prices_for_dirty_listings_task():
+    """Recalculate discounted prices of product listings marked as dirty."""
+    return run_batches(
+        update_discounted_prices_for_dirty_listings,
+        DISCOUNTED_PRICES_BATCH_SIZE,
+        settings.BATCH_TASKS_TIME_BUDGET,
+    )
@@ -1 +1,77 @@
-# Create your tests here.
+import pytest
+from django.core.management import call_command
+
+from snap_buy.product.models import Product
+from snap_buy.product.models import ProductChannelListing
+from snap_buy.product.search import index_dirty_products
+from snap_buy.product.search import mark_products_search_index_dirty
+from snap_buy.product.tasks import update_products_visibility_task
+
+pytestmark = pytest.mark.django_db
+
+PRODUCTS_COUNT = 3
+
+
+def test_changed_listing_queues_visibility_update(
+    product,
+    channel,
+    monkeypatch,
+    django_capture_on_commit_callbacks,
+):
+    queued: list[list[int]] = []
+    monkeypatch.setattr(update_products_visibility_task, "delay", queued.append)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        ProductChannelListing.objects.create(
+            product=product,
+            channel=channel,
+            currency="USD",
+        )
+
+    assert queued == [[product.pk]]
+
+
+@pytest.fixture()
+def products(product) -> list[Product]:
+    return [
+        product,
+        *(
+            Product.objects.create(
+                name=f"Product {index}",
+                slug=f"product-{index}",
+                product_type=product.product_type,
+            )
+            for index in range(1, PRODUCTS_COUNT)
+        ),
+    ]
+
+
+def test_mark_products_search_index_dirty_updates_marked_products(products):
+    Product.objects.filter(pk=products[0].pk).update(search_index_dirty=True)
+
+    assert mark_products_search_index_dirty(Product.objects.all()) == len(products)
+
+
+def test_index_dirty_products(products):
+    Product.objects.update(search_index_dirty=False)
+    Product.objects.filter(pk=products[0].pk).update(search_index_dirty=True)
+
+    stats = index_dirty_products(batch_size=len(products) - 1)
+
+    assert stats.indexed == 1
+    assert stats.backlog == 0
+    assert Product.objects.get(pk=products[0].pk).search_document == "product"
+    assert Product.objects.filter(search_document="").count() == len(products) - 1
+
+
+def test_update_products_search_index_full(products):
+    Product.objects.update(search_index_dirty=True)
+
+    call_command(
+        "update_products_search_index",
+        "--full",
+        batch_size=len(products) - 1,
+    )
+
+    assert not Product.objects.filter(search_index_dirty=True).exists()
+    assert not Product.objects.filter(search_document="").exists()
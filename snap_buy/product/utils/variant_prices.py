@@ -0,0 +1,243 @@
+from collections import defaultdict
+from collections.abc import Iterable
+from decimal import ROUND_HALF_UP
+from decimal import Decimal
+from functools import cache
+
+from django.db import transaction
+from django.db.models import Exists
+from django.db.models import F
+from django.db.models import OuterRef
+from django.db.models import Q
+
+from snap_buy.core.taxes import zero_money
+from snap_buy.discount import PromotionType
+from snap_buy.discount import RewardValueType
+from snap_buy.discount.models import Promotion
+from snap_buy.discount.models import PromotionRule
+from snap_buy.discount.models import PromotionRule_Variants
+from snap_buy.product.models import ProductChannelListing
+from snap_buy.product.models import ProductVariantChannelListing
+from snap_buy.product.models import VariantChannelListingPromotionRule
+
+DISCOUNTED_PRICES_BATCH_SIZE = 500
+HUNDRED = Decimal(100)
+
+
+@cache
+def _get_currency_exponent(currency: str) -> Decimal:
+    return zero_money(currency).quantize().amount
+
+
+def get_active_catalogue_rules(channel_id: int) -> list[PromotionRule]:
+    """Return catalogue promotion rules currently active in the given channel."""
+    return list(
+        PromotionRule.objects.filter(
+            ~Q(catalogue_predicate={}),
+            channels__id=channel_id,
+            promotion__in=Promotion.objects.active(),
+            promotion__type=PromotionType.CATALOGUE,
+            reward_value__isnull=False,
+            reward_value_type__in=[RewardValueType.FIXED, RewardValueType.PERCENTAGE],
+        ),
+    )
+
+
+def calculate_rule_discounts(
+    price: Decimal,
+    rules: list[PromotionRule],
+    currency: str,
+) -> list[Decimal]:
+    """Return the discount amount of every rule for the given price.
+
+    The arithmetic matches `calculate_discounted_price_for_rules`: a fixed reward
+    never exceeds the price and a percentage reward is rounded half up to the
+    currency precision.
+    """
+    exponent = _get_currency_exponent(currency)
+    discounts = []
+    for rule in rules:
+        reward_value = rule.reward_value or Decimal(0)
+        if rule.reward_value_type == RewardValueType.FIXED:
+            discount = reward_value
+        else:
+            discount = (price * reward_value / HUNDRED).quantize(
+                exponent,
+                rounding=ROUND_HALF_UP,
+            )
+        discounts.append(min(discount, price))
+    return discounts
+
+
+def mark_discounted_prices_dirty_for_rules(rule_ids: Iterable[str]) -> int:
+    """Mark product channel listings affected by the given rules as dirty."""
+    rule_ids = list(rule_ids)
+    rule_variants = PromotionRule_Variants.objects.filter(
+        promotionrule_id__in=rule_ids,
+        productvariant__product_id=OuterRef("product_id"),
+    )
+    rule_channels = PromotionRule.channels.through.objects.filter(
+        promotionrule_id__in=rule_ids,
+        channel_id=OuterRef("channel_id"),
+    )
+    return ProductChannelListing.objects.filter(
+        Exists(rule_variants),
+        Exists(rule_channels),
+        discounted_price_dirty=False,
+    ).update(discounted_price_dirty=True)
+
+
+def update_discounted_prices_for_products(
+    product_ids: Iterable[int],
+    channel_ids: Iterable[int],
+) -> int:
+    """Recalculate discounted prices of products in the given channels.
+
+    Return the number of updated variant channel listings.
+    """
+    product_ids = list(product_ids)
+    updated = 0
+    for channel_id in set(channel_ids):
+        rules = get_active_catalogue_rules(channel_id)
+        for start in range(0, len(product_ids), DISCOUNTED_PRICES_BATCH_SIZE):
+            updated += _update_discounted_prices_in_channel(
+                product_ids[start : start + DISCOUNTED_PRICES_BATCH_SIZE],
+                channel_id,
+                rules,
+            )
+    return updated
+
+
+def mark_discounted_prices_dirty(
+    product_ids: Iterable[int],
+    channel_ids: Iterable[int],
+) -> int:
+    """Mark product channel listings of the products in the channels as dirty."""
+    return ProductChannelListing.objects.filter(
+        product_id__in=product_ids,
+        channel_id__in=channel_ids,
+    ).update(discounted_price_dirty=True)
+
+
+def update_discounted_prices_for_dirty_listings(
+    batch_size: int = DISCOUNTED_PRICES_BATCH_SIZE,
+) -> int:
+    """Recalculate a batch of product channel listings marked as dirty.
+
+    The listings are locked with `SKIP LOCKED`, so concurrent workers process
+    disjoint batches. Return the number of processed product channel listings.
+    """
+    with transaction.atomic():
+        listings = list(
+            ProductChannelListing.objects.filter(discounted_price_dirty=True)
+            .order_by("pk")
+            .select_for_update(skip_locked=True, of=("self",))
+            .values_list("product_id", "channel_id")[:batch_size],
+        )
+        products_per_channel: dict[int, list[int]] = defaultdict(list)
+        for product_id, channel_id in listings:
+            products_per_channel[channel_id].append(product_id)
+        for channel_id, product_ids in products_per_channel.items():
+            rules = get_active_catalogue_rules(channel_id)
+            _update_discounted_prices_in_channel(product_ids, channel_id, rules)
+    return len(listings)
+
+
+def _update_discounted_prices_in_channel(
+    product_ids: list[int],
+    channel_id: int,
+    rules: list[PromotionRule],
+) -> int:
+    variant_listings = list(
+        ProductVariantChannelListing.objects.filter(
+            variant__product_id__in=product_ids,
+            channel_id=channel_id,
+        )
+        .annotate(product_id=F("variant__product_id"))
+        .only(
+            "id",
+            "variant_id",
+            "price_amount",
+            "currency",
+            "discounted_price_amount",
+        ),
+    )
+    variant_ids = [listing.variant_id for listing in variant_listings]
+    rules_by_id = {str(rule.pk): rule for rule in rules}
+    variant_rules: dict[int, list[PromotionRule]] = defaultdict(list)
+    for rule_id, variant_id in PromotionRule_Variants.objects.filter(
+        promotionrule_id__in=list(rules_by_id),
+        productvariant_id__in=variant_ids,
+    ).values_list("promotionrule_id", "productvariant_id"):
+        variant_rules[variant_id].append(rules_by_id[str(rule_id)])
+
+    min_prices: dict[int, Decimal | None] = dict.fromkeys(product_ids)
+    listing_rules: list[VariantChannelListingPromotionRule] = []
+    for listing in variant_listings:
+        price = listing.price_amount
+        if price is None:
+            listing.discounted_price_amount = None
+            continue
+        applicable_rules = variant_rules.get(listing.variant_id, [])
+        discounts = calculate_rule_discounts(price, applicable_rules, listing.currency)
+        listing.discounted_price_amount = max(price - sum(discounts), Decimal(0))
+        listing_rules.extend(
+            VariantChannelListingPromotionRule(
+                variant_channel_listing_id=listing.pk,
+                promotion_rule_id=rule.pk,
+                discount_amount=discount,
+                currency=listing.currency,
+            )
+            for rule, discount in zip(applicable_rules, discounts, strict=True)
+        )
+        current_min = min_prices[listing.product_id]
+        if current_min is None or listing.discounted_price_amount < current_min:
+            min_prices[listing.product_id] = listing.discounted_price_amount
+
+    with transaction.atomic():
+        ProductVariantChannelListing.objects.bulk_update(
+            variant_listings,
+            ["discounted_price_amount"],
+        )
+        _update_variant_listing_promotion_rules(variant_listings, listing_rules)
+        product_listings = list(
+            ProductChannelListing.objects.filter(
+                product_id__in=product_ids,
+                channel_id=channel_id,
+            ).only("id", "product_id"),
+        )
+        for product_listing in product_listings:
+            product_listing.discounted_price_amount = min_prices.get(
+                product_listing.product_id,
+            )
+            product_listing.discounted_price_dirty = False
+        ProductChannelListing.objects.bulk_update(
+            product_listings,
+            ["discounted_price_amount", "discounted_price_dirty"],
+        )
+    return len(variant_listings)
+
+
+def _update_variant_listing_promotion_rules(
+    variant_listings: list[ProductVariantChannelListing],
+    listing_rules: list[VariantChannelListingPromotionRule],
+):
+    applied = {
+        (listing_rule.variant_channel_listing_id, str(listing_rule.promotion_rule_id))
+        for listing_rule in listing_rules
+    }
+    stale_ids = [
+        pk
+        for pk, listing_id, rule_id in VariantChannelListingPromotionRule.objects.filter(
+            variant_channel_listing_id__in=[listing.pk for listing in variant_listings],
+        ).values_list("pk", "variant_channel_listing_id", "promotion_rule_id")
+        if (listing_id, str(rule_id)) not in applied
+    ]
+    if stale_ids:
+        VariantChannelListingPromotionRule.objects.filter(pk__in=stale_ids).delete()
+    VariantChannelListingPromotionRule.objects.bulk_create(
+        listing_rules,
+        update_conflicts=True,
+        unique_fields=["variant_channel_listing", "promotion_rule"],
+        update_fields=["discount_amount", "currency"],
+    )
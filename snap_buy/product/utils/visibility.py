@@ -0,0 +1,124 @@
+from collections.abc import Iterable
+
+from django.db import transaction
+from django.db.models import Exists
+from django.db.models import OuterRef
+from django.utils import timezone
+
+from snap_buy.product.models import ProductChannelListing
+from snap_buy.product.models import ProductVariantChannelListing
+from snap_buy.product.models import ProductVisibility
+
+VISIBILITY_BATCH_SIZE = 1000
+
+
+def update_products_visibility(
+    product_ids: Iterable[int],
+    channel_ids: Iterable[int] | None = None,
+) -> int:
+    """Recalculate `ProductVisibility` rows for the given products.
+
+    The rows are rebuilt from the product and variant channel listings and written
+    with a single upsert per batch. Rows for listings that no longer exist are removed.
+    Return the number of rows written.
+    """
+    product_ids = list(product_ids)
+    if channel_ids is not None:
+        channel_ids = list(channel_ids)
+    updated = 0
+    for start in range(0, len(product_ids), VISIBILITY_BATCH_SIZE):
+        updated += _update_products_visibility_batch(
+            product_ids[start : start + VISIBILITY_BATCH_SIZE],
+            channel_ids,
+        )
+    return updated
+
+
+def _update_products_visibility_batch(
+    product_ids: list[int],
+    channel_ids: list[int] | None,
+) -> int:
+    listings = ProductChannelListing.objects.filter(product_id__in=product_ids)
+    visibility = ProductVisibility.objects.filter(product_id__in=product_ids)
+    if channel_ids is not None:
+        listings = listings.filter(channel_id__in=channel_ids)
+        visibility = visibility.filter(channel_id__in=channel_ids)
+
+    priced_variant_listings = ProductVariantChannelListing.objects.filter(
+        variant__product_id=OuterRef("product_id"),
+        channel_id=OuterRef("channel_id"),
+        price_amount__isnull=False,
+    )
+    listings_data = listings.annotate(
+        has_priced_variant=Exists(priced_variant_listings),
+    ).values_list(
+        "product_id",
+        "channel_id",
+        "is_published",
+        "published_at",
+        "visible_in_listings",
+        "has_priced_variant",
+    )
+
+    now = timezone.now()
+    rows = [
+        ProductVisibility(
+            product_id=product_id,
+            channel_id=channel_id,
+            is_published=is_published and (published_at is None or published_at <= now),
+            published_from=published_at if is_published else None,
+            visible_in_listings=visible_in_listings,
+            has_priced_variant=has_priced_variant,
+        )
+        for (
+            product_id,
+            channel_id,
+            is_published,
+            published_at,
+            visible_in_listings,
+            has_priced_variant,
+        ) in listings_data
+    ]
+
+    existing_listings = ProductChannelListing.objects.filter(
+        product_id=OuterRef("product_id"),
+        channel_id=OuterRef("channel_id"),
+    )
+    with transaction.atomic():
+        visibility.exclude(Exists(existing_listings)).delete()
+        ProductVisibility.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["product", "channel"],
+            update_fields=[
+                "is_published",
+                "published_from",
+                "visible_in_listings",
+                "has_priced_variant",
+                "updated_at",
+            ],
+        )
+    return len(rows)
+
+
+def get_products_with_passed_publication_date():
+    """Return ids of products whose scheduled publication date has passed."""
+    return (
+        ProductVisibility.objects.filter(
+            is_published=False,
+            published_from__lte=timezone.now(),
+        )
+        .values_list("product_id", flat=True)
+        .distinct()
+    )
+
+
+def schedule_products_visibility_update(product_ids: Iterable[int]):
+    """Queue a visibility update of the products once the transaction commits."""
+    from snap_buy.product.tasks import update_products_visibility_task
+
+    product_ids = sorted(set(product_ids))
+    if product_ids:
+        transaction.on_commit(
+            lambda: update_products_visibility_task.delay(product_ids),
+        )
@@ -8,3 +8,21 @@ class WarehouseClickAndCollectOption:
         (LOCAL_STOCK, "Local stock only"),
         (ALL_WAREHOUSES, "All warehouses"),
     ]
+
+
+class StockMovementType:
+    RECEIVE = "receive"
+    ALLOCATE = "allocate"
+    DEALLOCATE = "deallocate"
+    FULFIL = "fulfil"
+    RETURN = "return"
+    ADJUST = "adjust"
+
+    CHOICES = [
+        (RECEIVE, "Received"),
+        (ALLOCATE, "Allocated"),
+        (DEALLOCATE, "Deallocated"),
+        (FULFIL, "Fulfilled"),
+        (RETURN, "Returned"),
+        (ADJUST, "Adjusted"),
+    ]
@@ -2,8 +2,14 @@ from django.contrib import admin
 
 from .models import Allocation
 from .models import ChannelWarehouse
+from .models import PreorderAllocation
+from .models import ProductVariantStockSummary
+from .models import Reservation
 from .models import Stock
+from .models import StockMovement
+from .models import StockSnapshot
 from .models import Warehouse
+from .models import WarehouseRoute
 
 
 @admin.register(ChannelWarehouse)
@@ -32,6 +38,12 @@ class WarehouseAdmin(admin.ModelAdmin):
     prepopulated_fields = {"slug": ["name"]}
 
 
+@admin.register(WarehouseRoute)
+class WarehouseRouteAdmin(admin.ModelAdmin):
+    list_display = ("id", "channel", "country", "warehouse")
+    list_filter = ("channel", "country", "warehouse")
+
+
 @admin.register(Stock)
 class StockAdmin(admin.ModelAdmin):
     list_display = (
@@ -48,3 +60,60 @@ class StockAdmin(admin.ModelAdmin):
 class AllocationAdmin(admin.ModelAdmin):
     list_display = ("id", "order_line", "stock", "quantity_allocated")
     list_filter = ("order_line", "stock")
+
+
+@admin.register(ProductVariantStockSummary)
+class ProductVariantStockSummaryAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "product_variant",
+        "quantity",
+        "quantity_allocated",
+        "updated_at",
+    )
+    list_filter = ("updated_at",)
+
+
+@admin.register(PreorderAllocation)
+class PreorderAllocationAdmin(admin.ModelAdmin):
+    list_display = ("id", "order_line", "product_variant_channel_listing", "quantity")
+    list_filter = ("product_variant_channel_listing",)
+
+
+@admin.register(Reservation)
+class ReservationAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "checkout_line",
+        "stock",
+        "quantity_reserved",
+        "reserved_until",
+    )
+    list_filter = ("stock", "reserved_until")
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "stock",
+        "warehouse",
+        "type",
+        "quantity",
+        "quantity_allocated",
+        "created_at",
+    )
+    list_filter = ("type", "warehouse", "created_at")
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "warehouse",
+        "stock",
+        "quantity",
+        "quantity_allocated",
+        "taken_at",
+    )
+    list_filter = ("warehouse", "taken_at")
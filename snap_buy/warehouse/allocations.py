@@ -0,0 +1,362 @@
+from collections import defaultdict
+from collections.abc import Iterable
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+from typing import cast
+
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import F
+from django.db.models import IntegerField
+from django.db.models import OuterRef
+from django.db.models import Subquery
+from django.db.models import Sum
+from django.db.models import Value
+from django.db.models import When
+from django.db.models.functions import Coalesce
+
+from snap_buy.channel import AllocationStrategy
+from snap_buy.order.models import OrderLine
+
+from . import StockMovementType
+from . import WarehouseClickAndCollectOption
+from .ledger import StockMovementEntry
+from .ledger import record_stock_movements
+from .managers import StockQuerySet
+from .models import Allocation
+from .models import ChannelWarehouse
+from .models import Stock
+from .stock_summary import adjust_variant_stock_summaries
+from .stock_summary import reconcile_variant_stock_summaries
+
+if TYPE_CHECKING:
+    from uuid import UUID
+
+    from snap_buy.checkout.models import CheckoutLine
+    from snap_buy.order.models import Order
+
+STOCKS_BATCH_SIZE = 1000
+
+
+def _delta_case(deltas: Mapping, field: str = "pk") -> Case:
+    return Case(
+        *[When(**{field: key}, then=Value(delta)) for key, delta in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def adjust_stocks_allocated_quantity(
+    stock_deltas: Mapping[int, int],
+    *,
+    rebuild_missing_summaries: bool = True,
+):
+    """Change `Stock.quantity_allocated` of stocks by the given deltas.
+
+    The stocks are locked in pk order and updated with a single statement, and
+    the variant stock summaries are adjusted in the same transaction.
+    """
+    stock_deltas = {pk: delta for pk, delta in stock_deltas.items() if delta}
+    if not stock_deltas:
+        return
+    with transaction.atomic():
+        stock_variants = dict(
+            Stock.objects.filter(pk__in=list(stock_deltas))
+            .order_by("pk")
+            .select_for_update(of=("self",))
+            .values_list("pk", "product_variant_id"),
+        )
+        _apply_stocks_allocated_quantity(
+            {pk: delta for pk, delta in stock_deltas.items() if pk in stock_variants},
+            stock_variants,
+            rebuild_missing_summaries=rebuild_missing_summaries,
+        )
+
+
+def _apply_stocks_allocated_quantity(
+    stock_deltas: Mapping[int, int],
+    stock_variants: Mapping[int, int],
+    *,
+    rebuild_missing_summaries: bool = True,
+):
+    """Update the counters of stocks which are already locked by the caller.
+
+    `stock_variants` maps the locked stocks to their variants and may include
+    stocks which don't change.
+    """
+    Stock.objects.filter(pk__in=list(stock_deltas)).update(
+        quantity_allocated=F("quantity_allocated") + _delta_case(stock_deltas),
+    )
+    variant_deltas: dict[int, int] = defaultdict(int)
+    for stock_id, delta in stock_deltas.items():
+        variant_deltas[stock_variants[stock_id]] += delta
+    adjust_variant_stock_summaries(
+        {variant_id: (0, delta) for variant_id, delta in variant_deltas.items()},
+        rebuild_missing=rebuild_missing_summaries,
+    )
+    record_stock_movements(
+        StockMovementEntry(
+            stock_id,
+            StockMovementType.ALLOCATE if delta > 0 else StockMovementType.DEALLOCATE,
+            quantity_allocated=delta,
+        )
+        for stock_id, delta in stock_deltas.items()
+    )
+
+
+def create_allocations(allocations: Iterable[Allocation]) -> list[Allocation]:
+    """Create allocations and count them in the allocated quantity of stocks."""
+    allocations = list(allocations)
+    stock_deltas: dict[int, int] = defaultdict(int)
+    for allocation in allocations:
+        stock_deltas[allocation.stock_id] += allocation.quantity_allocated
+    with transaction.atomic():
+        adjust_stocks_allocated_quantity(stock_deltas)
+        return Allocation.objects.bulk_create(allocations)
+
+
+def change_allocations_quantity(allocation_deltas: Mapping[int, int]):
+    """Change the allocated quantity of allocations by the given deltas."""
+    allocation_deltas = {pk: delta for pk, delta in allocation_deltas.items() if delta}
+    if not allocation_deltas:
+        return
+    stock_deltas: dict[int, int] = defaultdict(int)
+    with transaction.atomic():
+        for pk, stock_id in Allocation.objects.filter(
+            pk__in=list(allocation_deltas),
+        ).values_list("pk", "stock_id"):
+            stock_deltas[stock_id] += allocation_deltas[pk]
+        adjust_stocks_allocated_quantity(stock_deltas)
+        Allocation.objects.filter(pk__in=list(allocation_deltas)).update(
+            quantity_allocated=F("quantity_allocated") + _delta_case(allocation_deltas),
+        )
+
+
+def delete_allocations(allocation_ids: Iterable[int]):
+    """Delete allocations and release their quantity from stocks."""
+    allocations = Allocation.objects.filter(pk__in=list(allocation_ids))
+    stock_deltas: dict[int, int] = defaultdict(int)
+    with transaction.atomic():
+        for stock_id, quantity_allocated in allocations.values_list(
+            "stock_id",
+            "quantity_allocated",
+        ):
+            stock_deltas[stock_id] -= quantity_allocated
+        adjust_stocks_allocated_quantity(stock_deltas)
+        # Deleting a single allocation releases the quantity it still holds in
+        # a signal handler; the quantity is released above already.
+        allocations.update(quantity_allocated=0)
+        allocations.delete()
+
+
+def _allocations_sum():
+    return Coalesce(
+        Subquery(
+            Allocation.objects.filter(stock_id=OuterRef("pk"))
+            .order_by()
+            .values("stock_id")
+            .annotate(total=Sum("quantity_allocated"))
+            .values("total"),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def get_stocks_with_allocated_quantity_drift(stock_ids: Iterable[int]):
+    """Return stocks whose `quantity_allocated` differs from their allocations."""
+    return (
+        Stock.objects.filter(pk__in=list(stock_ids))
+        .annotate(allocations_quantity=_allocations_sum())
+        .exclude(quantity_allocated=F("allocations_quantity"))
+        .values_list("pk", "product_variant_id", "allocations_quantity")
+    )
+
+
+def fix_stocks_allocated_quantity(stock_ids: Iterable[int]) -> int:
+    """Set `quantity_allocated` of stocks to the sum of their allocations."""
+    stock_ids = list(stock_ids)
+    with transaction.atomic():
+        locked_stocks = (
+            Stock.objects.filter(pk__in=stock_ids)
+            .order_by("pk")
+            .select_for_update(of=("self",))
+        )
+        variant_ids = set(locked_stocks.values_list("product_variant_id", flat=True))
+        updated = Stock.objects.filter(pk__in=stock_ids).update(
+            quantity_allocated=_allocations_sum(),
+        )
+        reconcile_variant_stock_summaries(variant_ids)
+    return updated
+
+
+class InsufficientStockError(Exception):
+    """Exception raised when lines can't be covered by available stocks.
+
+    The lines which lack stock are available as the `lines` attribute.
+    """
+
+    def __init__(self, lines: list["OrderLine | CheckoutLine"]):
+        super().__init__("Insufficient stock for lines.")
+        self.lines = lines
+
+
+@dataclass
+class StockCandidate:
+    pk: int
+    variant_id: int
+    available: int
+    sort_order: int | None
+
+
+def _get_candidate_stocks(order: "Order") -> StockQuerySet:
+    collection_point = order.collection_point
+    if collection_point is None:
+        country_code = (
+            order.shipping_address.country.code if order.shipping_address else None
+        )
+        return Stock.objects.for_channel_and_country(order.channel.slug, country_code)
+    if (
+        collection_point.click_and_collect_option
+        == WarehouseClickAndCollectOption.LOCAL_STOCK
+    ):
+        return Stock.objects.filter(warehouse_id=collection_point.pk)
+    return Stock.objects.for_channel_and_click_and_collect(order.channel.slug)
+
+
+def _sort_candidates(
+    candidates: list[StockCandidate],
+    allocation_strategy: str,
+) -> list[StockCandidate]:
+    if allocation_strategy == AllocationStrategy.PRIORITIZE_HIGH_STOCK:
+        return sorted(candidates, key=lambda stock: (-stock.available, stock.pk))
+    return sorted(
+        candidates,
+        key=lambda stock: (stock.sort_order is None, stock.sort_order or 0, stock.pk),
+    )
+
+
+def lock_stock_candidates(
+    stocks: StockQuerySet,
+    variant_ids: Iterable[int],
+    channel_id: int,
+    exclude_checkout_line_ids: Iterable["UUID"] | None = None,
+) -> dict[int, list[StockCandidate]]:
+    """Lock stocks of the variants and return them grouped by variant.
+
+    The stocks are locked with a single `SELECT ... FOR UPDATE` in pk order, so
+    concurrent callers on the same variants queue up instead of deadlocking.
+    """
+    channel_warehouses = ChannelWarehouse.objects.filter(
+        channel_id=channel_id,
+        warehouse_id=OuterRef("warehouse_id"),
+    )
+    locked_stocks = (
+        stocks.filter(product_variant_id__in=set(variant_ids))
+        .annotate_available_quantity(exclude_checkout_line_ids)
+        .annotate(sort_order=Subquery(channel_warehouses.values("sort_order")[:1]))
+        .order_by("pk")
+        .select_for_update(of=("self",))
+        .values_list("pk", "product_variant_id", "available_quantity", "sort_order")
+    )
+    candidates: dict[int, list[StockCandidate]] = defaultdict(list)
+    for pk, variant_id, available_quantity, sort_order in locked_stocks:
+        candidates[variant_id].append(
+            StockCandidate(
+                pk=pk,
+                variant_id=variant_id,
+                available=available_quantity,
+                sort_order=sort_order,
+            ),
+        )
+    return candidates
+
+
+def split_lines_quantity(
+    lines: Iterable["OrderLine | CheckoutLine"],
+    candidates: dict[int, list[StockCandidate]],
+    allocation_strategy: str,
+) -> dict[tuple["UUID", int], int]:
+    """Split quantities of lines across the candidate stocks.
+
+    Return quantities keyed by line and stock ids. Raise `InsufficientStockError`
+    when any line can't be covered.
+    """
+    split: dict[tuple[UUID, int], int] = defaultdict(int)
+    insufficient = []
+    for line in lines:
+        remaining = line.quantity
+        variant_candidates = candidates[line.variant_id] if line.variant_id else []
+        for stock in _sort_candidates(variant_candidates, allocation_strategy):
+            quantity = min(stock.available, remaining)
+            if quantity <= 0:
+                continue
+            stock.available -= quantity
+            remaining -= quantity
+            split[line.pk, stock.pk] += quantity
+            if not remaining:
+                break
+        if remaining:
+            insufficient.append(line)
+    if insufficient:
+        raise InsufficientStockError(insufficient)
+    return split
+
+
+def allocate_stocks(
+    order: "Order",
+    lines: Iterable[OrderLine] | None = None,
+) -> list[Allocation]:
+    """Allocate stocks for order lines according to the channel allocation strategy.
+
+    Candidate stocks are locked with `lock_stock_candidates`, line quantities are
+    split across warehouses and the allocations are created with a single INSERT.
+    Lines of variants which don't track inventory or are in preorder are skipped.
+    Stock reserved for checkouts is not allocated, so reservations of the completed
+    checkout have to be released first.
+
+    Raise `InsufficientStockError` when any line can't be fully allocated.
+    """
+    if lines is None:
+        lines = order.lines.select_related("variant")
+    lines_to_allocate = [
+        line
+        for line in lines
+        if line.variant
+        and line.variant.track_inventory
+        and not line.variant.is_preorder_active()
+    ]
+    if not lines_to_allocate:
+        return []
+
+    with transaction.atomic():
+        candidates = lock_stock_candidates(
+            _get_candidate_stocks(order),
+            [cast(int, line.variant_id) for line in lines_to_allocate],
+            order.channel_id,
+        )
+        stock_variants = {
+            stock.pk: stock.variant_id
+            for variant_candidates in candidates.values()
+            for stock in variant_candidates
+        }
+        allocated = split_lines_quantity(
+            lines_to_allocate,
+            candidates,
+            order.channel.allocation_strategy,
+        )
+
+        stock_deltas: dict[int, int] = defaultdict(int)
+        allocations = []
+        for (line_id, stock_id), quantity in allocated.items():
+            stock_deltas[stock_id] += quantity
+            allocations.append(
+                Allocation(
+                    order_line_id=line_id,
+                    stock_id=stock_id,
+                    quantity_allocated=quantity,
+                ),
+            )
+        _apply_stocks_allocated_quantity(stock_deltas, stock_variants)
+        return Allocation.objects.bulk_create(allocations)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class WarehouseConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "snap_buy.warehouse"
+
+    def ready(self):
+        import snap_buy.warehouse.signals  # noqa: F401
@@ -0,0 +1,130 @@
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+from uuid import UUID
+
+from django.db import connection
+
+from . import WarehouseClickAndCollectOption
+
+# Lines of variants in an active preorder don't need stock, so they are left out
+# of the availability check. Warehouses are returned even when no line needs
+# stock, as with a cart of preorder variants only.
+CLICK_AND_COLLECT_WAREHOUSES_SQL = """
+WITH cart AS (
+    SELECT line.variant_id, SUM(line.quantity) AS quantity
+    FROM unnest(%(variant_ids)s::bigint[], %(quantities)s::integer[])
+        AS line(variant_id, quantity)
+    GROUP BY line.variant_id
+),
+stock_cart AS (
+    SELECT cart.variant_id, cart.quantity
+    FROM cart
+    JOIN product_productvariant variant ON variant.id = cart.variant_id
+    WHERE NOT (
+        variant.is_preorder
+        AND (variant.preorder_end_date IS NULL OR variant.preorder_end_date >= now())
+    )
+)
+SELECT
+    warehouse.id,
+    warehouse.click_and_collect_option,
+    COALESCE(
+        array_agg(stock_cart.variant_id ORDER BY stock_cart.variant_id)
+            FILTER (WHERE stock_cart.variant_id IS NOT NULL),
+        '{}'
+    ),
+    COALESCE(
+        array_agg(
+            COALESCE(stock.quantity - stock.quantity_allocated - reserved.quantity, 0)
+            ORDER BY stock_cart.variant_id
+        ) FILTER (WHERE stock_cart.variant_id IS NOT NULL),
+        '{}'
+    ),
+    COALESCE(
+        bool_and(
+            COALESCE(stock.quantity - stock.quantity_allocated - reserved.quantity, 0)
+            >= stock_cart.quantity
+        ),
+        TRUE
+    )
+FROM warehouse_warehouse warehouse
+JOIN warehouse_channelwarehouse channel_warehouse
+    ON channel_warehouse.warehouse_id = warehouse.id
+    AND channel_warehouse.channel_id = %(channel_id)s
+LEFT JOIN stock_cart ON TRUE
+LEFT JOIN warehouse_stock stock
+    ON stock.warehouse_id = warehouse.id
+    AND stock.product_variant_id = stock_cart.variant_id
+LEFT JOIN LATERAL (
+    SELECT COALESCE(SUM(reservation.quantity_reserved), 0) AS quantity
+    FROM warehouse_reservation reservation
+    WHERE reservation.stock_id = stock.id
+        AND reservation.reserved_until > now()
+        AND NOT reservation.checkout_line_id = ANY(%(checkout_line_ids)s::uuid[])
+) reserved ON TRUE
+WHERE warehouse.click_and_collect_option = ANY(%(options)s)
+GROUP BY warehouse.id, warehouse.click_and_collect_option, channel_warehouse.sort_order
+ORDER BY channel_warehouse.sort_order NULLS LAST, warehouse.id
+"""
+
+
+@dataclass
+class ClickAndCollectWarehouse:
+    warehouse_id: UUID
+    click_and_collect_option: str
+    # Available quantity in the warehouse per variant of the cart.
+    available_quantities: dict[int, int]
+    has_local_stock: bool
+
+    @property
+    def is_applicable(self) -> bool:
+        """Return whether the warehouse can be selected as the collection point.
+
+        Warehouses collecting stock from all warehouses are always applicable;
+        the stock is checked again when the checkout is completed.
+        """
+        if self.click_and_collect_option == WarehouseClickAndCollectOption.LOCAL_STOCK:
+            return self.has_local_stock
+        return True
+
+
+def resolve_click_and_collect_warehouses(
+    channel_id: int,
+    lines: Iterable[tuple[int, int]],
+    checkout_line_ids: Iterable[UUID] = (),
+) -> list[ClickAndCollectWarehouse]:
+    """Return click and collect warehouses of the channel for the given cart.
+
+    `lines` are `(variant_id, quantity)` pairs. Every warehouse comes with the
+    available quantity of each variant and whether it can serve the whole cart
+    from its own stock. Stock reserved for other checkouts is not available;
+    reservations of `checkout_line_ids` are. All of it is resolved with a single
+    SQL statement.
+    """
+    quantities: dict[int, int] = defaultdict(int)
+    for variant_id, quantity in lines:
+        quantities[variant_id] += quantity
+    params: dict[str, Any] = {
+        "variant_ids": list(quantities),
+        "quantities": list(quantities.values()),
+        "channel_id": channel_id,
+        "checkout_line_ids": list(checkout_line_ids),
+        "options": [
+            WarehouseClickAndCollectOption.LOCAL_STOCK,
+            WarehouseClickAndCollectOption.ALL_WAREHOUSES,
+        ],
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(CLICK_AND_COLLECT_WAREHOUSES_SQL, params)
+        rows = cursor.fetchall()
+    return [
+        ClickAndCollectWarehouse(
+            warehouse_id=warehouse_id,
+            click_and_collect_option=option,
+            available_quantities=dict(zip(variant_ids, available, strict=True)),
+            has_local_stock=has_local_stock,
+        )
+        for warehouse_id, option, variant_ids, available, has_local_stock in rows
+    ]
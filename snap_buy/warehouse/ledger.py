@@ -0,0 +1,218 @@
+import datetime
+from collections.abc import Iterable
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import connection
+from django.db import transaction
+from django.db.models import Exists
+from django.db.models import Max
+from django.db.models import OuterRef
+from django.db.models import Q
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Stock
+from .models import StockMovement
+from .models import StockSnapshot
+
+if TYPE_CHECKING:
+    from uuid import UUID
+
+STOCK_MOVEMENT_PARTITIONS_AHEAD = 2
+
+# The warehouse is looked up from the stock, so callers only need stock ids.
+# `clock_timestamp()` rather than `now()` dates a movement after the stock row
+# was locked, which keeps it consistent with snapshots taken concurrently.
+RECORD_STOCK_MOVEMENTS_SQL = """
+INSERT INTO warehouse_stockmovement
+    (stock_id, warehouse_id, type, quantity, quantity_allocated, created_at)
+SELECT
+    stock.id,
+    stock.warehouse_id,
+    movement.type,
+    movement.quantity,
+    movement.quantity_allocated,
+    clock_timestamp()
+FROM unnest(
+    %(stock_ids)s::bigint[],
+    %(types)s::varchar[],
+    %(quantities)s::integer[],
+    %(quantities_allocated)s::integer[]
+) AS movement(stock_id, type, quantity, quantity_allocated)
+JOIN warehouse_stock stock ON stock.id = movement.stock_id
+"""
+
+# `clock_timestamp()` is read once the statement runs, after its snapshot of the
+# stocks is taken, so movements of every stock in the snapshot are dated before it.
+TAKE_STOCK_SNAPSHOT_SQL = """
+WITH snapshot AS MATERIALIZED (SELECT clock_timestamp() AS taken_at),
+inserted AS (
+    INSERT INTO warehouse_stocksnapshot
+        (warehouse_id, stock_id, quantity, quantity_allocated, taken_at)
+    SELECT
+        stock.warehouse_id,
+        stock.id,
+        stock.quantity,
+        stock.quantity_allocated,
+        snapshot.taken_at
+    FROM warehouse_stock stock, snapshot
+    WHERE stock.warehouse_id = %(warehouse_id)s
+)
+SELECT taken_at FROM snapshot
+"""
+
+CREATE_STOCK_MOVEMENT_PARTITION_SQL = """
+CREATE TABLE IF NOT EXISTS {name} PARTITION OF warehouse_stockmovement
+FOR VALUES FROM (%(start)s) TO (%(end)s)
+"""
+
+
+class StockMovementEntry(NamedTuple):
+    stock_id: int
+    type: str
+    quantity: int = 0
+    quantity_allocated: int = 0
+
+
+def record_stock_movements(movements: Iterable[StockMovementEntry]):
+    """Append movements to the ledger with a single statement.
+
+    Call it in the transaction that changes the stocks, after the change.
+    """
+    movements = [
+        movement
+        for movement in movements
+        if movement.quantity or movement.quantity_allocated
+    ]
+    if not movements:
+        return
+    params: dict[str, Any] = {
+        "stock_ids": [movement.stock_id for movement in movements],
+        "types": [movement.type for movement in movements],
+        "quantities": [movement.quantity for movement in movements],
+        "quantities_allocated": [movement.quantity_allocated for movement in movements],
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(RECORD_STOCK_MOVEMENTS_SQL, params)
+
+
+def _add_months(date: datetime.date, months: int) -> datetime.date:
+    year, month = divmod(date.month - 1 + months, 12)
+    return date.replace(year=date.year + year, month=month + 1, day=1)
+
+
+def create_stock_movement_partitions(
+    months_ahead: int = STOCK_MOVEMENT_PARTITIONS_AHEAD,
+) -> list[str]:
+    """Create monthly ledger partitions up to `months_ahead` from now.
+
+    Movements outside of the monthly partitions land in the default partition,
+    so partitions have to be created before their month starts.
+    """
+    current_month = timezone.now().date().replace(day=1)
+    names = []
+    with connection.cursor() as cursor:
+        for offset in range(months_ahead + 1):
+            start = _add_months(current_month, offset)
+            name = f"warehouse_stockmovement_{start:%Y_%m}"
+            cursor.execute(
+                CREATE_STOCK_MOVEMENT_PARTITION_SQL.format(name=name),
+                {"start": start, "end": _add_months(start, 1)},
+            )
+            names.append(name)
+    return names
+
+
+def take_stock_snapshot(warehouse_id: "UUID") -> datetime.datetime:
+    """Snapshot the quantities of all stocks of the warehouse.
+
+    The stocks are locked first, so changes in flight are either in the snapshot
+    or dated after it in the ledger. Stocks created concurrently may be missing
+    from the snapshot; `get_stock_quantities_at` replays all of their movements.
+    """
+    with transaction.atomic():
+        list(
+            Stock.objects.filter(warehouse_id=warehouse_id)
+            .order_by("pk")
+            .select_for_update(no_key=True, of=("self",))
+            .values_list("pk", flat=True),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(TAKE_STOCK_SNAPSHOT_SQL, {"warehouse_id": warehouse_id})
+            [taken_at] = cursor.fetchone()
+    return taken_at
+
+
+def prune_stock_snapshots(retention: datetime.timedelta | None = None) -> int:
+    """Delete snapshots taken before the retention period.
+
+    Snapshots are deleted only from warehouses with a newer snapshot, which the
+    quantities at later times are based on. Return the number of deleted rows.
+    """
+    retention = retention or settings.STOCK_SNAPSHOTS_RETENTION
+    cutoff = timezone.now() - retention
+    newer_snapshots = StockSnapshot.objects.filter(
+        warehouse_id=OuterRef("warehouse_id"),
+        taken_at__gte=cutoff,
+    )
+    deleted, _ = StockSnapshot.objects.filter(
+        Exists(newer_snapshots),
+        taken_at__lt=cutoff,
+    ).delete()
+    return deleted
+
+
+def get_stock_quantities_at(
+    warehouse_id: "UUID",
+    at: datetime.datetime,
+) -> dict[int, tuple[int, int]]:
+    """Return `(quantity, quantity_allocated)` of the warehouse stocks at `at`.
+
+    The latest snapshot taken before `at` is the base and only the movements
+    recorded since then are replayed on top of it. Stocks missing from the
+    snapshot have all their movements replayed.
+    """
+    taken_at = StockSnapshot.objects.filter(
+        warehouse_id=warehouse_id,
+        taken_at__lte=at,
+    ).aggregate(taken_at=Max("taken_at"))["taken_at"]
+    quantities: dict[int, tuple[int, int]] = {}
+    movements = StockMovement.objects.filter(
+        warehouse_id=warehouse_id,
+        created_at__lte=at,
+    )
+    if taken_at is not None:
+        snapshots = StockSnapshot.objects.filter(
+            warehouse_id=warehouse_id,
+            taken_at=taken_at,
+        )
+        quantities = {
+            stock_id: (quantity, quantity_allocated)
+            for stock_id, quantity, quantity_allocated in snapshots.values_list(
+                "stock_id",
+                "quantity",
+                "quantity_allocated",
+            )
+        }
+        movements = movements.filter(
+            Q(created_at__gt=taken_at)
+            | ~Exists(snapshots.filter(stock_id=OuterRef("stock_id"))),
+        )
+    for stock_id, quantity, quantity_allocated in (
+        movements.order_by()
+        .values("stock_id")
+        .annotate(
+            quantity_total=Sum("quantity"),
+            quantity_allocated_total=Sum("quantity_allocated"),
+        )
+        .values_list("stock_id", "quantity_total", "quantity_allocated_total")
+    ):
+        base_quantity, base_allocated = quantities.get(stock_id, (0, 0))
+        quantities[stock_id] = (
+            base_quantity + quantity,
+            base_allocated + quantity_allocated,
+        )
+    return quantities
@@ -0,0 +1,101 @@
+import csv
+import json
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from snap_buy.warehouse import StockMovementType
+from snap_buy.warehouse.models import Warehouse
+from snap_buy.warehouse.stock_adjustments import STOCK_ADJUSTMENTS_CHUNK_SIZE
+from snap_buy.warehouse.stock_adjustments import StockAdjustment
+from snap_buy.warehouse.stock_adjustments import adjust_stocks
+
+CSV = "csv"
+JSONL = "jsonl"
+DELTA = "delta"
+ABSOLUTE = "absolute"
+
+
+class Command(BaseCommand):
+    help = (
+        "Adjust stocks from a CSV or JSONL file with `warehouse`, `sku` or "
+        "`variant_id`, `quantity` and an optional `mode` (delta or absolute)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path of the file, `-` for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=[CSV, JSONL],
+            help="File format, guessed from the file extension by default.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=STOCK_ADJUSTMENTS_CHUNK_SIZE,
+            help="Number of adjustments applied per statement.",
+        )
+        parser.add_argument(
+            "--movement-type",
+            choices=[StockMovementType.ADJUST, StockMovementType.RECEIVE],
+            default=StockMovementType.ADJUST,
+            help="Type of the stock movements recorded in the ledger.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or (JSONL if path.endswith(".jsonl") else CSV)
+        # Warehouses are referenced by slug or id.
+        self.warehouses = {}
+        for pk, slug in Warehouse.objects.values_list("pk", "slug"):
+            self.warehouses[str(pk)] = pk
+            self.warehouses[slug] = pk
+
+        if path == "-":
+            result = adjust_stocks(
+                self._read_adjustments(sys.stdin, file_format),
+                options["chunk_size"],
+                options["movement_type"],
+            )
+        else:
+            with Path(path).open(newline="") as f:
+                result = adjust_stocks(
+                    self._read_adjustments(f, file_format),
+                    options["chunk_size"],
+                    options["movement_type"],
+                )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Updated {result.updated} and created {result.created} stocks, "
+                f"skipped {result.skipped} adjustments.",
+            ),
+        )
+
+    def _read_adjustments(self, f, file_format):
+        rows = csv.DictReader(f) if file_format == CSV else map(json.loads, f)
+        for line_number, row in enumerate(rows, start=1):
+            try:
+                yield self._parse_row(row)
+            except (KeyError, TypeError, ValueError) as e:
+                msg = f"Invalid adjustment in row {line_number}: {e}."
+                raise CommandError(msg) from e
+
+    def _parse_row(self, row) -> StockAdjustment:
+        mode = row.get("mode") or DELTA
+        if mode not in (DELTA, ABSOLUTE):
+            msg = f"unknown mode {mode}"
+            raise ValueError(msg)
+        warehouse_id = self.warehouses.get(str(row["warehouse"]))
+        if warehouse_id is None:
+            msg = f"unknown warehouse {row['warehouse']}"
+            raise ValueError(msg)
+        variant_id = row.get("variant_id")
+        return StockAdjustment(
+            warehouse_id=warehouse_id,
+            quantity=int(row["quantity"]),
+            variant_id=int(variant_id) if variant_id not in (None, "") else None,
+            sku=row.get("sku") or None,
+            absolute=mode == ABSOLUTE,
+        )
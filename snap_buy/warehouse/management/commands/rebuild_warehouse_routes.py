@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from snap_buy.warehouse.routing import rebuild_warehouse_routes
+
+
+class Command(BaseCommand):
+    help = "Rebuild the channel and country to warehouse routing table."
+
+    def handle(self, *args, **options):
+        changed = rebuild_warehouse_routes()
+        self.stdout.write(self.style.SUCCESS(f"Changed {changed} warehouse routes."))
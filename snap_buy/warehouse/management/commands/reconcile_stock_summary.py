@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from snap_buy.core.utils.batches import iter_batches
+from snap_buy.product.models import ProductVariant
+from snap_buy.warehouse.stock_summary import STOCK_SUMMARY_BATCH_SIZE
+from snap_buy.warehouse.stock_summary import reconcile_variant_stock_summaries
+
+
+class Command(BaseCommand):
+    help = "Repair variant stock summaries which drifted from stocks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=STOCK_SUMMARY_BATCH_SIZE,
+            help="Number of variants checked per batch.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        variant_ids = (
+            ProductVariant.objects.order_by("pk")
+            .values_list("pk", flat=True)
+            .iterator(chunk_size=batch_size)
+        )
+        repaired = 0
+        for batch in iter_batches(variant_ids, batch_size):
+            repaired += len(reconcile_variant_stock_summaries(batch))
+        self.stdout.write(
+            self.style.SUCCESS(f"Repaired {repaired} variant stock summaries."),
+        )
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+
+from snap_buy.core.utils.batches import iter_batches
+from snap_buy.warehouse.allocations import STOCKS_BATCH_SIZE
+from snap_buy.warehouse.allocations import fix_stocks_allocated_quantity
+from snap_buy.warehouse.allocations import get_stocks_with_allocated_quantity_drift
+from snap_buy.warehouse.models import Stock
+
+
+class Command(BaseCommand):
+    help = "Compare the allocated quantity of stocks with the sum of allocations."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Set the allocated quantity of drifted stocks to the allocations sum.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=STOCKS_BATCH_SIZE,
+            help="Number of stocks checked per batch.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        stock_ids = (
+            Stock.objects.order_by("pk")
+            .values_list("pk", flat=True)
+            .iterator(chunk_size=batch_size)
+        )
+        drifted: list[int] = []
+        for batch in iter_batches(stock_ids, batch_size):
+            drifted.extend(self._check_batch(batch))
+
+        if drifted and options["fix"]:
+            fixed = fix_stocks_allocated_quantity(drifted)
+            self.stdout.write(self.style.SUCCESS(f"Fixed {fixed} stocks."))
+        elif drifted:
+            self.stdout.write(
+                self.style.WARNING(f"Found {len(drifted)} drifted stocks."),
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS("No drift found."))
+
+    def _check_batch(self, stock_ids):
+        drifted = []
+        for (
+            stock_id,
+            variant_id,
+            allocations_quantity,
+        ) in get_stocks_with_allocated_quantity_drift(stock_ids):
+            self.stdout.write(
+                f"Stock {stock_id} of variant {variant_id}: "
+                f"allocations sum to {allocations_quantity}.",
+            )
+            drifted.append(stock_id)
+        return drifted
@@ -3,6 +3,7 @@ from typing import TYPE_CHECKING
 from typing import TypedDict
 from typing import cast
 
+from django.conf import settings
 from django.db import models
 from django.db.models import Count
 from django.db.models import Exists
@@ -17,7 +18,6 @@ from django.db.models.query import QuerySet
 from django.utils import timezone
 
 from snap_buy.channel.models import Channel
-from snap_buy.core.models import SortableModel
 from snap_buy.order.models import OrderLine
 from snap_buy.product.models import Product
 from snap_buy.product.models import ProductVariant
@@ -26,8 +26,9 @@ from snap_buy.shipping.models import ShippingZone
 from . import WarehouseClickAndCollectOption
 
 if TYPE_CHECKING:
-    # https://github.com/typeddjango/django-stubs/issues/719
+    from uuid import UUID
 
+    # https://github.com/typeddjango/django-stubs/issues/719
     from django_stubs_ext import WithAnnotations
 
     from .models import Stock
@@ -41,15 +42,22 @@ else:
     StockWithAvailableQuantity = "Stock"
 
 ShippingZoneChannel = Channel.shipping_zones.through
-WarehouseShippingZone = ShippingZone.warehouses.through
-WarehouseChannel = Channel.warehouses.through
+
+
+# `Warehouse` relations can't be resolved before the models module is loaded.
+def _get_warehouse_through_models():
+    from .models import ChannelWarehouse
+    from .models import Warehouse
+
+    return Warehouse.shipping_zones.through, ChannelWarehouse
 
 
 class WarehouseQueryset(models.QuerySet["Warehouse"]):
     def for_channel(self, channel_id: int):
+        _, warehouse_channel_model = _get_warehouse_through_models()
         return self.filter(
             Exists(
-                WarehouseChannel.objects.filter(
+                warehouse_channel_model.objects.filter(
                     channel_id=channel_id,
                     warehouse_id=OuterRef("id"),
                 ),
@@ -57,6 +65,17 @@ class WarehouseQueryset(models.QuerySet["Warehouse"]):
         ).order_by("pk")
 
     def for_country_and_channel(self, country: str, channel_id: int):
+        if settings.WAREHOUSE_ROUTING_MATERIALIZED:
+            from .models import WarehouseRoute
+
+            routes = WarehouseRoute.objects.filter(
+                channel_id=channel_id,
+                country=country,
+            )
+            return self.filter(pk__in=routes.values("warehouse_id")).order_by("pk")
+        warehouse_shipping_zone_model, warehouse_channel_model = (
+            _get_warehouse_through_models()
+        )
         shipping_zones = ShippingZone.objects.filter(
             countries__contains=country,
         ).values("pk")
@@ -65,14 +84,14 @@ class WarehouseQueryset(models.QuerySet["Warehouse"]):
             channel_id=channel_id,
         )
 
-        warehouse_shipping_zones = WarehouseShippingZone.objects.filter(
+        warehouse_shipping_zones = warehouse_shipping_zone_model.objects.filter(
             Exists(
                 shipping_zone_channels.filter(
                     shippingzone_id=OuterRef("shippingzone_id"),
                 ),
             ),
             Exists(
-                WarehouseChannel.objects.filter(
+                warehouse_channel_model.objects.filter(
                     channel_id=channel_id,
                     warehouse_id=OuterRef("warehouse_id"),
                 ),
@@ -181,42 +200,50 @@ class WarehouseQueryset(models.QuerySet["Warehouse"]):
         )
 
 
-class ChannelWarehouse(SortableModel):
-    channel = models.ForeignKey(
-        Channel,
-        related_name="channelwarehouse",
-        on_delete=models.CASCADE,
-    )
-    warehouse = models.ForeignKey(
-        "Warehouse",
-        related_name="channelwarehouse",
-        on_delete=models.CASCADE,
-    )
-
-    class Meta:
-        unique_together = (("channel", "warehouse"),)
-        ordering = ("sort_order", "pk")
+WarehouseManager = models.Manager.from_queryset(WarehouseQueryset)
 
-    def get_ordering_queryset(self):
-        return self.channel.channelwarehouse.all()
 
+def _active_reservations_quantity(
+    exclude_checkout_line_ids: Iterable["UUID"] | None = None,
+):
+    from .models import Reservation
 
-WarehouseManager = models.Manager.from_queryset(WarehouseQueryset)
+    reservations = Reservation.objects.filter(
+        stock_id=OuterRef("pk"),
+        reserved_until__gt=timezone.now(),
+    )
+    if exclude_checkout_line_ids:
+        reservations = reservations.exclude(
+            checkout_line_id__in=list(exclude_checkout_line_ids),
+        )
+    return Coalesce(
+        Subquery(
+            reservations.order_by()
+            .values("stock_id")
+            .annotate(total=Sum("quantity_reserved"))
+            .values("total"),
+            output_field=models.IntegerField(),
+        ),
+        0,
+    )
 
 
 class StockQuerySet(models.QuerySet["Stock"]):
-    def annotate_available_quantity(self) -> QuerySet[StockWithAvailableQuantity]:
+    def annotate_available_quantity(
+        self,
+        exclude_checkout_line_ids: Iterable["UUID"] | None = None,
+    ) -> QuerySet[StockWithAvailableQuantity]:
+        """Annotate stocks with the quantity which is neither allocated nor reserved.
+
+        Reservations of the given checkout lines are not subtracted, so a checkout
+        doesn't compete with its own reservations.
+        """
         return cast(
             QuerySet[StockWithAvailableQuantity],
             self.annotate(
                 available_quantity=F("quantity")
-                - Coalesce(
-                    Sum(
-                        "allocations__quantity_allocated",
-                        filter=Q(allocations__quantity_allocated__gt=0),
-                    ),
-                    0,
-                ),
+                - F("quantity_allocated")
+                - _active_reservations_quantity(exclude_checkout_line_ids),
             ),
         )
 
@@ -237,9 +264,10 @@ class StockQuerySet(models.QuerySet["Stock"]):
         The click and collect warehouses don't have to be assigned to the shipping zones
         so all stocks for a given channel are returned.
         """
+        _, warehouse_channel_model = _get_warehouse_through_models()
         channels = Channel.objects.filter(slug=channel_slug).values("pk")
 
-        warehouse_channels = WarehouseChannel.objects.filter(
+        warehouse_channels = warehouse_channel_model.objects.filter(
             Exists(channels.filter(pk=OuterRef("channel_id"))),
         ).values("warehouse_id")
 
@@ -262,14 +290,24 @@ class StockQuerySet(models.QuerySet["Stock"]):
         also the stocks from collection point warehouses allowed in given channel are
         returned.
         """
+        if settings.WAREHOUSE_ROUTING_MATERIALIZED:
+            return self._for_channel_and_country_from_routes(
+                channel_slug,
+                country_code,
+                include_cc_warehouses=include_cc_warehouses,
+            )
+
         from .models import Warehouse
 
+        warehouse_shipping_zone_model, warehouse_channel_model = (
+            _get_warehouse_through_models()
+        )
         channels = Channel.objects.filter(slug=channel_slug).values("pk")
 
         shipping_zone_channels = ShippingZoneChannel.objects.filter(
             Exists(channels.filter(pk=OuterRef("channel_id"))),
         )
-        warehouse_channels = WarehouseChannel.objects.filter(
+        warehouse_channels = warehouse_channel_model.objects.filter(
             Exists(channels.filter(pk=OuterRef("channel_id"))),
         ).values("warehouse_id")
 
@@ -294,7 +332,7 @@ class StockQuerySet(models.QuerySet["Stock"]):
 
         shipping_zone_channels.values("shippingzone_id")
 
-        warehouse_shipping_zones = WarehouseShippingZone.objects.filter(
+        warehouse_shipping_zones = warehouse_shipping_zone_model.objects.filter(
             Exists(
                 shipping_zone_channels.filter(
                     shippingzone_id=OuterRef("shippingzone_id"),
@@ -309,6 +347,24 @@ class StockQuerySet(models.QuerySet["Stock"]):
             | Exists(cc_warehouses.filter(id=OuterRef("warehouse_id"))),
         )
 
+    def _for_channel_and_country_from_routes(
+        self,
+        channel_slug: str,
+        country_code: str | None,
+        *,
+        include_cc_warehouses: bool,
+    ):
+        from .models import WarehouseRoute
+
+        routes = WarehouseRoute.objects.filter(channel__slug=channel_slug)
+        if country_code and include_cc_warehouses:
+            routes = routes.filter(country__in=[country_code, ""])
+        elif country_code:
+            routes = routes.filter(country=country_code)
+        return self.select_related("product_variant").filter(
+            warehouse_id__in=routes.values("warehouse_id"),
+        )
+
     def get_variant_stocks_for_country(
         self,
         country_code: str,
@@ -355,17 +411,20 @@ class AllocationQueryset(models.QuerySet["Allocation"]):
     def annotate_stock_available_quantity(self):
         return self.annotate(
             stock_available_quantity=F("stock__quantity")
-            - Coalesce(Sum("stock__allocations__quantity_allocated"), 0),
+            - F("stock__quantity_allocated"),
         )
 
     def available_quantity_for_stock(self, stock: "Stock"):
-        allocated_quantity = (
-            self.filter(stock=stock).aggregate(Sum("quantity_allocated"))[
-                "quantity_allocated__sum"
-            ]
-            or 0
+        from .models import Stock
+
+        available_quantity = (
+            Stock.objects.using(self.db)
+            .filter(pk=stock.pk)
+            .annotate_available_quantity()
+            .values_list("available_quantity", flat=True)
+            .get()
         )
-        return max(stock.quantity - allocated_quantity, 0)
+        return max(available_quantity, 0)
 
 
 AllocationManager = models.Manager.from_queryset(AllocationQueryset)
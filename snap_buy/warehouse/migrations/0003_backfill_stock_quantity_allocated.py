@@ -0,0 +1,26 @@
+# Generated by Django 5.0.8 on 2026-10-17 01:55
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("warehouse", "0002_productvariantstocksummary"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            """
+            UPDATE warehouse_stock
+            SET quantity_allocated = COALESCE(
+                (
+                    SELECT SUM(allocation.quantity_allocated)
+                    FROM warehouse_allocation allocation
+                    WHERE allocation.stock_id = warehouse_stock.id
+                ),
+                0
+            );
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.0.8 on 2026-10-17 01:57
+
+import django.db.models.deletion
+import django_countries.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("channel", "0001_initial"),
+        ("shipping", "0001_initial"),
+        ("warehouse", "0003_backfill_stock_quantity_allocated"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WarehouseRoute",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "country",
+                    django_countries.fields.CountryField(blank=True, max_length=2),
+                ),
+                (
+                    "channel",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="warehouse_routes",
+                        to="channel.channel",
+                    ),
+                ),
+                (
+                    "warehouse",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="routes",
+                        to="warehouse.warehouse",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("pk",),
+                "unique_together": {("channel", "country", "warehouse")},
+            },
+        ),
+    ]
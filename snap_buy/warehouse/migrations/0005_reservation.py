@@ -0,0 +1,57 @@
+# Generated by Django 5.0.8 on 2026-10-17 02:01
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("checkout", "0002_initial"),
+        ("warehouse", "0004_warehouseroute"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Reservation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity_reserved", models.PositiveIntegerField(default=0)),
+                ("reserved_until", models.DateTimeField()),
+                (
+                    "checkout_line",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="checkout.checkoutline",
+                    ),
+                ),
+                (
+                    "stock",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="warehouse.stock",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("pk",),
+                "indexes": [
+                    django.contrib.postgres.indexes.BTreeIndex(
+                        fields=["reserved_until"],
+                        name="warehouse_reserved_until_idx",
+                    ),
+                ],
+                "unique_together": {("checkout_line", "stock")},
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.8 on 2026-10-17 02:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("order", "0002_initial"),
+        ("product", "0003_preorder_quantity_allocated"),
+        ("warehouse", "0005_reservation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PreorderAllocation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity", models.PositiveIntegerField(default=0)),
+                (
+                    "order_line",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="preorder_allocations",
+                        to="order.orderline",
+                    ),
+                ),
+                (
+                    "product_variant_channel_listing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="preorder_allocations",
+                        to="product.productvariantchannellisting",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("pk",),
+                "unique_together": {("order_line", "product_variant_channel_listing")},
+            },
+        ),
+    ]
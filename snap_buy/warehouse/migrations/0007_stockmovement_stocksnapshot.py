@@ -0,0 +1,161 @@
+# Generated by Django 5.0.8 on 2026-10-17 02:06
+
+import datetime
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+STOCK_MOVEMENT_PARTITIONS_AHEAD = 2
+
+
+def create_stock_movement_partitions(apps, schema_editor):
+    month = timezone.now().date().replace(day=1)
+    for _ in range(STOCK_MOVEMENT_PARTITIONS_AHEAD + 1):
+        next_month = (month.replace(day=28) + datetime.timedelta(days=4)).replace(
+            day=1,
+        )
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS warehouse_stockmovement_{month:%Y_%m} "
+            "PARTITION OF warehouse_stockmovement FOR VALUES FROM (%s) TO (%s)",
+            [month, next_month],
+        )
+        month = next_month
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("warehouse", "0006_preorderallocation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockMovement",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("receive", "Received"),
+                            ("allocate", "Allocated"),
+                            ("deallocate", "Deallocated"),
+                            ("fulfil", "Fulfilled"),
+                            ("return", "Returned"),
+                            ("adjust", "Adjusted"),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                ("quantity", models.IntegerField(default=0)),
+                ("quantity_allocated", models.IntegerField(default=0)),
+                (
+                    "created_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "stock",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="movements",
+                        to="warehouse.stock",
+                    ),
+                ),
+                (
+                    "warehouse",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="stock_movements",
+                        to="warehouse.warehouse",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "warehouse_stockmovement",
+                "ordering": ("pk",),
+                "managed": False,
+            },
+        ),
+        # The partition key has to be a part of the primary key.
+        migrations.RunSQL(
+            """
+            CREATE TABLE warehouse_stockmovement (
+                id bigserial NOT NULL,
+                stock_id bigint NOT NULL,
+                warehouse_id uuid NOT NULL,
+                type varchar(32) NOT NULL,
+                quantity integer NOT NULL,
+                quantity_allocated integer NOT NULL,
+                created_at timestamp with time zone NOT NULL,
+                PRIMARY KEY (id, created_at)
+            ) PARTITION BY RANGE (created_at);
+            CREATE TABLE warehouse_stockmovement_default
+                PARTITION OF warehouse_stockmovement DEFAULT;
+            CREATE INDEX warehouse_stockmovement_warehouse_idx
+                ON warehouse_stockmovement (warehouse_id, created_at);
+            CREATE INDEX warehouse_stockmovement_stock_idx
+                ON warehouse_stockmovement (stock_id, created_at);
+            """,
+            reverse_sql="DROP TABLE warehouse_stockmovement;",
+        ),
+        migrations.RunPython(
+            create_stock_movement_partitions,
+            migrations.RunPython.noop,
+        ),
+        migrations.CreateModel(
+            name="StockSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity", models.IntegerField(default=0)),
+                ("quantity_allocated", models.IntegerField(default=0)),
+                ("taken_at", models.DateTimeField()),
+                (
+                    "stock",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="snapshots",
+                        to="warehouse.stock",
+                    ),
+                ),
+                (
+                    "warehouse",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_snapshots",
+                        to="warehouse.warehouse",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("pk",),
+                "indexes": [
+                    models.Index(
+                        fields=["warehouse", "taken_at"],
+                        name="warehouse_snapshot_taken_idx",
+                    ),
+                ],
+            },
+        ),
+        # The ledger starts empty, so the current quantities are its base.
+        migrations.RunSQL(
+            """
+            INSERT INTO warehouse_stocksnapshot
+                (warehouse_id, stock_id, quantity, quantity_allocated, taken_at)
+            SELECT warehouse_id, id, quantity, quantity_allocated, now()
+            FROM warehouse_stock;
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
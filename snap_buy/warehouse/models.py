@@ -1,19 +1,29 @@
 import itertools
 import uuid
 
+from django.contrib.postgres.indexes import BTreeIndex
 from django.db import models
+from django.db import transaction
 from django.db.models import F
+from django.utils import timezone
+from django_countries.fields import CountryField
 
 from snap_buy.channel.models import Channel
+from snap_buy.checkout.models import CheckoutLine
 from snap_buy.core.models import ModelWithExternalReference
 from snap_buy.core.models import ModelWithMetadata
 from snap_buy.core.models import SortableModel
 from snap_buy.order.models import OrderLine
 from snap_buy.product.models import ProductVariant
+from snap_buy.product.models import ProductVariantChannelListing
 from snap_buy.shipping.models import ShippingZone
 from snap_buy.users.models import Address
 
+from . import StockMovementType
 from . import WarehouseClickAndCollectOption
+from .managers import AllocationManager
+from .managers import StockManager
+from .managers import WarehouseManager
 
 
 class ChannelWarehouse(SortableModel):
@@ -59,6 +69,8 @@ class Warehouse(ModelWithMetadata, ModelWithExternalReference):
     )
     is_private = models.BooleanField(default=True)
 
+    objects = WarehouseManager()
+
     class Meta(ModelWithMetadata.Meta):
         ordering = ("-slug",)
 
@@ -76,6 +88,34 @@ class Warehouse(ModelWithMetadata, ModelWithExternalReference):
         address.delete()
 
 
+class WarehouseRoute(models.Model):
+    """Warehouse which can ship to the country within the channel.
+
+    Routes with an empty country point to click and collect warehouses of the
+    channel. The table is rebuilt from shipping zones, channels and warehouses,
+    see `snap_buy.warehouse.routing`.
+    """
+
+    channel = models.ForeignKey(
+        Channel,
+        related_name="warehouse_routes",
+        on_delete=models.CASCADE,
+    )
+    country = CountryField(blank=True)
+    warehouse = models.ForeignKey(
+        Warehouse,
+        related_name="routes",
+        on_delete=models.CASCADE,
+    )
+
+    class Meta:
+        unique_together = [["channel", "country", "warehouse"]]
+        ordering = ("pk",)
+
+    def __str__(self):
+        return f"{self.channel} - {self.country} - {self.warehouse}"
+
+
 class Stock(models.Model):
     warehouse = models.ForeignKey(Warehouse, null=False, on_delete=models.CASCADE)
     product_variant = models.ForeignKey(
@@ -85,8 +125,11 @@ class Stock(models.Model):
         related_name="stocks",
     )
     quantity = models.IntegerField(default=0)
+    # Maintained by allocation changes, see `snap_buy.warehouse.allocations`.
     quantity_allocated = models.IntegerField(default=0)
 
+    objects = StockManager()
+
     class Meta:
         unique_together = [["warehouse", "product_variant"]]
         ordering = ("pk",)
@@ -94,16 +137,135 @@ class Stock(models.Model):
     def __str__(self):
         return f"{self.product_variant} - {self.warehouse}"
 
-    def increase_stock(self, quantity: int, *, commit: bool = True):
-        """Return given quantity of product to a stock."""
+    def increase_stock(
+        self,
+        quantity: int,
+        *,
+        commit: bool = True,
+        movement_type: str = StockMovementType.ADJUST,
+    ):
+        """Return given quantity of product to a stock.
+
+        With `commit=False` the caller is responsible for saving the stock,
+        adjusting the variant stock summary and recording the stock movement.
+        """
         self.quantity = F("quantity") + quantity
         if commit:
-            self.save(update_fields=["quantity"])
+            self._save_quantity(quantity, movement_type)
 
-    def decrease_stock(self, quantity: int, *, commit: bool = True):
+    def decrease_stock(
+        self,
+        quantity: int,
+        *,
+        commit: bool = True,
+        movement_type: str = StockMovementType.ADJUST,
+    ):
         self.quantity = F("quantity") - quantity
         if commit:
+            self._save_quantity(-quantity, movement_type)
+
+    def _save_quantity(self, quantity_delta: int, movement_type: str):
+        from .ledger import StockMovementEntry
+        from .ledger import record_stock_movements
+        from .stock_summary import adjust_variant_stock_summaries
+
+        with transaction.atomic():
             self.save(update_fields=["quantity"])
+            adjust_variant_stock_summaries(
+                {self.product_variant_id: (quantity_delta, 0)},
+            )
+            record_stock_movements(
+                [StockMovementEntry(self.pk, movement_type, quantity=quantity_delta)],
+            )
+
+
+class StockMovement(models.Model):
+    """Append-only record of a change of stock quantities.
+
+    The table is range-partitioned by month on `created_at`, so it is created in
+    the migrations and its partitions by `snap_buy.warehouse.ledger`.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    # The ledger outlives stocks and warehouses, so there are no constraints.
+    stock = models.ForeignKey(
+        Stock,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="movements",
+    )
+    warehouse = models.ForeignKey(
+        Warehouse,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="stock_movements",
+    )
+    type = models.CharField(max_length=32, choices=StockMovementType.CHOICES)
+    quantity = models.IntegerField(default=0)
+    quantity_allocated = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        managed = False
+        db_table = "warehouse_stockmovement"
+        ordering = ("pk",)
+
+    def __str__(self):
+        return f"{self.type} {self.stock_id} ({self.created_at})"
+
+
+class StockSnapshot(models.Model):
+    """Stock quantities of a warehouse at `taken_at`."""
+
+    warehouse = models.ForeignKey(
+        Warehouse,
+        on_delete=models.CASCADE,
+        related_name="stock_snapshots",
+    )
+    stock = models.ForeignKey(
+        Stock,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="snapshots",
+    )
+    quantity = models.IntegerField(default=0)
+    quantity_allocated = models.IntegerField(default=0)
+    taken_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ("pk",)
+        indexes = [
+            models.Index(
+                fields=["warehouse", "taken_at"],
+                name="warehouse_snapshot_taken_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.stock_id} ({self.taken_at})"
+
+
+class ProductVariantStockSummary(models.Model):
+    """Stock totals of a variant across all warehouses.
+
+    Kept up to date by stock and allocation changes, so variant availability can
+    be read from a single row instead of aggregating stocks and allocations.
+    """
+
+    product_variant = models.OneToOneField(
+        ProductVariant,
+        on_delete=models.CASCADE,
+        related_name="stock_summary",
+    )
+    quantity = models.IntegerField(default=0)
+    quantity_allocated = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ("pk",)
+
+    def __str__(self):
+        return f"{self.product_variant} (Stock Summary)"
 
 
 class Allocation(models.Model):
@@ -123,9 +285,65 @@ class Allocation(models.Model):
     )
     quantity_allocated = models.PositiveIntegerField(default=0)
 
+    objects = AllocationManager()
+
     class Meta:
         unique_together = [["order_line", "stock"]]
         ordering = ("pk",)
 
     def __str__(self):
         return str(self.id)
+
+
+class PreorderAllocation(models.Model):
+    """Quantity of an order line allocated against a preorder channel listing.
+
+    Preorder allocations are counted in `preorder_quantity_allocated` of the
+    channel listing and `preorder_global_quantity_allocated` of the variant.
+    """
+
+    order_line = models.ForeignKey(
+        OrderLine,
+        on_delete=models.CASCADE,
+        related_name="preorder_allocations",
+    )
+    quantity = models.PositiveIntegerField(default=0)
+    product_variant_channel_listing = models.ForeignKey(
+        ProductVariantChannelListing,
+        on_delete=models.CASCADE,
+        related_name="preorder_allocations",
+    )
+
+    class Meta:
+        unique_together = [["order_line", "product_variant_channel_listing"]]
+        ordering = ("pk",)
+
+    def __str__(self):
+        return str(self.id)
+
+
+class Reservation(models.Model):
+    """Stock held for a checkout line until `reserved_until`."""
+
+    checkout_line = models.ForeignKey(
+        CheckoutLine,
+        related_name="reservations",
+        on_delete=models.CASCADE,
+    )
+    stock = models.ForeignKey(
+        Stock,
+        related_name="reservations",
+        on_delete=models.CASCADE,
+    )
+    quantity_reserved = models.PositiveIntegerField(default=0)
+    reserved_until = models.DateTimeField()
+
+    class Meta:
+        unique_together = [["checkout_line", "stock"]]
+        ordering = ("pk",)
+        indexes = [
+            BTreeIndex(fields=["reserved_until"], name="warehouse_reserved_until_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.checkout_line_id} - {self.stock}"
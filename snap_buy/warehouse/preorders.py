@@ -0,0 +1,288 @@
+import logging
+from collections import defaultdict
+from collections.abc import Iterable
+from collections.abc import Mapping
+from typing import TYPE_CHECKING
+from typing import NamedTuple
+from typing import cast
+
+from django.db import transaction
+from django.db.models import Exists
+from django.db.models import F
+from django.db.models import OuterRef
+from django.utils import timezone
+
+from snap_buy.order.models import Order
+from snap_buy.order.models import OrderLine
+from snap_buy.product.models import ProductVariant
+from snap_buy.product.models import ProductVariantChannelListing
+
+from .allocations import InsufficientStockError
+from .allocations import _delta_case
+from .allocations import allocate_stocks
+from .models import PreorderAllocation
+
+if TYPE_CHECKING:
+    from uuid import UUID
+
+logger = logging.getLogger(__name__)
+
+PREORDER_ORDERS_BATCH_SIZE = 100
+
+
+class PreorderConversionBatch(NamedTuple):
+    converted: int
+    failed: int
+    last_order_id: "UUID | None"
+
+
+def _lock_preorder_counters(variant_ids: Iterable[int], listing_ids: Iterable[int]):
+    # Variants are always locked before their channel listings and both in pk
+    # order, so concurrent allocations queue up instead of deadlocking.
+    list(
+        ProductVariant.objects.filter(pk__in=list(variant_ids))
+        .order_by("pk")
+        .select_for_update(of=("self",))
+        .values_list("pk", flat=True),
+    )
+    list(
+        ProductVariantChannelListing.objects.filter(pk__in=list(listing_ids))
+        .order_by("pk")
+        .select_for_update(of=("self",))
+        .values_list("pk", flat=True),
+    )
+
+
+def _apply_preorder_quantity_allocated(
+    variant_deltas: Mapping[int, int],
+    listing_deltas: Mapping[int, int],
+):
+    """Update the counters of variants and listings locked by the caller."""
+    ProductVariant.objects.filter(pk__in=list(variant_deltas)).update(
+        preorder_global_quantity_allocated=F("preorder_global_quantity_allocated")
+        + _delta_case(variant_deltas),
+    )
+    ProductVariantChannelListing.objects.filter(pk__in=list(listing_deltas)).update(
+        preorder_quantity_allocated=F("preorder_quantity_allocated")
+        + _delta_case(listing_deltas),
+    )
+
+
+def adjust_preorder_quantity_allocated(listing_deltas: Mapping[int, int]):
+    """Change the preorder counters of channel listings and their variants."""
+    listing_deltas = {pk: delta for pk, delta in listing_deltas.items() if delta}
+    if not listing_deltas:
+        return
+    variant_deltas: dict[int, int] = defaultdict(int)
+    for listing_id, variant_id in ProductVariantChannelListing.objects.filter(
+        pk__in=list(listing_deltas),
+    ).values_list("pk", "variant_id"):
+        variant_deltas[variant_id] += listing_deltas[listing_id]
+    with transaction.atomic():
+        _lock_preorder_counters(variant_deltas, listing_deltas)
+        _apply_preorder_quantity_allocated(variant_deltas, listing_deltas)
+
+
+def _exceeds_threshold(threshold: int | None, allocated: int, quantity: int) -> bool:
+    return threshold is not None and allocated + quantity > threshold
+
+
+def allocate_preorders(
+    order: Order,
+    lines: Iterable[OrderLine] | None = None,
+) -> list[PreorderAllocation]:
+    """Allocate order lines of variants in an active preorder.
+
+    The channel threshold is checked against `preorder_quantity_allocated` of the
+    variant channel listing and the global threshold against
+    `preorder_global_quantity_allocated` of the variant, so no allocation rows are
+    aggregated. Both counters are updated in the same transaction.
+
+    Raise `InsufficientStockError` when any line exceeds a threshold.
+    """
+    if lines is None:
+        lines = order.lines.select_related("variant")
+    lines_to_allocate = [
+        line for line in lines if line.variant and line.variant.is_preorder_active()
+    ]
+    if not lines_to_allocate:
+        return []
+    variant_quantities: dict[int, int] = defaultdict(int)
+    for line in lines_to_allocate:
+        variant_quantities[cast(int, line.variant_id)] += line.quantity
+
+    with transaction.atomic():
+        variants = {
+            pk: (threshold, allocated)
+            for pk, threshold, allocated in ProductVariant.objects.filter(
+                pk__in=list(variant_quantities),
+            )
+            .order_by("pk")
+            .select_for_update(of=("self",))
+            .values_list(
+                "pk",
+                "preorder_global_threshold",
+                "preorder_global_quantity_allocated",
+            )
+        }
+        listings = {
+            variant_id: (pk, threshold, allocated)
+            for variant_id, pk, threshold, allocated in (
+                ProductVariantChannelListing.objects.filter(
+                    variant_id__in=list(variant_quantities),
+                    channel_id=order.channel_id,
+                )
+                .order_by("pk")
+                .select_for_update(of=("self",))
+                .values_list(
+                    "variant_id",
+                    "pk",
+                    "preorder_quantity_threshold",
+                    "preorder_quantity_allocated",
+                )
+            )
+        }
+        exceeded = {
+            variant_id
+            for variant_id, quantity in variant_quantities.items()
+            if variant_id not in listings
+            or _exceeds_threshold(*variants[variant_id], quantity)
+            or _exceeds_threshold(*listings[variant_id][1:], quantity)
+        }
+        if exceeded:
+            raise InsufficientStockError(
+                [line for line in lines_to_allocate if line.variant_id in exceeded],
+            )
+
+        _apply_preorder_quantity_allocated(
+            variant_quantities,
+            {
+                listings[variant_id][0]: quantity
+                for variant_id, quantity in variant_quantities.items()
+            },
+        )
+        return PreorderAllocation.objects.bulk_create(
+            [
+                PreorderAllocation(
+                    order_line_id=line.pk,
+                    product_variant_channel_listing_id=listings[line.variant_id][0],
+                    quantity=line.quantity,
+                )
+                for line in lines_to_allocate
+            ],
+        )
+
+
+def deallocate_preorders(order_line_ids: Iterable["UUID"]):
+    """Delete preorder allocations of order lines and release their quantity."""
+    allocations = PreorderAllocation.objects.filter(
+        order_line_id__in=list(order_line_ids),
+    )
+    listing_deltas: dict[int, int] = defaultdict(int)
+    with transaction.atomic():
+        for listing_id, quantity in allocations.values_list(
+            "product_variant_channel_listing_id",
+            "quantity",
+        ):
+            listing_deltas[listing_id] -= quantity
+        adjust_preorder_quantity_allocated(listing_deltas)
+        # Deleting a single preorder allocation releases the quantity it still
+        # holds in a signal handler; the quantity is released above already.
+        allocations.update(quantity=0)
+        allocations.delete()
+
+
+def _ended_preorder_allocations():
+    return PreorderAllocation.objects.filter(
+        product_variant_channel_listing__variant__is_preorder=True,
+        product_variant_channel_listing__variant__preorder_end_date__lte=timezone.now(),
+    )
+
+
+def convert_ended_preorder_allocations(
+    batch_size: int = PREORDER_ORDERS_BATCH_SIZE,
+    after_order_id: "UUID | None" = None,
+) -> PreorderConversionBatch:
+    """Turn preorder allocations of ended preorders into stock allocations.
+
+    A batch of orders following `after_order_id` is processed, every order in its
+    own transaction. Orders lacking stock keep their preorder allocations and are
+    retried on the next run.
+    """
+    allocations = _ended_preorder_allocations()
+    if after_order_id is not None:
+        allocations = allocations.filter(order_line__order_id__gt=after_order_id)
+    order_ids = list(
+        allocations.order_by("order_line__order_id")
+        .values_list("order_line__order_id", flat=True)
+        .distinct()[:batch_size],
+    )
+    if not order_ids:
+        return PreorderConversionBatch(converted=0, failed=0, last_order_id=None)
+
+    order_lines = defaultdict(list)
+    for allocation in allocations.filter(
+        order_line__order_id__in=order_ids,
+    ).select_related("order_line__variant"):
+        order_lines[allocation.order_line.order_id].append(allocation.order_line)
+    orders = Order.objects.filter(pk__in=order_ids).select_related(
+        "channel",
+        "shipping_address",
+        "collection_point",
+    )
+    converted = failed = 0
+    for order in orders:
+        lines = order_lines[order.pk]
+        try:
+            with transaction.atomic():
+                deallocate_preorders([line.pk for line in lines])
+                allocate_stocks(order, lines)
+        except InsufficientStockError:
+            logger.warning(
+                "Insufficient stock to convert preorder allocations of order %s.",
+                order.pk,
+            )
+            failed += 1
+        else:
+            converted += 1
+    return PreorderConversionBatch(
+        converted=converted,
+        failed=failed,
+        last_order_id=order_ids[-1],
+    )
+
+
+def deactivate_ended_preorders() -> int:
+    """Turn variants whose ended preorder has been converted into regular ones.
+
+    Return the number of deactivated variants.
+    """
+    variants = ProductVariant.objects.filter(
+        is_preorder=True,
+        preorder_end_date__lte=timezone.now(),
+    ).exclude(
+        Exists(
+            PreorderAllocation.objects.filter(
+                product_variant_channel_listing__variant_id=OuterRef("pk"),
+            ),
+        ),
+    )
+    with transaction.atomic():
+        variant_ids = list(
+            variants.order_by("pk")
+            .select_for_update(of=("self",))
+            .values_list("pk", flat=True),
+        )
+        if not variant_ids:
+            return 0
+        ProductVariantChannelListing.objects.filter(
+            variant_id__in=variant_ids,
+        ).update(preorder_quantity_threshold=None, preorder_quantity_allocated=0)
+        ProductVariant.objects.filter(pk__in=variant_ids).update(
+            is_preorder=False,
+            preorder_end_date=None,
+            preorder_global_threshold=None,
+            preorder_global_quantity_allocated=0,
+            updated_at=timezone.now(),
+        )
+    return len(variant_ids)
@@ -0,0 +1,113 @@
+from collections.abc import Iterable
+from datetime import timedelta
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+
+from snap_buy.checkout.models import CheckoutLine
+
+from .allocations import lock_stock_candidates
+from .allocations import split_lines_quantity
+from .models import Reservation
+from .models import Stock
+
+if TYPE_CHECKING:
+    from uuid import UUID
+
+    from snap_buy.channel.models import Channel
+
+RESERVATIONS_BATCH_SIZE = 1000
+
+
+def reserve_stocks(
+    checkout_lines: Iterable[CheckoutLine],
+    channel: "Channel",
+    country_code: str | None = None,
+    reservation_length: timedelta | None = None,
+) -> list[Reservation]:
+    """Reserve stock for checkout lines until the reservation length passes.
+
+    Existing reservations of the lines are replaced. Lines of variants which don't
+    track inventory or are in preorder are skipped. Raise `InsufficientStockError`
+    when any line can't be reserved.
+    """
+    if reservation_length is None:
+        reservation_length = settings.CHECKOUT_RESERVATION_LENGTH
+    checkout_lines = list(checkout_lines)
+    prefetch_related_objects(checkout_lines, "variant")
+    lines = [
+        line
+        for line in checkout_lines
+        if line.variant.track_inventory and not line.variant.is_preorder_active()
+    ]
+    if not lines:
+        return []
+    line_ids = [line.pk for line in lines]
+    with transaction.atomic():
+        candidates = lock_stock_candidates(
+            Stock.objects.for_channel_and_country(channel.slug, country_code),
+            [line.variant_id for line in lines],
+            channel.pk,
+            exclude_checkout_line_ids=line_ids,
+        )
+        reserved = split_lines_quantity(lines, candidates, channel.allocation_strategy)
+        Reservation.objects.filter(checkout_line_id__in=line_ids).delete()
+        reserved_until = timezone.now() + reservation_length
+        return Reservation.objects.bulk_create(
+            [
+                Reservation(
+                    checkout_line_id=line_id,
+                    stock_id=stock_id,
+                    quantity_reserved=quantity,
+                    reserved_until=reserved_until,
+                )
+                for (line_id, stock_id), quantity in reserved.items()
+            ],
+        )
+
+
+def extend_reservations(
+    checkout_line_ids: Iterable["UUID"],
+    reservation_length: timedelta | None = None,
+) -> int:
+    """Extend active reservations of checkout lines.
+
+    Expired reservations are not extended, as their stock could be taken already.
+    """
+    if reservation_length is None:
+        reservation_length = settings.CHECKOUT_RESERVATION_LENGTH
+    now = timezone.now()
+    return Reservation.objects.filter(
+        checkout_line_id__in=list(checkout_line_ids),
+        reserved_until__gt=now,
+    ).update(reserved_until=now + reservation_length)
+
+
+def release_reservations(checkout_line_ids: Iterable["UUID"]) -> int:
+    deleted, _ = Reservation.objects.filter(
+        checkout_line_id__in=list(checkout_line_ids),
+    ).delete()
+    return deleted
+
+
+def delete_expired_reservations(batch_size: int = RESERVATIONS_BATCH_SIZE) -> int:
+    """Delete a batch of expired reservations.
+
+    Every batch is a short statement on its own, so the sweeper never holds locks
+    on many rows at once. Return the number of deleted reservations.
+    """
+    expired_ids = list(
+        Reservation.objects.filter(reserved_until__lte=timezone.now())
+        .order_by("reserved_until")
+        .values_list("pk", flat=True)[:batch_size],
+    )
+    if not expired_ids:
+        return 0
+    deleted, _ = Reservation.objects.filter(
+        pk__in=expired_ids,
+        reserved_until__lte=timezone.now(),
+    ).delete()
+    return deleted
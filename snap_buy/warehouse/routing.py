@@ -0,0 +1,95 @@
+from collections import defaultdict
+from uuid import UUID
+
+from django.db import transaction
+
+from snap_buy.shipping.models import ShippingZone
+
+from . import WarehouseClickAndCollectOption
+from .models import ChannelWarehouse
+from .models import Warehouse
+from .models import WarehouseRoute
+
+CLICK_AND_COLLECT_OPTIONS = [
+    WarehouseClickAndCollectOption.LOCAL_STOCK,
+    WarehouseClickAndCollectOption.ALL_WAREHOUSES,
+]
+
+
+def _get_routes() -> set[tuple[int, str, UUID]]:
+    """Return `(channel_id, country, warehouse_id)` triples of the current topology.
+
+    Click and collect warehouses of a channel get a route with an empty country.
+    """
+    channel_warehouses = set(
+        ChannelWarehouse.objects.values_list("channel", "warehouse"),
+    )
+    zone_channels = defaultdict(set)
+    for zone_id, channel_id in ShippingZone.channels.through.objects.values_list(
+        "shippingzone_id",
+        "channel_id",
+    ):
+        zone_channels[zone_id].add(channel_id)
+    zone_warehouses = defaultdict(set)
+    for warehouse_id, zone_id in Warehouse.shipping_zones.through.objects.values_list(
+        "warehouse",
+        "shippingzone_id",
+    ):
+        zone_warehouses[zone_id].add(warehouse_id)
+
+    routes: set[tuple[int, str, UUID]] = set()
+    for zone in ShippingZone.objects.only("id", "countries"):
+        for channel_id in zone_channels[zone.pk]:
+            for warehouse_id in zone_warehouses[zone.pk]:
+                if (channel_id, warehouse_id) not in channel_warehouses:
+                    continue
+                routes.update(
+                    (channel_id, country.code, warehouse_id)
+                    for country in zone.countries
+                )
+    cc_warehouses = set(
+        Warehouse.objects.filter(
+            click_and_collect_option__in=CLICK_AND_COLLECT_OPTIONS,
+        ).values_list("pk", flat=True),
+    )
+    routes.update(
+        (channel_id, "", warehouse_id)
+        for channel_id, warehouse_id in channel_warehouses
+        if warehouse_id in cc_warehouses
+    )
+    return routes
+
+
+def rebuild_warehouse_routes() -> int:
+    """Rebuild the routing table from shipping zones, channels and warehouses.
+
+    Only the routes which changed are deleted or inserted. Return the number of
+    changed routes.
+    """
+    routes = _get_routes()
+    with transaction.atomic():
+        existing = {
+            (channel_id, country, warehouse_id): pk
+            for pk, channel_id, country, warehouse_id in (
+                WarehouseRoute.objects.select_for_update().values_list(
+                    "pk",
+                    "channel_id",
+                    "country",
+                    "warehouse_id",
+                )
+            )
+        }
+        stale_ids = [pk for route, pk in existing.items() if route not in routes]
+        WarehouseRoute.objects.filter(pk__in=stale_ids).delete()
+        new_routes = [
+            WarehouseRoute(channel_id=channel_id, country=country, warehouse_id=pk)
+            for channel_id, country, pk in routes
+            if (channel_id, country, pk) not in existing
+        ]
+        WarehouseRoute.objects.bulk_create(new_routes, ignore_conflicts=True)
+    return len(stale_ids) + len(new_routes)
+
+
+def schedule_warehouse_routes_rebuild():
+    """Rebuild the routing table once the transaction commits."""
+    transaction.on_commit(rebuild_warehouse_routes)
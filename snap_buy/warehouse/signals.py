@@ -0,0 +1,153 @@
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from snap_buy.shipping.models import ShippingZone
+
+from . import StockMovementType
+from .allocations import adjust_stocks_allocated_quantity
+from .ledger import StockMovementEntry
+from .ledger import record_stock_movements
+from .models import Allocation
+from .models import ChannelWarehouse
+from .models import PreorderAllocation
+from .models import Stock
+from .models import Warehouse
+from .preorders import adjust_preorder_quantity_allocated
+from .routing import schedule_warehouse_routes_rebuild
+from .stock_summary import adjust_variant_stock_summaries
+
+
+@receiver(post_save, sender=Stock)
+def stock_created(sender, instance, created=False, **kwargs):
+    if created:
+        adjust_variant_stock_summaries(
+            {instance.product_variant_id: (instance.quantity, 0)},
+        )
+        record_stock_movements(
+            [
+                StockMovementEntry(
+                    instance.pk,
+                    StockMovementType.ADJUST,
+                    quantity=instance.quantity,
+                ),
+            ],
+        )
+
+
+@receiver(pre_delete, sender=Stock)
+def stock_pre_delete(sender, instance, **kwargs):
+    # The ledger looks the warehouse up from the stock, so the movement is
+    # recorded before the stock is gone. Its allocations are deleted after this
+    # and record their own deallocations.
+    stock = (
+        Stock.objects.filter(pk=instance.pk)
+        .annotate(allocated=Coalesce(Sum("allocations__quantity_allocated"), 0))
+        .values_list("quantity", "quantity_allocated", "allocated")
+        .first()
+    )
+    if stock is None:
+        return
+    quantity, quantity_allocated, allocated = stock
+    record_stock_movements(
+        [
+            StockMovementEntry(
+                instance.pk,
+                StockMovementType.ADJUST,
+                quantity=-quantity,
+                quantity_allocated=allocated - quantity_allocated,
+            ),
+        ],
+    )
+
+
+@receiver(post_delete, sender=Stock)
+def stock_deleted(sender, instance, **kwargs):
+    # Allocations of the stock are deleted before it and adjust the summary
+    # on their own. When the variant is deleted, its summary may be gone already
+    # and must not be recreated.
+    adjust_variant_stock_summaries(
+        {instance.product_variant_id: (-instance.quantity, 0)},
+        rebuild_missing=False,
+    )
+
+
+@receiver(pre_save, sender=Allocation)
+def allocation_pre_save(sender, instance, **kwargs):
+    # The stored stock and quantity are compared with the saved ones after save.
+    instance._previous_allocation = (  # noqa: SLF001
+        None
+        if instance._state.adding  # noqa: SLF001
+        else Allocation.objects.filter(pk=instance.pk)
+        .values_list("stock_id", "quantity_allocated")
+        .first()
+    )
+
+
+@receiver(post_save, sender=Allocation)
+def allocation_saved(sender, instance, **kwargs):
+    previous = instance.__dict__.pop("_previous_allocation", None)
+    if not isinstance(instance.quantity_allocated, int):
+        instance.refresh_from_db(fields=["quantity_allocated"])
+    stock_deltas = {instance.stock_id: instance.quantity_allocated}
+    if previous is not None:
+        previous_stock_id, previous_quantity = previous
+        stock_deltas[previous_stock_id] = (
+            stock_deltas.get(previous_stock_id, 0) - previous_quantity
+        )
+    stock_deltas = {
+        stock_id: delta for stock_id, delta in stock_deltas.items() if delta
+    }
+    if stock_deltas:
+        adjust_stocks_allocated_quantity(stock_deltas)
+
+
+@receiver(post_delete, sender=Allocation)
+def allocation_deleted(sender, instance, **kwargs):
+    adjust_stocks_allocated_quantity(
+        {instance.stock_id: -instance.quantity_allocated},
+        rebuild_missing_summaries=False,
+    )
+
+
+@receiver(post_save, sender=PreorderAllocation)
+def preorder_allocation_created(sender, instance, created=False, **kwargs):
+    if created:
+        adjust_preorder_quantity_allocated(
+            {instance.product_variant_channel_listing_id: instance.quantity},
+        )
+
+
+@receiver(post_delete, sender=PreorderAllocation)
+def preorder_allocation_deleted(sender, instance, **kwargs):
+    adjust_preorder_quantity_allocated(
+        {instance.product_variant_channel_listing_id: -instance.quantity},
+    )
+
+
+@receiver(post_save, sender=ChannelWarehouse)
+@receiver(post_delete, sender=ChannelWarehouse)
+@receiver(post_save, sender=ShippingZone)
+@receiver(post_delete, sender=ShippingZone)
+@receiver(post_delete, sender=Warehouse)
+def warehouse_topology_changed(sender, instance, **kwargs):
+    schedule_warehouse_routes_rebuild()
+
+
+@receiver(post_save, sender=Warehouse)
+def warehouse_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    if update_fields is None or "click_and_collect_option" in update_fields:
+        schedule_warehouse_routes_rebuild()
+
+
+@receiver(m2m_changed, sender=Warehouse.channels.through)
+@receiver(m2m_changed, sender=ShippingZone.channels.through)
+@receiver(m2m_changed, sender=Warehouse.shipping_zones.through)
+def warehouse_topology_relations_changed(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        schedule_warehouse_routes_rebuild()
@@ -0,0 +1,234 @@
+from collections.abc import Iterable
+from dataclasses import dataclass
+from itertools import islice
+from typing import NamedTuple
+from uuid import UUID
+
+from django.db import IntegrityError
+from django.db import connection
+from django.db import transaction
+from django.db.models import Q
+
+from snap_buy.product.models import ProductVariant
+
+from . import StockMovementType
+from .ledger import StockMovementEntry
+from .ledger import record_stock_movements
+from .models import Stock
+from .models import Warehouse
+from .stock_summary import adjust_variant_stock_summaries
+
+STOCK_ADJUSTMENTS_CHUNK_SIZE = 1000
+
+UPDATE_STOCKS_QUANTITY_SQL = """
+UPDATE warehouse_stock
+SET quantity = adjustment.quantity
+FROM unnest(%(ids)s::bigint[], %(quantities)s::integer[])
+    AS adjustment(id, quantity)
+WHERE warehouse_stock.id = adjustment.id
+"""
+
+
+@dataclass
+class StockAdjustment:
+    """Change of a variant quantity in a warehouse.
+
+    The variant is given by `variant_id` or `sku`. The quantity is added to the
+    stock, or replaces it when `absolute` is set.
+    """
+
+    warehouse_id: UUID
+    quantity: int
+    variant_id: int | None = None
+    sku: str | None = None
+    absolute: bool = False
+
+
+class StockAdjustmentResult(NamedTuple):
+    updated: int = 0
+    created: int = 0
+    skipped: int = 0
+
+    def __add__(self, other):
+        return StockAdjustmentResult(
+            updated=self.updated + other.updated,
+            created=self.created + other.created,
+            skipped=self.skipped + other.skipped,
+        )
+
+
+def adjust_stocks(
+    adjustments: Iterable[StockAdjustment],
+    chunk_size: int = STOCK_ADJUSTMENTS_CHUNK_SIZE,
+    movement_type: str = StockMovementType.ADJUST,
+) -> StockAdjustmentResult:
+    """Apply stock adjustments in chunks.
+
+    Every chunk runs in its own transaction: existing stocks are locked in pk
+    order and updated with a single statement, missing stocks are created with a
+    single insert. The changes are recorded in the stock ledger as movements of
+    `movement_type`. Adjustments of unknown warehouses or variants are skipped.
+    """
+    adjustments = iter(adjustments)
+    result = StockAdjustmentResult()
+    while chunk := list(islice(adjustments, chunk_size)):
+        result += _adjust_stocks_chunk(chunk, movement_type)
+    return result
+
+
+def _resolve_variant_ids(
+    adjustments: list[StockAdjustment],
+) -> dict[int | str, int]:
+    variant_ids = {
+        adjustment.variant_id
+        for adjustment in adjustments
+        if adjustment.variant_id is not None
+    }
+    skus = {
+        adjustment.sku for adjustment in adjustments if adjustment.variant_id is None
+    }
+    variants = ProductVariant.objects.filter(
+        Q(pk__in=variant_ids) | Q(sku__in=skus),
+    ).values_list("pk", "sku")
+    resolved = {}
+    for pk, sku in variants:
+        resolved[pk] = pk
+        if sku is not None:
+            resolved[sku] = pk
+    return resolved
+
+
+def _collapse_adjustments(
+    adjustments: list[StockAdjustment],
+) -> tuple[dict[tuple[UUID, int], tuple[bool, int]], int]:
+    """Merge adjustments of the same stock, in order.
+
+    Return `(absolute, quantity)` keyed by warehouse and variant ids, and the
+    number of skipped adjustments.
+    """
+    variant_ids = _resolve_variant_ids(adjustments)
+    warehouse_ids = set(
+        Warehouse.objects.filter(
+            pk__in={adjustment.warehouse_id for adjustment in adjustments},
+        ).values_list("pk", flat=True),
+    )
+    collapsed: dict[tuple[UUID, int], tuple[bool, int]] = {}
+    skipped = 0
+    for adjustment in adjustments:
+        variant_key = (
+            adjustment.variant_id
+            if adjustment.variant_id is not None
+            else adjustment.sku
+        )
+        variant_id = variant_ids.get(variant_key) if variant_key is not None else None
+        if variant_id is None or adjustment.warehouse_id not in warehouse_ids:
+            skipped += 1
+            continue
+        key = (adjustment.warehouse_id, variant_id)
+        absolute, quantity = collapsed.get(key, (False, 0))
+        if adjustment.absolute:
+            collapsed[key] = (True, adjustment.quantity)
+        else:
+            collapsed[key] = (absolute, quantity + adjustment.quantity)
+    return collapsed, skipped
+
+
+def _lock_stocks(
+    warehouse_ids: set[UUID],
+    variant_ids: set[int],
+) -> dict[tuple[UUID, int], tuple[int, int]]:
+    """Lock the stocks in pk order and return their pks and quantities."""
+    # The filter may match a few more stocks than adjusted; they are locked but
+    # left untouched.
+    return {
+        (warehouse_id, variant_id): (pk, quantity)
+        for pk, warehouse_id, variant_id, quantity in (
+            Stock.objects.filter(
+                warehouse_id__in=warehouse_ids,
+                product_variant_id__in=variant_ids,
+            )
+            .order_by("pk")
+            .select_for_update(of=("self",))
+            .values_list("pk", "warehouse", "product_variant", "quantity")
+        )
+    }
+
+
+def _create_missing_stocks(
+    collapsed: dict[tuple[UUID, int], tuple[bool, int]],
+) -> tuple[dict[tuple[UUID, int], tuple[int, int]], list[Stock]]:
+    """Lock the adjusted stocks and create the missing ones.
+
+    Return the locked stocks which existed before and the created stocks. When a
+    concurrent writer creates some of the stocks first, the insert fails and the
+    stocks are locked again, so they are adjusted like the other existing stocks.
+    """
+    warehouse_ids = {warehouse_id for warehouse_id, _variant_id in collapsed}
+    variant_ids = {variant_id for _warehouse_id, variant_id in collapsed}
+    while True:
+        existing = _lock_stocks(warehouse_ids, variant_ids)
+        new_stocks = [
+            Stock(
+                warehouse_id=warehouse_id,
+                product_variant_id=variant_id,
+                quantity=quantity,
+            )
+            for (warehouse_id, variant_id), (_absolute, quantity) in collapsed.items()
+            if (warehouse_id, variant_id) not in existing
+        ]
+        try:
+            with transaction.atomic():
+                Stock.objects.bulk_create(new_stocks)
+        except IntegrityError:
+            continue
+        return existing, new_stocks
+
+
+def _adjust_stocks_chunk(
+    adjustments: list[StockAdjustment],
+    movement_type: str,
+) -> StockAdjustmentResult:
+    collapsed, skipped = _collapse_adjustments(adjustments)
+    if not collapsed:
+        return StockAdjustmentResult(skipped=skipped)
+    with transaction.atomic():
+        existing, new_stocks = _create_missing_stocks(collapsed)
+        updates: dict[int, int] = {}
+        movements = [
+            StockMovementEntry(stock.pk, movement_type, quantity=stock.quantity)
+            for stock in new_stocks
+        ]
+        summary_deltas: dict[int, tuple[int, int]] = {}
+        for stock in new_stocks:
+            delta = summary_deltas.get(stock.product_variant_id, (0, 0))[0]
+            summary_deltas[stock.product_variant_id] = (delta + stock.quantity, 0)
+        for (warehouse_id, variant_id), (pk, old_quantity) in existing.items():
+            if (warehouse_id, variant_id) not in collapsed:
+                continue
+            absolute, quantity = collapsed[warehouse_id, variant_id]
+            new_quantity = quantity if absolute else old_quantity + quantity
+            if new_quantity == old_quantity:
+                continue
+            delta = summary_deltas.get(variant_id, (0, 0))[0]
+            summary_deltas[variant_id] = (delta + new_quantity - old_quantity, 0)
+            updates[pk] = new_quantity
+            movements.append(
+                StockMovementEntry(
+                    pk,
+                    movement_type,
+                    quantity=new_quantity - old_quantity,
+                ),
+            )
+        if updates:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    UPDATE_STOCKS_QUANTITY_SQL,
+                    {"ids": list(updates), "quantities": list(updates.values())},
+                )
+        adjust_variant_stock_summaries(summary_deltas)
+        record_stock_movements(movements)
+    return StockAdjustmentResult(
+        updated=len(updates),
+        created=len(new_stocks),
+        skipped=skipped,
+    )
@@ -0,0 +1,137 @@
+from collections.abc import Iterable
+from collections.abc import Mapping
+
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import F
+from django.db.models import IntegerField
+from django.db.models import Sum
+from django.db.models import Value
+from django.db.models import When
+from django.utils import timezone
+
+from .models import ProductVariantStockSummary
+from .models import Stock
+
+STOCK_SUMMARY_BATCH_SIZE = 1000
+
+
+def _delta_case(deltas: Mapping[int, int]) -> Case:
+    return Case(
+        *[
+            When(product_variant_id=variant_id, then=Value(delta))
+            for variant_id, delta in deltas.items()
+        ],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def adjust_variant_stock_summaries(
+    deltas: Mapping[int, tuple[int, int]],
+    *,
+    rebuild_missing: bool = True,
+):
+    """Apply stock changes to the summaries of variants.
+
+    `deltas` maps a variant id to a `(quantity, quantity_allocated)` change.
+    Missing summaries are rebuilt from the stocks instead, unless
+    `rebuild_missing` is off, as in delete paths where the summary may already be
+    deleted together with its variant.
+    """
+    deltas = {
+        variant_id: delta for variant_id, delta in sorted(deltas.items()) if any(delta)
+    }
+    if not deltas:
+        return
+    quantity_deltas = {variant_id: delta[0] for variant_id, delta in deltas.items()}
+    allocated_deltas = {variant_id: delta[1] for variant_id, delta in deltas.items()}
+    summaries = ProductVariantStockSummary.objects.filter(
+        product_variant_id__in=list(deltas),
+    )
+    with transaction.atomic():
+        updated = summaries.update(
+            quantity=F("quantity") + _delta_case(quantity_deltas),
+            quantity_allocated=F("quantity_allocated") + _delta_case(allocated_deltas),
+            updated_at=timezone.now(),
+        )
+        if rebuild_missing and updated < len(deltas):
+            existing = set(summaries.values_list("product_variant_id", flat=True))
+            rebuild_variant_stock_summaries(
+                [variant_id for variant_id in deltas if variant_id not in existing],
+            )
+
+
+def calculate_variant_stock_totals(
+    variant_ids: Iterable[int],
+) -> dict[int, tuple[int, int]]:
+    """Return `(quantity, quantity_allocated)` of variants aggregated from stocks.
+
+    `Stock.quantity_allocated` is the authoritative allocated counter, callers
+    update it before the allocations it counts are written.
+    """
+    variant_ids = list(variant_ids)
+    totals = dict.fromkeys(variant_ids, (0, 0))
+    stock_totals = (
+        Stock.objects.filter(product_variant_id__in=variant_ids)
+        .order_by()
+        .values("product_variant_id")
+        .annotate(
+            total_quantity=Sum("quantity"),
+            total_allocated=Sum("quantity_allocated"),
+        )
+        .values_list("product_variant_id", "total_quantity", "total_allocated")
+    )
+    for variant_id, quantity, quantity_allocated in stock_totals:
+        totals[variant_id] = (quantity or 0, quantity_allocated or 0)
+    return totals
+
+
+def rebuild_variant_stock_summaries(variant_ids: Iterable[int]) -> int:
+    """Recalculate the summaries of variants from their stocks."""
+    totals = calculate_variant_stock_totals(variant_ids)
+    ProductVariantStockSummary.objects.bulk_create(
+        [
+            ProductVariantStockSummary(
+                product_variant_id=variant_id,
+                quantity=quantity,
+                quantity_allocated=quantity_allocated,
+            )
+            for variant_id, (quantity, quantity_allocated) in totals.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["product_variant"],
+        update_fields=["quantity", "quantity_allocated", "updated_at"],
+    )
+    return len(totals)
+
+
+def reconcile_variant_stock_summaries(variant_ids: Iterable[int]) -> list[int]:
+    """Repair summaries which drifted from the stocks.
+
+    Return ids of the repaired variants.
+    """
+    variant_ids = list(variant_ids)
+    with transaction.atomic():
+        # Locking the summaries first makes concurrent adjustments wait, so the
+        # totals below can't miss a change that is applied to the summary later.
+        summaries = {
+            variant_id: (quantity, quantity_allocated)
+            for variant_id, quantity, quantity_allocated in (
+                ProductVariantStockSummary.objects.filter(
+                    product_variant_id__in=variant_ids,
+                )
+                .order_by("pk")
+                .select_for_update()
+                .values_list("product_variant_id", "quantity", "quantity_allocated")
+            )
+        }
+        totals = calculate_variant_stock_totals(variant_ids)
+        drifted = [
+            variant_id
+            for variant_id, expected in totals.items()
+            if summaries.get(variant_id) != expected
+        ]
+        if drifted:
+            rebuild_variant_stock_summaries(drifted)
+    return drifted
@@ -0,0 +1,55 @@
+from celery import shared_task
+from django.conf import settings
+
+from snap_buy.core.utils.batches import iter_within_time_budget
+from snap_buy.core.utils.batches import run_batches
+
+from .ledger import create_stock_movement_partitions
+from .ledger import prune_stock_snapshots
+from .ledger import take_stock_snapshot
+from .models import Warehouse
+from .preorders import convert_ended_preorder_allocations
+from .preorders import deactivate_ended_preorders
+from .reservations import RESERVATIONS_BATCH_SIZE
+from .reservations import delete_expired_reservations
+
+
+@shared_task()
+def delete_expired_reservations_task():
+    """Delete expired checkout reservations batch by batch."""
+    return run_batches(
+        delete_expired_reservations,
+        RESERVATIONS_BATCH_SIZE,
+        settings.BATCH_TASKS_TIME_BUDGET,
+    )
+
+
+@shared_task()
+def convert_ended_preorders_task():
+    """Convert preorder allocations of ended preorders into stock allocations.
+
+    Variants are deactivated once all of their preorder allocations are converted.
+    """
+    after_order_id = None
+    for _ in iter_within_time_budget(settings.BATCH_TASKS_TIME_BUDGET):
+        batch = convert_ended_preorder_allocations(after_order_id=after_order_id)
+        if batch.last_order_id is None:
+            deactivate_ended_preorders()
+            break
+        after_order_id = batch.last_order_id
+
+
+@shared_task()
+def create_stock_movement_partitions_task():
+    create_stock_movement_partitions()
+
+
+@shared_task()
+def take_stock_snapshots_task():
+    """Snapshot stocks of every warehouse, one warehouse per transaction.
+
+    Snapshots past the retention period are deleted afterwards.
+    """
+    for warehouse_id in Warehouse.objects.values_list("pk", flat=True):
+        take_stock_snapshot(warehouse_id)
+    prune_stock_snapshots()
@@ -1 +1,809 @@
-# Create your tests here.
+import datetime
+from decimal import Decimal
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from snap_buy.channel import AllocationStrategy
+from snap_buy.checkout.models import Checkout
+from snap_buy.checkout.models import CheckoutLine
+from snap_buy.order import OrderOrigin
+from snap_buy.order.models import Order
+from snap_buy.order.models import OrderLine
+from snap_buy.product.models import ProductVariant
+from snap_buy.product.models import ProductVariantChannelListing
+from snap_buy.shipping.models import ShippingZone
+from snap_buy.users.models import Address
+from snap_buy.warehouse import WarehouseClickAndCollectOption
+from snap_buy.warehouse import stock_adjustments
+from snap_buy.warehouse.allocations import InsufficientStockError
+from snap_buy.warehouse.allocations import StockCandidate
+from snap_buy.warehouse.allocations import _sort_candidates
+from snap_buy.warehouse.allocations import allocate_stocks
+from snap_buy.warehouse.allocations import create_allocations
+from snap_buy.warehouse.allocations import lock_stock_candidates
+from snap_buy.warehouse.click_and_collect import resolve_click_and_collect_warehouses
+from snap_buy.warehouse.ledger import get_stock_quantities_at
+from snap_buy.warehouse.ledger import prune_stock_snapshots
+from snap_buy.warehouse.ledger import take_stock_snapshot
+from snap_buy.warehouse.models import Allocation
+from snap_buy.warehouse.models import ChannelWarehouse
+from snap_buy.warehouse.models import PreorderAllocation
+from snap_buy.warehouse.models import ProductVariantStockSummary
+from snap_buy.warehouse.models import Stock
+from snap_buy.warehouse.models import StockMovement
+from snap_buy.warehouse.models import StockSnapshot
+from snap_buy.warehouse.models import Warehouse
+from snap_buy.warehouse.preorders import adjust_preorder_quantity_allocated
+from snap_buy.warehouse.preorders import allocate_preorders
+from snap_buy.warehouse.preorders import convert_ended_preorder_allocations
+from snap_buy.warehouse.preorders import deactivate_ended_preorders
+from snap_buy.warehouse.reservations import reserve_stocks
+from snap_buy.warehouse.routing import rebuild_warehouse_routes
+from snap_buy.warehouse.stock_adjustments import StockAdjustment
+from snap_buy.warehouse.stock_adjustments import adjust_stocks
+
+pytestmark = pytest.mark.django_db
+
+CART_SIZES = [1, 20, 100]
+
+
+@pytest.fixture()
+def warehouses(channel) -> dict[str, Warehouse]:
+    warehouses = {}
+    for option in (
+        WarehouseClickAndCollectOption.LOCAL_STOCK,
+        WarehouseClickAndCollectOption.ALL_WAREHOUSES,
+    ):
+        warehouse = Warehouse.objects.create(
+            name=f"Warehouse {option}",
+            slug=f"warehouse-{option}",
+            address=Address.objects.create(country="US"),
+            click_and_collect_option=option,
+        )
+        ChannelWarehouse.objects.create(channel=channel, warehouse=warehouse)
+        warehouses[option] = warehouse
+    return warehouses
+
+
+@pytest.fixture()
+def variants(product) -> list[ProductVariant]:
+    return ProductVariant.objects.bulk_create(
+        [
+            ProductVariant(product=product, sku=f"SKU-{index}")
+            for index in range(max(CART_SIZES))
+        ],
+    )
+
+
+@pytest.fixture()
+def stocks(warehouses, variants) -> list[Stock]:
+    local = warehouses[WarehouseClickAndCollectOption.LOCAL_STOCK]
+    return Stock.objects.bulk_create(
+        [
+            Stock(warehouse=local, product_variant=variant, quantity=10)
+            for variant in variants
+        ],
+    )
+
+
+def _create_order_lines(channel, variants, quantity) -> list[OrderLine]:
+    order = Order.objects.create(
+        number=1,
+        channel=channel,
+        origin=OrderOrigin.CHECKOUT,
+        currency="USD",
+    )
+    return OrderLine.objects.bulk_create(
+        [
+            OrderLine(
+                order=order,
+                variant=variant,
+                product_name=variant.sku,
+                is_shipping_required=True,
+                is_gift_card=False,
+                quantity=quantity,
+                currency="USD",
+                unit_price_net_amount=Decimal(10),
+                unit_price_gross_amount=Decimal(10),
+                total_price_net_amount=Decimal(10) * quantity,
+                total_price_gross_amount=Decimal(10) * quantity,
+            )
+            for variant in variants
+        ],
+    )
+
+
+def test_resolve_click_and_collect_warehouses_with_local_stock(
+    channel,
+    warehouses,
+    variants,
+    stocks,
+):
+    lines = [(variant.pk, 2) for variant in variants[:3]]
+
+    result = resolve_click_and_collect_warehouses(channel.pk, lines)
+
+    by_option = {warehouse.click_and_collect_option: warehouse for warehouse in result}
+    local = by_option[WarehouseClickAndCollectOption.LOCAL_STOCK]
+    assert local.has_local_stock
+    assert local.is_applicable
+    assert local.available_quantities == {variant.pk: 10 for variant in variants[:3]}
+    all_warehouses = by_option[WarehouseClickAndCollectOption.ALL_WAREHOUSES]
+    assert not all_warehouses.has_local_stock
+    assert all_warehouses.is_applicable
+
+
+def test_resolve_click_and_collect_warehouses_insufficient_local_stock(
+    channel,
+    warehouses,
+    variants,
+    stocks,
+):
+    lines = [(variants[0].pk, 6), (variants[0].pk, 6)]
+
+    result = resolve_click_and_collect_warehouses(channel.pk, lines)
+
+    local = next(
+        warehouse
+        for warehouse in result
+        if warehouse.warehouse_id
+        == warehouses[WarehouseClickAndCollectOption.LOCAL_STOCK].pk
+    )
+    assert not local.has_local_stock
+    assert not local.is_applicable
+
+
+def test_resolve_click_and_collect_warehouses_preorder_only(
+    channel,
+    warehouses,
+    variants,
+):
+    ProductVariant.objects.filter(pk=variants[0].pk).update(is_preorder=True)
+
+    result = resolve_click_and_collect_warehouses(channel.pk, [(variants[0].pk, 5)])
+
+    assert {warehouse.warehouse_id for warehouse in result} == {
+        warehouse.pk for warehouse in warehouses.values()
+    }
+    assert all(warehouse.is_applicable for warehouse in result)
+
+
+@pytest.mark.parametrize("cart_size", CART_SIZES)
+def test_resolve_click_and_collect_warehouses_queries(
+    cart_size,
+    channel,
+    variants,
+    stocks,
+    django_assert_num_queries,
+):
+    cart_variants = variants[:cart_size]
+    order_lines = _create_order_lines(channel, cart_variants, quantity=1)
+    lines_qs = OrderLine.objects.filter(pk__in=[line.pk for line in order_lines])
+    cart = [(variant.pk, 1) for variant in cart_variants]
+
+    with CaptureQueriesContext(connection) as legacy:
+        list(Warehouse.objects.applicable_for_click_and_collect(lines_qs, channel.pk))
+    with django_assert_num_queries(1):
+        resolve_click_and_collect_warehouses(channel.pk, cart)
+
+    assert len(legacy.captured_queries) > 1
+
+
+@pytest.mark.parametrize("deleted", ["variant", "product"])
+def test_delete_variant_with_allocated_stock(deleted, channel, warehouses, variants):
+    variant = variants[0]
+    stock = Stock.objects.create(
+        warehouse=warehouses[WarehouseClickAndCollectOption.LOCAL_STOCK],
+        product_variant=variant,
+        quantity=10,
+    )
+    [line] = _create_order_lines(channel, [variant], quantity=2)
+    Allocation.objects.create(order_line=line, stock=stock, quantity_allocated=2)
+    assert ProductVariantStockSummary.objects.filter(product_variant=variant).exists()
+
+    (variant if deleted == "variant" else variant.product).delete()
+
+    # Foreign keys are deferred, so check them before the test transaction ends.
+    connection.check_constraints()
+    assert not ProductVariantStockSummary.objects.filter(
+        product_variant_id=variant.pk,
+    ).exists()
+
+
+def test_create_allocations_rebuilds_missing_summary(channel, variants, stocks):
+    variant = variants[0]
+    [line] = _create_order_lines(channel, [variant], quantity=2)
+
+    create_allocations(
+        [Allocation(order_line=line, stock=stocks[0], quantity_allocated=2)],
+    )
+
+    summary = ProductVariantStockSummary.objects.get(product_variant=variant)
+    assert (summary.quantity, summary.quantity_allocated) == (
+        stocks[0].quantity,
+        line.quantity,
+    )
+
+
+@pytest.fixture()
+def allocation_stocks(warehouses, variants) -> dict[str, Stock]:
+    # The local warehouse comes first in the channel but has less stock.
+    return {
+        option: Stock.objects.create(
+            warehouse=warehouse,
+            product_variant=variants[0],
+            quantity=quantity,
+        )
+        for (option, warehouse), quantity in zip(
+            warehouses.items(),
+            [5, 10],
+            strict=True,
+        )
+    }
+
+
+def _create_collection_order_line(channel, stocks, quantity) -> OrderLine:
+    # Orders collected from this warehouse are allocated from all warehouses.
+    stock = stocks[WarehouseClickAndCollectOption.ALL_WAREHOUSES]
+    [line] = _create_order_lines(channel, [stock.product_variant], quantity)
+    line.order.collection_point = stock.warehouse
+    line.order.save(update_fields=["collection_point"])
+    return line
+
+
+def _get_stock_ctid(stock: Stock) -> str:
+    # Every UPDATE of a row writes a new version of it at another location.
+    return (
+        Stock.objects.filter(pk=stock.pk)
+        .annotate(ctid=RawSQL("ctid::text", ()))
+        .values_list("ctid", flat=True)
+        .get()
+    )
+
+
+@pytest.mark.parametrize(
+    ("allocation_strategy", "allocated_option"),
+    [
+        (
+            AllocationStrategy.PRIORITIZE_SORTING_ORDER,
+            WarehouseClickAndCollectOption.LOCAL_STOCK,
+        ),
+        (
+            AllocationStrategy.PRIORITIZE_HIGH_STOCK,
+            WarehouseClickAndCollectOption.ALL_WAREHOUSES,
+        ),
+    ],
+)
+def test_allocate_stocks(
+    allocation_strategy,
+    allocated_option,
+    channel,
+    allocation_stocks,
+):
+    channel.allocation_strategy = allocation_strategy
+    channel.save(update_fields=["allocation_strategy"])
+    line = _create_collection_order_line(channel, allocation_stocks, quantity=3)
+    [other_stock] = [
+        stock
+        for option, stock in allocation_stocks.items()
+        if option != allocated_option
+    ]
+    other_stock_ctid = _get_stock_ctid(other_stock)
+
+    [allocation] = allocate_stocks(line.order, [line])
+
+    stock = allocation_stocks[allocated_option]
+    assert (allocation.stock_id, allocation.quantity_allocated) == (
+        stock.pk,
+        line.quantity,
+    )
+    stock.refresh_from_db()
+    assert stock.quantity_allocated == line.quantity
+    # Candidates which don't get allocated aren't written.
+    assert _get_stock_ctid(other_stock) == other_stock_ctid
+
+
+def test_allocate_stocks_splits_line_across_warehouses(channel, allocation_stocks):
+    quantity = sum(stock.quantity for stock in allocation_stocks.values()) - 1
+    line = _create_collection_order_line(channel, allocation_stocks, quantity)
+
+    allocations = allocate_stocks(line.order, [line])
+
+    allocated = {
+        allocation.stock_id: allocation.quantity_allocated for allocation in allocations
+    }
+    local = allocation_stocks[WarehouseClickAndCollectOption.LOCAL_STOCK]
+    other = allocation_stocks[WarehouseClickAndCollectOption.ALL_WAREHOUSES]
+    assert allocated == {local.pk: local.quantity, other.pk: other.quantity - 1}
+
+
+def test_allocate_stocks_insufficient_stock(channel, allocation_stocks):
+    quantity = sum(stock.quantity for stock in allocation_stocks.values()) + 1
+    line = _create_collection_order_line(channel, allocation_stocks, quantity)
+
+    with pytest.raises(InsufficientStockError) as error:
+        allocate_stocks(line.order, [line])
+
+    assert error.value.lines == [line]
+    assert not Allocation.objects.exists()
+    assert not Stock.objects.filter(quantity_allocated__gt=0).exists()
+
+
+def test_lock_stock_candidates(channel, warehouses, variants, allocation_stocks):
+    local = allocation_stocks[WarehouseClickAndCollectOption.LOCAL_STOCK]
+    [line] = _create_order_lines(channel, [variants[0]], quantity=2)
+    Allocation.objects.create(order_line=line, stock=local, quantity_allocated=2)
+    reserve_stocks(_create_checkout_lines(channel, [variants[0]]), channel)
+
+    candidates = lock_stock_candidates(
+        Stock.objects.all(),
+        [variants[0].pk],
+        channel.pk,
+    )
+
+    available = {
+        stock.pk: (stock.available, stock.sort_order)
+        for stock in candidates[variants[0].pk]
+    }
+    other = allocation_stocks[WarehouseClickAndCollectOption.ALL_WAREHOUSES]
+    # The reservation is taken from the first warehouse of the channel.
+    assert available == {
+        local.pk: (local.quantity - line.quantity - 1, 0),
+        other.pk: (other.quantity, 1),
+    }
+
+
+def test_sort_candidates_puts_unsorted_warehouses_last():
+    candidates = [
+        StockCandidate(pk=1, variant_id=1, available=1, sort_order=None),
+        StockCandidate(pk=2, variant_id=1, available=1, sort_order=1),
+        StockCandidate(pk=3, variant_id=1, available=1, sort_order=0),
+    ]
+
+    sorted_candidates = _sort_candidates(
+        candidates,
+        AllocationStrategy.PRIORITIZE_SORTING_ORDER,
+    )
+
+    assert [stock.pk for stock in sorted_candidates] == [3, 2, 1]
+
+
+def _create_checkout_lines(channel, variants) -> list[CheckoutLine]:
+    checkout = Checkout.objects.create(channel=channel, currency="USD", country="US")
+    return CheckoutLine.objects.bulk_create(
+        [
+            CheckoutLine(checkout=checkout, variant=variant, quantity=1)
+            for variant in variants
+        ],
+    )
+
+
+@pytest.mark.parametrize("materialized", [False, True])
+def test_annotate_quantities_subtracts_reservations(
+    materialized,
+    channel,
+    variants,
+    stocks,
+    settings,
+):
+    settings.STOCK_SUMMARY_MATERIALIZED = materialized
+    variant = variants[0]
+    [line] = _create_order_lines(channel, [variant], quantity=2)
+    Allocation.objects.create(order_line=line, stock=stocks[0], quantity_allocated=2)
+    reserve_stocks(_create_checkout_lines(channel, [variant]), channel)
+
+    variant = ProductVariant.objects.annotate_quantities().get(pk=variant.pk)
+
+    assert variant.quantity_reserved == 1
+    assert variant.available_quantity == (
+        variant.quantity - variant.quantity_allocated - variant.quantity_reserved
+    )
+
+
+def test_reserve_stocks_queries(channel, variants, stocks):
+    queries = []
+    for cart in (variants[:1], variants[1:]):
+        line_ids = [line.pk for line in _create_checkout_lines(channel, cart)]
+        with CaptureQueriesContext(connection) as context:
+            reserve_stocks(CheckoutLine.objects.filter(pk__in=line_ids), channel)
+        queries.append(len(context.captured_queries))
+
+    assert queries[0] == queries[1]
+
+
+def test_adjust_stocks_adds_delta_to_stock_created_concurrently(
+    warehouses,
+    variants,
+    monkeypatch,
+):
+    warehouse = warehouses[WarehouseClickAndCollectOption.LOCAL_STOCK]
+    stock = Stock.objects.create(
+        warehouse=warehouse,
+        product_variant=variants[0],
+        quantity=10,
+    )
+    lock_stocks = stock_adjustments._lock_stocks  # noqa: SLF001
+    calls = []
+
+    def lock_stocks_missing_first(*args):
+        # The first lock runs before the concurrent writer commits its stock.
+        calls.append(args)
+        return {} if len(calls) == 1 else lock_stocks(*args)
+
+    monkeypatch.setattr(stock_adjustments, "_lock_stocks", lock_stocks_missing_first)
+    adjustment = StockAdjustment(
+        warehouse_id=warehouse.pk,
+        variant_id=variants[0].pk,
+        quantity=5,
+    )
+
+    result = adjust_stocks([adjustment])
+
+    old_quantity = stock.quantity
+    stock.refresh_from_db()
+    assert stock.quantity == old_quantity + adjustment.quantity
+    assert (result.updated, result.created) == (1, 0)
+
+
+def test_adjust_stocks_command_reports_unknown_warehouse(variants, tmp_path):
+    path = tmp_path / "adjustments.csv"
+    path.write_text(f"warehouse,sku,quantity\nunknown,{variants[0].sku},1\n")
+
+    with pytest.raises(CommandError, match="row 1: unknown warehouse unknown"):
+        call_command("adjust_stocks", str(path))
+
+
+def test_saved_allocation_adjusts_stocks_allocated_quantity(
+    channel,
+    warehouses,
+    variants,
+):
+    variant = variants[0]
+    stocks = Stock.objects.bulk_create(
+        [
+            Stock(warehouse=warehouse, product_variant=variant, quantity=10)
+            for warehouse in warehouses.values()
+        ],
+    )
+    [line] = _create_order_lines(channel, [variant], quantity=3)
+    allocation = Allocation.objects.create(
+        order_line=line,
+        stock=stocks[0],
+        quantity_allocated=1,
+    )
+
+    allocation.quantity_allocated = F("quantity_allocated") + 1
+    allocation.save(update_fields=["quantity_allocated"])
+    allocation.stock = stocks[1]
+    allocation.quantity_allocated += 1
+    allocation.save()
+
+    allocated = dict(Stock.objects.values_list("pk", "quantity_allocated"))
+    assert allocated == {stocks[0].pk: 0, stocks[1].pk: line.quantity}
+
+
+def test_deleted_stock_is_recorded_in_ledger(channel, warehouses, variants):
+    stock = Stock.objects.create(
+        warehouse=warehouses[WarehouseClickAndCollectOption.LOCAL_STOCK],
+        product_variant=variants[0],
+        quantity=10,
+    )
+    stock_id = stock.pk
+    [line] = _create_order_lines(channel, [variants[0]], quantity=2)
+    Allocation.objects.create(order_line=line, stock=stock, quantity_allocated=2)
+
+    stock.delete()
+
+    quantities = get_stock_quantities_at(stock.warehouse_id, timezone.now())
+    assert quantities[stock_id] == (0, 0)
+
+
+def test_stock_quantities_include_stocks_missing_from_snapshot(warehouses, variants):
+    warehouse = warehouses[WarehouseClickAndCollectOption.LOCAL_STOCK]
+    taken_at = take_stock_snapshot(warehouse.pk)
+    # A stock created in a transaction which committed after the snapshot.
+    stock = Stock.objects.create(
+        warehouse=warehouse,
+        product_variant=variants[0],
+        quantity=10,
+    )
+    StockMovement.objects.filter(stock_id=stock.pk).update(
+        created_at=taken_at - datetime.timedelta(seconds=1),
+    )
+
+    quantities = get_stock_quantities_at(warehouse.pk, timezone.now())
+
+    assert quantities[stock.pk] == (stock.quantity, 0)
+
+
+def test_prune_stock_snapshots(warehouses, stocks, settings):
+    warehouse_id = stocks[0].warehouse_id
+    old_taken_at = take_stock_snapshot(warehouse_id)
+    StockSnapshot.objects.filter(taken_at=old_taken_at).update(
+        taken_at=old_taken_at - settings.STOCK_SNAPSHOTS_RETENTION * 2,
+    )
+    taken_at = take_stock_snapshot(warehouse_id)
+
+    assert prune_stock_snapshots() == len(stocks)
+    assert set(StockSnapshot.objects.values_list("taken_at", flat=True)) == {taken_at}
+
+
+ROUTED_COUNTRIES = ["US", "PL", "DE"]
+
+
+@pytest.fixture()
+def routing_topology(channel, variants) -> dict:
+    """Warehouses in and out of the channel, shipping to the US and Poland."""
+    shipping_zone = ShippingZone.objects.create(name="Zone", countries="US,PL")
+    shipping_zone.channels.add(channel)
+    other_zone = ShippingZone.objects.create(name="Other zone", countries="DE")
+    warehouses = [
+        Warehouse.objects.create(
+            name=f"Warehouse {index}",
+            slug=f"warehouse-{index}",
+            address=Address.objects.create(country="US"),
+            click_and_collect_option=option,
+        )
+        for index, option in enumerate(
+            [
+                WarehouseClickAndCollectOption.LOCAL_STOCK,
+                WarehouseClickAndCollectOption.DISABLED,
+                WarehouseClickAndCollectOption.DISABLED,
+            ],
+        )
+    ]
+    for warehouse in warehouses:
+        warehouse.shipping_zones.add(shipping_zone, other_zone)
+        Stock.objects.create(warehouse=warehouse, product_variant=variants[0])
+    warehouses[0].channels.add(channel)
+    warehouses[1].channels.add(channel)
+    rebuild_warehouse_routes()
+    return {
+        "channel": channel,
+        "shipping_zone": shipping_zone,
+        "other_zone": other_zone,
+        "warehouses": warehouses,
+    }
+
+
+def _get_routed_warehouses(channel, *, materialized: bool) -> dict:
+    with override_settings(WAREHOUSE_ROUTING_MATERIALIZED=materialized):
+        routed: dict = {
+            country: set(
+                Warehouse.objects.for_country_and_channel(
+                    country,
+                    channel.pk,
+                ).values_list("pk", flat=True),
+            )
+            for country in ROUTED_COUNTRIES
+        }
+        for country in [*ROUTED_COUNTRIES, None]:
+            routed["stocks", country] = set(
+                Stock.objects.for_channel_and_country(
+                    channel.slug,
+                    country,
+                    include_cc_warehouses=True,
+                ).values_list("warehouse_id", flat=True),
+            )
+    return routed
+
+
+def _add_warehouse_channel(topology):
+    topology["warehouses"][2].channels.add(topology["channel"])
+
+
+def _remove_warehouse_channel(topology):
+    topology["warehouses"][1].channels.remove(topology["channel"])
+
+
+def _clear_warehouse_channels(topology):
+    topology["warehouses"][0].channels.clear()
+
+
+def _delete_channel_warehouse(topology):
+    ChannelWarehouse.objects.filter(warehouse=topology["warehouses"][1]).delete()
+
+
+def _add_zone_channel(topology):
+    topology["other_zone"].channels.add(topology["channel"])
+
+
+def _remove_zone_channel(topology):
+    topology["shipping_zone"].channels.remove(topology["channel"])
+
+
+def _remove_warehouse_zone(topology):
+    topology["warehouses"][1].shipping_zones.remove(topology["shipping_zone"])
+
+
+def _change_zone_countries(topology):
+    topology["shipping_zone"].countries = ["US", "DE"]
+    topology["shipping_zone"].save()
+
+
+def _delete_zone(topology):
+    topology["shipping_zone"].delete()
+
+
+def _enable_click_and_collect(topology):
+    warehouse = topology["warehouses"][1]
+    warehouse.click_and_collect_option = WarehouseClickAndCollectOption.ALL_WAREHOUSES
+    warehouse.save(update_fields=["click_and_collect_option"])
+
+
+def _delete_warehouse(topology):
+    topology["warehouses"][0].delete()
+
+
+@pytest.mark.parametrize(
+    "change_topology",
+    [
+        _add_warehouse_channel,
+        _remove_warehouse_channel,
+        _clear_warehouse_channels,
+        _delete_channel_warehouse,
+        _add_zone_channel,
+        _remove_zone_channel,
+        _remove_warehouse_zone,
+        _change_zone_countries,
+        _delete_zone,
+        _enable_click_and_collect,
+        _delete_warehouse,
+    ],
+)
+def test_warehouse_routes_follow_topology_changes(
+    change_topology,
+    routing_topology,
+    django_capture_on_commit_callbacks,
+):
+    channel = routing_topology["channel"]
+    routed = _get_routed_warehouses(channel, materialized=False)
+    assert _get_routed_warehouses(channel, materialized=True) == routed
+
+    with django_capture_on_commit_callbacks(execute=True):
+        change_topology(routing_topology)
+
+    changed = _get_routed_warehouses(channel, materialized=False)
+    assert changed != routed
+    assert _get_routed_warehouses(channel, materialized=True) == changed
+
+
+PREORDER_THRESHOLD = 5
+
+
+@pytest.fixture()
+def preorder_listing(channel, variants) -> ProductVariantChannelListing:
+    variant = variants[0]
+    variant.is_preorder = True
+    variant.preorder_global_threshold = PREORDER_THRESHOLD * 2
+    variant.save(update_fields=["is_preorder", "preorder_global_threshold"])
+    return ProductVariantChannelListing.objects.create(
+        variant=variant,
+        channel=channel,
+        currency="USD",
+        preorder_quantity_threshold=PREORDER_THRESHOLD,
+    )
+
+
+def _get_preorder_counters(listing) -> tuple[int, int]:
+    listing.refresh_from_db(fields=["preorder_quantity_allocated"])
+    listing.variant.refresh_from_db(fields=["preorder_global_quantity_allocated"])
+    return (
+        listing.preorder_quantity_allocated,
+        listing.variant.preorder_global_quantity_allocated,
+    )
+
+
+def test_allocate_preorders(channel, preorder_listing):
+    [line] = _create_order_lines(channel, [preorder_listing.variant], quantity=2)
+
+    [allocation] = allocate_preorders(line.order, [line])
+
+    assert allocation.product_variant_channel_listing_id == preorder_listing.pk
+    assert allocation.quantity == line.quantity
+    assert _get_preorder_counters(preorder_listing) == (line.quantity, line.quantity)
+
+
+@pytest.mark.parametrize(
+    ("channel_allocated", "global_allocated"),
+    [
+        # The channel threshold is reached, the global one isn't.
+        (PREORDER_THRESHOLD, PREORDER_THRESHOLD),
+        # Other channels used the global threshold up.
+        (0, PREORDER_THRESHOLD * 2),
+    ],
+)
+def test_allocate_preorders_exceeding_threshold(
+    channel_allocated,
+    global_allocated,
+    channel,
+    preorder_listing,
+):
+    ProductVariantChannelListing.objects.filter(pk=preorder_listing.pk).update(
+        preorder_quantity_allocated=channel_allocated,
+    )
+    ProductVariant.objects.filter(pk=preorder_listing.variant_id).update(
+        preorder_global_quantity_allocated=global_allocated,
+    )
+    [line] = _create_order_lines(channel, [preorder_listing.variant], quantity=1)
+
+    with pytest.raises(InsufficientStockError) as error:
+        allocate_preorders(line.order, [line])
+
+    assert error.value.lines == [line]
+    assert not PreorderAllocation.objects.exists()
+    assert _get_preorder_counters(preorder_listing) == (
+        channel_allocated,
+        global_allocated,
+    )
+
+
+def test_adjust_preorder_quantity_allocated_locks_variants_first(preorder_listing):
+    with CaptureQueriesContext(connection) as context:
+        adjust_preorder_quantity_allocated({preorder_listing.pk: 1})
+
+    locked_tables = [
+        query["sql"].split(" FROM ", 1)[1].split()[0].strip('"')
+        for query in context.captured_queries
+        if "FOR UPDATE" in query["sql"]
+    ]
+    assert locked_tables == [
+        ProductVariant._meta.db_table,  # noqa: SLF001
+        ProductVariantChannelListing._meta.db_table,  # noqa: SLF001
+    ]
+    assert _get_preorder_counters(preorder_listing) == (1, 1)
+
+
+def test_convert_ended_preorder_allocations(channel, warehouses, preorder_listing):
+    variant = preorder_listing.variant
+    stock = Stock.objects.create(
+        warehouse=warehouses[WarehouseClickAndCollectOption.LOCAL_STOCK],
+        product_variant=variant,
+        quantity=10,
+    )
+    [line] = _create_order_lines(channel, [variant], quantity=2)
+    allocate_preorders(line.order, [line])
+    ProductVariant.objects.filter(pk=variant.pk).update(
+        preorder_end_date=timezone.now() - datetime.timedelta(days=1),
+    )
+
+    batch = convert_ended_preorder_allocations()
+
+    assert (batch.converted, batch.failed, batch.last_order_id) == (
+        1,
+        0,
+        line.order_id,
+    )
+    assert not PreorderAllocation.objects.exists()
+    allocation = Allocation.objects.get()
+    assert (allocation.order_line_id, allocation.stock_id) == (line.pk, stock.pk)
+    assert allocation.quantity_allocated == line.quantity
+    assert _get_preorder_counters(preorder_listing) == (0, 0)
+    assert deactivate_ended_preorders() == 1
+    variant.refresh_from_db()
+    assert not variant.is_preorder
+
+
+def test_convert_ended_preorder_allocations_without_stock(channel, preorder_listing):
+    variant = preorder_listing.variant
+    [line] = _create_order_lines(channel, [variant], quantity=2)
+    allocate_preorders(line.order, [line])
+    ProductVariant.objects.filter(pk=variant.pk).update(
+        preorder_end_date=timezone.now() - datetime.timedelta(days=1),
+    )
+
+    batch = convert_ended_preorder_allocations()
+
+    assert (batch.converted, batch.failed) == (0, 1)
+    # The order keeps its preorder allocation until there is stock.
+    assert PreorderAllocation.objects.filter(order_line=line).exists()
+    assert _get_preorder_counters(preorder_listing) == (line.quantity, line.quantity)
+    assert deactivate_ended_preorders() == 0